@@ -1,115 +1,1292 @@
-from flask import Flask, render_template, request, jsonify, redirect
+from flask import Flask, Response, render_template, request, jsonify, redirect
 from flask_cors import CORS
 from faster_whisper import WhisperModel
+from faster_whisper.audio import decode_audio
+from faster_whisper.vad import VadOptions, SpeechTimestampsMap, collect_chunks, get_speech_timestamps
+import groq
 from groq import Groq
 from dotenv import load_dotenv
+import av
+import httpx
+import numpy as np
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+import base64
+import contextvars
+import hashlib
+import io
 import json
+import logging
+import math
+import multiprocessing
 import os
+import queue
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from multiprocessing.connection import Client
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from transcode import TranscodeError, transcode
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+# Larger request bodies are refused with 413 before they are read
+app.config["MAX_CONTENT_LENGTH"] = int(float(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024)
 
 UPLOAD_FOLDER = "uploads"
 DATA_FOLDER = "data"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(DATA_FOLDER, exist_ok=True)
 
+# ================== WORKER POOL CONFIG ==================
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "32"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+# Uploads up to this size are decoded straight from memory
+SPILL_TO_DISK_BYTES = int(os.getenv("SPILL_TO_DISK_BYTES", str(25 * 1024 * 1024)))
+# Recordings at least this long are split at silences and the chunks decoded in parallel
+LONG_AUDIO_SECONDS = float(os.getenv("LONG_AUDIO_SECONDS", "120"))
+CHUNK_SECONDS = float(os.getenv("CHUNK_SECONDS", "30"))
+CHUNK_OVERLAP_SECONDS = float(os.getenv("CHUNK_OVERLAP_SECONDS", "1.0"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", str(max(1, (os.cpu_count() or 1) // 4))))
+# Admission control: uploads longer than this are refused outright, and each
+# lane admits new audio only while its queued and running clips sum to less
+# than its budget (see JOB QUEUE)
+MAX_AUDIO_SECONDS = float(os.getenv("MAX_AUDIO_SECONDS", "1800"))
+INTERACTIVE_PENDING_AUDIO_SECONDS = float(os.getenv("INTERACTIVE_PENDING_AUDIO_SECONDS", "600"))
+BULK_PENDING_AUDIO_SECONDS = float(os.getenv("BULK_PENDING_AUDIO_SECONDS", "3600"))
+# Bulk jobs may occupy at most this many workers, keeping the rest free for interactive ones
+BULK_MAX_WORKERS = int(os.getenv("BULK_MAX_WORKERS", str(max(1, TRANSCRIBE_WORKERS - 1))))
+# Processes that decode uploads to PCM ahead of the model, per lane (0 decodes inline in the job worker)
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "2"))
+BULK_TRANSCODE_WORKERS = int(os.getenv("BULK_TRANSCODE_WORKERS", str(min(1, TRANSCODE_WORKERS))))
+MIN_SAMPLE_RATE = int(os.getenv("MIN_SAMPLE_RATE", "8000"))
+
+# ================== OBSERVABILITY ==================
+# Logs are one JSON object per line tagged with the request id (from the
+# X-Request-ID header or generated), which jobs carry into the worker threads.
+# Stage timings, real-time factor, queue depth, extraction sources and model
+# load times are exported for Prometheus on /metrics.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+REQUEST_ID = contextvars.ContextVar("request_id", default=None)
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            **getattr(record, "fields", {})
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+logger = logging.getLogger("ai_stt")
+if not logger.handlers:
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(JsonLogFormatter())
+    logger.addHandler(log_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+def log(message, level=logging.INFO, exc_info=False, **fields):
+    logger.log(level, message, exc_info=exc_info, extra={"fields": fields, "request_id": REQUEST_ID.get()})
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+STAGE_SECONDS = Histogram("stt_stage_duration_seconds", "Time spent in each pipeline stage",
+                          ["stage"], buckets=LATENCY_BUCKETS)
+JOB_SECONDS = Histogram("stt_job_duration_seconds", "End-to-end job time from queueing to result",
+                        ["kind", "status"], buckets=LATENCY_BUCKETS)
+REAL_TIME_FACTOR = Histogram("stt_real_time_factor", "Audio seconds decoded per decode second",
+                             ["profile"], buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128))
+AUDIO_SECONDS = Counter("stt_audio_seconds_total", "Seconds of audio transcribed", ["profile"])
+QUEUE_DEPTH = Gauge("stt_queue_depth", "Jobs waiting in the transcription queue")
+PENDING_AUDIO_SECONDS = Gauge("stt_pending_audio_seconds", "Audio admitted and not yet processed, per lane", ["lane"])
+ADMISSION_REJECTIONS = Counter("stt_admission_rejections_total",
+                               "Uploads refused by admission control (too_large, too_long, budget or queue_full)",
+                               ["lane", "reason"])
+JOBS_IN_PROGRESS = Gauge("stt_jobs_in_progress", "Jobs currently being processed by a worker")
+EXTRACTIONS = Counter("stt_extractions_total", "Extractions by kind and source (llm, rules, fallback or cache)",
+                      ["kind", "source"])
+LLM_RETRIES = Counter("stt_llm_retries_total", "LLM calls retried after a transient error")
+LLM_TOKENS = Counter("stt_llm_tokens_total", "LLM tokens used, by kind, prompt version and type (prompt or completion)",
+                     ["kind", "prompt_version", "type"])
+LLM_CALL_SECONDS = Histogram("stt_llm_call_duration_seconds", "Successful LLM calls by kind and prompt version",
+                             ["kind", "prompt_version"], buckets=LATENCY_BUCKETS)
+HEDGED_EXTRACTIONS = Counter("stt_hedged_extractions_total",
+                             "Extractions under a deadline by which path won (llm or rules)", ["kind", "winner"])
+SESSION_UPGRADES = Counter("stt_session_upgrades_total",
+                           "Provisional sessions by outcome once the late LLM result lands "
+                           "(upgraded, skipped when the session was saved meanwhile, failed)", ["kind", "outcome"])
+TIER_SEGMENTS = Counter("stt_tier_segments_total", "Segments of tiered profiles by the profile that decoded them",
+                        ["profile", "tier"])
+MODEL_LOAD_SECONDS = Gauge("stt_model_load_seconds", "Time taken to load each Whisper profile's model",
+                           ["profile"])
+
+@contextmanager
+def stage_timer(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - started)
+
 # ================== WHISPER MODEL ==================
-print("⏳ Loading Whisper model...")
-model = WhisperModel("medium", device="cpu", compute_type="int8")
-print("✅ Whisper ready!")
+SAMPLE_RATE = 16000  # faster-whisper works on 16 kHz mono PCM
+
+# Named transcription profiles. "default" is the original medium/int8 setup;
+# the others trade accuracy for latency. Profiles can be overridden or added
+# with a JSON file (TRANSCRIPTION_PROFILES_FILE) mapping profile name to
+# fields, and each route picks its profile with WHISPER_PROFILE_<ROUTE>.
+# Requests may pass ``profile=<name>`` to override the route default.
+# A profile with "escalate_to" is a tiered first pass: segments the small
+# model is unsure of are re-decoded with the escalation profile's model (see
+# decode_segments).
+TRANSCRIPTION_PROFILES = {
+    "default": {
+        "model_size": "medium",
+        "device": "cpu",
+        "compute_type": "int8",
+        "cpu_threads": 0,
+        # Model replicas: concurrent jobs and the chunks of a long recording decode in parallel
+        "num_workers": max(TRANSCRIBE_WORKERS, CHUNK_WORKERS),
+        "beam_size": 5,
+        "best_of": 5,
+        "vad_filter": False,
+        "vad_parameters": {"min_silence_duration_ms": 500, "speech_pad_ms": 200},
+        "condition_on_previous_text": True,
+        "language": "en",
+        "escalate_to": None,
+        # A segment is escalated below this mean token log-probability,
+        "escalate_avg_logprob": -0.5,
+        # above this probability of being silence (likely hallucinated),
+        "escalate_no_speech_prob": 0.6,
+        # above this gzip compression ratio (repeated text),
+        "escalate_compression_ratio": 2.4,
+        # or, with this on, when it reads out a malformed phone number, pincode or email
+        "escalate_invalid_fields": False
+    },
+    "balanced": {
+        "model_size": "small",
+        "beam_size": 3,
+        "best_of": 3,
+        "vad_filter": True,
+        "condition_on_previous_text": False
+    },
+    "fast": {
+        "model_size": "base.en",
+        "beam_size": 1,
+        "best_of": 1,
+        "vad_filter": True,
+        "condition_on_previous_text": False
+    },
+    "tiered": {
+        "model_size": "base.en",
+        "beam_size": 1,
+        "best_of": 1,
+        "vad_filter": True,
+        "condition_on_previous_text": False,
+        "escalate_to": "default",
+        "escalate_invalid_fields": True
+    }
+}
+
+def load_transcription_profiles():
+    profiles = {name: dict(fields) for name, fields in TRANSCRIPTION_PROFILES.items()}
+    profiles_file = os.getenv("TRANSCRIPTION_PROFILES_FILE")
+    if profiles_file:
+        with open(profiles_file) as f:
+            for name, fields in json.load(f).items():
+                profiles.setdefault(name, {}).update(fields)
+    # Every profile inherits unspecified fields from "default"
+    for name, fields in profiles.items():
+        profiles[name] = {**profiles["default"], **fields}
+    return profiles
+
+TRANSCRIPTION_PROFILES = load_transcription_profiles()
+
+ROUTE_PROFILES = {
+    "business": os.getenv("WHISPER_PROFILE_BUSINESS", "default"),
+    "products": os.getenv("WHISPER_PROFILE_PRODUCTS", "default"),
+    "transcribe": os.getenv("WHISPER_PROFILE_TRANSCRIBE", "default")
+}
+for route, profile_name in ROUTE_PROFILES.items():
+    if profile_name not in TRANSCRIPTION_PROFILES:
+        raise ValueError(f"Unknown transcription profile {profile_name!r} for route {route!r}")
+for profile_name, settings in TRANSCRIPTION_PROFILES.items():
+    target = settings["escalate_to"]
+    if target is None:
+        continue
+    if target not in TRANSCRIPTION_PROFILES:
+        raise ValueError(f"Profile {profile_name!r} escalates to unknown profile {target!r}")
+    if TRANSCRIPTION_PROFILES[target]["escalate_to"] is not None:
+        raise ValueError(f"Profile {profile_name!r} escalates to {target!r}, which escalates again")
+
+def profile_models(profile_name):
+    """The profile and, for a tiered one, its escalation profile: every model it needs loaded."""
+    target = TRANSCRIPTION_PROFILES[profile_name]["escalate_to"]
+    return [profile_name] + ([target] if target else [])
+
+MODELS = {}
+MODELS_LOCK = threading.Lock()
+MODEL_STATUS = {}  # profile name -> {"state": "loading|ready|error", ...}
+
+# When models are loaded:
+#   background - importing app.py returns at once, a thread warms up the route profiles (default)
+#   preload    - load at import, before the first request is served
+#   lazy       - load on the first request that needs the model
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "background")
+# With a socket path set, transcription runs in inference_server.py and this
+# process loads no model at all (see INFERENCE SERVER CLIENT)
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+
+def model_key(profile):
+    return (profile["model_size"], profile["device"], profile["compute_type"],
+            profile["cpu_threads"], profile["num_workers"])
+
+def get_model(profile_name):
+    """Return the WhisperModel for a profile, loading it once and sharing it between profiles with the same weights."""
+    profile = TRANSCRIPTION_PROFILES[profile_name]
+    key = model_key(profile)
+    with MODELS_LOCK:
+        if key not in MODELS:
+            model_size, device, compute_type, cpu_threads, num_workers = key
+            log("Loading Whisper model", model=model_size, device=device, compute_type=compute_type,
+                profile=profile_name)
+            MODEL_STATUS[profile_name] = {"state": "loading"}
+            started = time.time()
+            try:
+                MODELS[key] = WhisperModel(
+                    model_size,
+                    device=device,
+                    compute_type=compute_type,
+                    cpu_threads=cpu_threads,
+                    num_workers=num_workers
+                )
+            except Exception as e:
+                MODEL_STATUS[profile_name] = {"state": "error", "error": str(e)}
+                raise
+            load_seconds = round(time.time() - started, 2)
+            MODEL_LOAD_SECONDS.labels(profile=profile_name).set(load_seconds)
+            log("Whisper model ready", profile=profile_name, load_seconds=load_seconds)
+        else:
+            load_seconds = 0.0
+        if MODEL_STATUS.get(profile_name, {}).get("state") != "ready":
+            MODEL_STATUS[profile_name] = {"state": "ready", "load_seconds": load_seconds}
+        return MODELS[key]
+
+def describe_profile(profile_name):
+    profile = TRANSCRIPTION_PROFILES[profile_name]
+    escalation = f", escalating to {profile['escalate_to']}" if profile["escalate_to"] else ""
+    return (f"{profile_name} ({profile['model_size']}, {profile['compute_type']}, "
+            f"beam {profile['beam_size']}, vad {'on' if profile['vad_filter'] else 'off'}{escalation})")
+
+def warm_up_models():
+    for route, profile_name in ROUTE_PROFILES.items():
+        try:
+            for name in profile_models(profile_name):
+                get_model(name)
+        except Exception as e:
+            log("Failed to load Whisper profile", logging.ERROR, profile=profile_name, error=str(e))
+            continue
+        log("Serving route with profile", route=route, profile=describe_profile(profile_name))
+
+def models_ready(statuses):
+    needed = {name for profile_name in ROUTE_PROFILES.values() for name in profile_models(profile_name)}
+    return all(statuses.get(name, {}).get("state") == "ready" for name in needed)
+
+def is_reloader_parent():
+    # `python app.py` runs with the debug reloader: the parent process only
+    # watches files and re-spawns the server, so it never needs the model.
+    return __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+
+def is_pool_worker():
+    # Spawned batch and transcoding processes import this module too; they
+    # load only the models they ask for (see init_batch_worker)
+    return multiprocessing.parent_process() is not None
+
+def start_warm_up():
+    """Load the route profiles as WHISPER_WARMUP says; gunicorn.conf.py calls this in each forked worker."""
+    if INFERENCE_SOCKET:
+        return
+    if WHISPER_WARMUP == "preload":
+        warm_up_models()
+    elif WHISPER_WARMUP == "background":
+        threading.Thread(target=warm_up_models, name="whisper-warmup", daemon=True).start()
+    else:
+        log("Whisper models will load on first use")
+
+if WHISPER_WARMUP not in ("background", "preload", "lazy"):
+    raise ValueError(f"Unknown WHISPER_WARMUP mode: {WHISPER_WARMUP!r}")
+if INFERENCE_SOCKET:
+    log("Transcription is served by the inference server", socket=INFERENCE_SOCKET)
+elif "gunicorn" in sys.modules:
+    # With --preload gunicorn imports this module in the master and forks the
+    # workers afterwards, and CTranslate2's thread pools do not survive fork():
+    # a model loaded here would hang the worker's first decode. The
+    # post_worker_init hook in gunicorn.conf.py warms up each worker instead.
+    log("Whisper models will load in each gunicorn worker", mode=WHISPER_WARMUP)
+elif not is_reloader_parent() and not is_pool_worker():
+    start_warm_up()
+
+# ================== INFERENCE SERVER CLIENT ==================
+# Web workers started with INFERENCE_SOCKET hand decoding to one local
+# inference_server.py process that owns the models for the whole machine:
+# the upload is decoded to 16 kHz PCM here and sent over the Unix socket,
+# and segments stream back as the server decodes them. Each message is a
+# JSON header or raw float32 PCM (multiprocessing.connection framing, no
+# pickles). Idle connections are pooled and reused.
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "600"))
+INFERENCE_CONNECTIONS = queue.LifoQueue()
+
+class InferenceServerError(Exception):
+    pass
+
+def inference_connection():
+    """Return ``(connection, reused)``: an idle pooled connection, or a new one."""
+    try:
+        return INFERENCE_CONNECTIONS.get_nowait(), True
+    except queue.Empty:
+        return Client(INFERENCE_SOCKET, family="AF_UNIX"), False
+
+def inference_request(header, payload=b"", on_segment=None):
+    """Send one request to the inference server and return its final reply.
+
+    ``{"segment": ...}`` messages received before the reply are passed to
+    ``on_segment``. Raises InferenceServerError when the server reports an
+    error, cannot be reached or does not answer within INFERENCE_TIMEOUT_SECONDS.
+    """
+    connection, reused = inference_connection()
+    received = False
+    try:
+        connection.send_bytes(json.dumps({**header, "request_id": REQUEST_ID.get()}).encode())
+        connection.send_bytes(payload)
+        while True:
+            if not connection.poll(INFERENCE_TIMEOUT_SECONDS):
+                raise InferenceServerError("Timed out waiting for the inference server")
+            message = json.loads(connection.recv_bytes())
+            received = True
+            if "segment" not in message:
+                break
+            if on_segment:
+                on_segment(message["segment"])
+    except (OSError, EOFError) as e:
+        connection.close()
+        if reused and not received:
+            # The server restarted since this pooled connection was opened
+            return inference_request(header, payload, on_segment)
+        raise InferenceServerError(f"Inference server connection failed: {e}") from e
+    except BaseException:
+        connection.close()
+        raise
+    INFERENCE_CONNECTIONS.put(connection)
+    if "error" in message:
+        raise InferenceServerError(message["error"])
+    return message
+
+def remote_transcribe(audio, profile, on_segment=None):
+    reply = inference_request({"op": "transcribe", "profile": profile}, audio.astype(np.float32).tobytes(),
+                              on_segment)
+    return reply["transcript"], reply["audio"]
+
+def model_statuses():
+    """Per-profile model state: this process's, or the inference server's when transcription is remote."""
+    if not INFERENCE_SOCKET:
+        return dict(MODEL_STATUS)
+    try:
+        return inference_request({"op": "status"})["models"]
+    except InferenceServerError as e:
+        log("Inference server unavailable", logging.WARNING, socket=INFERENCE_SOCKET, error=str(e))
+        return {}
+
+# ================== LLM BACKENDS ==================
+# All LLM calls go through llm_complete(), which sends the chat messages to the
+# backend configured for that extraction kind (LLM_BACKEND, overridable per
+# kind with LLM_BACKEND_BUSINESS / LLM_BACKEND_PRODUCTS):
+#   groq    Groq's hosted API (GROQ_BASE_URL points it at a mock server)
+#   openai  any OpenAI-compatible /chat/completions endpoint, e.g. a local model
+#   rules   no LLM: the rule-based extractors answer directly
+#   replay  deterministic replies recorded in LLM_REPLAY_FILE, after
+#           LLM_REPLAY_LATENCY_MS; with LLM_RECORD_BACKEND set, misses are
+#           forwarded to that backend and recorded
+# Each call gets a deadline, bounded retries with jittered exponential
+# backoff (honouring the server's Retry-After on 429s) and a per-backend
+# concurrency limit. Replies are requested in JSON mode unless LLM_JSON_MODE=0
+# (for servers that reject response_format); backends return the reply text
+# and the token usage reported by the server.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_BACKEND_BY_KIND = {
+    "business": os.getenv("LLM_BACKEND_BUSINESS") or LLM_BACKEND,
+    "products": os.getenv("LLM_BACKEND_PRODUCTS") or LLM_BACKEND
+}
+LLM_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+GROQ_TIMEOUT_SECONDS = float(os.getenv("GROQ_TIMEOUT_SECONDS", "20"))
+GROQ_DEADLINE_SECONDS = float(os.getenv("GROQ_DEADLINE_SECONDS", "45"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "4"))
+GROQ_BACKOFF_BASE_SECONDS = 0.5
+GROQ_BACKOFF_MAX_SECONDS = 8.0
+OPENAI_COMPAT_BASE_URL = os.getenv("OPENAI_COMPAT_BASE_URL", "http://127.0.0.1:8080/v1")
+OPENAI_COMPAT_MODEL = os.getenv("OPENAI_COMPAT_MODEL", "local")
+OPENAI_COMPAT_API_KEY = os.getenv("OPENAI_COMPAT_API_KEY", "")
+OPENAI_COMPAT_MAX_CONCURRENCY = int(os.getenv("OPENAI_COMPAT_MAX_CONCURRENCY", "2"))
+LLM_REPLAY_FILE = os.getenv("LLM_REPLAY_FILE", "llm_recordings.jsonl")
+LLM_REPLAY_LATENCY_MS = float(os.getenv("LLM_REPLAY_LATENCY_MS", "0"))
+LLM_RECORD_BACKEND = os.getenv("LLM_RECORD_BACKEND", "")
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "1") == "1"
+
+EXTRACTION_EXECUTOR = ThreadPoolExecutor(max_workers=2 * GROQ_MAX_CONCURRENCY, thread_name_prefix="extraction")
+
+class LLMDeadlineExceeded(Exception):
+    pass
+
+class LLMBackend:
+    """A chat-completion provider. Subclasses implement complete() and say which errors are worth retrying."""
+    name = None
+    model = None  # part of the extraction cache key, with the backend name
+    uses_llm = True
+
+    def __init__(self, max_concurrency):
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+
+    def complete(self, messages, timeout):
+        """Return ``(reply_text, usage)``; usage is ``{"prompt_tokens", "completion_tokens"}`` or None."""
+        raise NotImplementedError
+
+    def is_retryable(self, error):
+        return False
+
+class GroqBackend(LLMBackend):
+    name = "groq"
+    retryable_errors = (groq.RateLimitError, groq.APITimeoutError, groq.APIConnectionError, groq.InternalServerError)
+
+    def __init__(self):
+        super().__init__(GROQ_MAX_CONCURRENCY)
+        self.model = LLM_MODEL
+        self.client = Groq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            timeout=GROQ_TIMEOUT_SECONDS,
+            max_retries=0,  # retries are handled in llm_complete()
+            http_client=httpx.Client(
+                timeout=GROQ_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=GROQ_MAX_CONCURRENCY,
+                                    max_keepalive_connections=GROQ_MAX_CONCURRENCY)
+            )
+        )
+
+    def complete(self, messages, timeout):
+        # groq sends an explicit None as "response_format": null, so the key is left out instead
+        options = {"response_format": {"type": "json_object"}} if LLM_JSON_MODE else {}
+        res = self.client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            temperature=0,
+            timeout=timeout,
+            **options
+        )
+        usage = None
+        if res.usage is not None:
+            usage = {"prompt_tokens": res.usage.prompt_tokens, "completion_tokens": res.usage.completion_tokens}
+        return res.choices[0].message.content, usage
+
+    def is_retryable(self, error):
+        return isinstance(error, self.retryable_errors)
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Any server speaking the OpenAI chat completions API (llama.cpp, vLLM, Ollama, ...)."""
+    name = "openai"
+
+    def __init__(self):
+        super().__init__(OPENAI_COMPAT_MAX_CONCURRENCY)
+        self.model = OPENAI_COMPAT_MODEL
+        headers = {"Authorization": f"Bearer {OPENAI_COMPAT_API_KEY}"} if OPENAI_COMPAT_API_KEY else {}
+        self.http = httpx.Client(
+            base_url=OPENAI_COMPAT_BASE_URL,
+            headers=headers,
+            timeout=GROQ_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=OPENAI_COMPAT_MAX_CONCURRENCY,
+                                max_keepalive_connections=OPENAI_COMPAT_MAX_CONCURRENCY)
+        )
+
+    def complete(self, messages, timeout):
+        body = {"model": OPENAI_COMPAT_MODEL, "messages": messages, "temperature": 0}
+        if LLM_JSON_MODE:
+            body["response_format"] = {"type": "json_object"}
+        response = self.http.post("/chat/completions", timeout=timeout, json=body)
+        response.raise_for_status()
+        reply = response.json()
+        usage = reply.get("usage")
+        if usage is not None:
+            usage = {"prompt_tokens": usage.get("prompt_tokens"), "completion_tokens": usage.get("completion_tokens")}
+        return reply["choices"][0]["message"]["content"], usage
+
+    def is_retryable(self, error):
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError)
+
+class RulesBackend(LLMBackend):
+    """No LLM at all: extraction goes straight to the rule-based extractors."""
+    name = "rules"
+    uses_llm = False
+
+    def __init__(self):
+        super().__init__(1)
+
+class ReplayBackend(LLMBackend):
+    """Deterministic stand-in for benchmarks and tests.
 
-# ================== GROQ SETUP ==================
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    Replies are looked up by the SHA-256 of the messages in a JSON Lines file
+    of ``{"prompt_sha256", "reply", "usage"}`` records and returned after a
+    fixed latency.
+    A prompt with no recording raises LookupError (so extraction falls back to
+    the rules) unless a ``record`` backend is given, in which case it answers
+    and the reply is appended to the file.
+    """
+    name = "replay"
+
+    def __init__(self, path, latency_ms, record=None):
+        super().__init__(GROQ_MAX_CONCURRENCY)
+        self.model = os.path.basename(path)
+        self.path = path
+        self.latency_seconds = latency_ms / 1000
+        self.record = record
+        self.lock = threading.Lock()
+        self.replies = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.replies[entry["prompt_sha256"]] = (entry["reply"], entry.get("usage"))
+
+    def complete(self, messages, timeout):
+        key = hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+        recorded = self.replies.get(key)
+        if recorded is not None:
+            time.sleep(min(self.latency_seconds, timeout))
+            return recorded
+        if self.record is None:
+            raise LookupError(f"No recorded reply for prompt {key[:12]}")
+
+        reply, usage = self.record.complete(messages, timeout)
+        with self.lock:
+            self.replies[key] = (reply, usage)
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"prompt_sha256": key, "reply": reply, "usage": usage}) + "\n")
+        return reply, usage
+
+    def is_retryable(self, error):
+        return self.record is not None and self.record.is_retryable(error)
+
+LLM_BACKEND_CLASSES = {
+    "groq": GroqBackend,
+    "openai": OpenAICompatibleBackend,
+    "rules": RulesBackend
+}
+
+def make_backend(name):
+    if name == "replay":
+        record = make_backend(LLM_RECORD_BACKEND) if LLM_RECORD_BACKEND else None
+        return ReplayBackend(LLM_REPLAY_FILE, LLM_REPLAY_LATENCY_MS, record)
+    if name not in LLM_BACKEND_CLASSES:
+        raise ValueError(f"Unknown LLM backend: {name!r}")
+    return LLM_BACKEND_CLASSES[name]()
+
+# Only the configured backends are built (so e.g. no Groq key is needed for
+# LLM_BACKEND=openai); kinds configured with the same backend share it.
+LLM_BACKENDS = {}
+for backend_name in set(LLM_BACKEND_BY_KIND.values()):
+    LLM_BACKENDS[backend_name] = make_backend(backend_name)
+
+def llm_backend(kind):
+    return LLM_BACKENDS[LLM_BACKEND_BY_KIND[kind]]
+
+def llm_complete(messages, kind, deadline_seconds=None):
+    """Send a chat completion to ``kind``'s backend and return the reply text.
+
+    Token usage and latency are recorded per kind and prompt version.
+    Raises LLMDeadlineExceeded when no answer arrived within the deadline,
+    or the last backend error once retries are exhausted.
+    """
+    backend = llm_backend(kind)
+    started = time.perf_counter()
+    with stage_timer("llm"):
+        content, usage = llm_request(backend, messages,
+                                     time.monotonic() + (deadline_seconds or GROQ_DEADLINE_SECONDS))
+    seconds = time.perf_counter() - started
+    version = PROMPT_VERSIONS[kind]
+    LLM_CALL_SECONDS.labels(kind=kind, prompt_version=version).observe(seconds)
+    usage = usage or {}
+    for token_type in ("prompt", "completion"):
+        if usage.get(f"{token_type}_tokens") is not None:
+            LLM_TOKENS.labels(kind=kind, prompt_version=version, type=token_type).inc(usage[f"{token_type}_tokens"])
+    log("LLM call completed", kind=kind, prompt_version=version, backend=backend.name, seconds=round(seconds, 3),
+        prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"))
+    return content
+
+def parse_llm_json(content):
+    """Parse a reply's JSON object.
+
+    Without JSON mode the model may wrap the object in a preamble or a
+    ```json fence, so the outermost ``{...}`` is parsed instead.
+    """
+    if not LLM_JSON_MODE:
+        start, end = content.find("{"), content.rfind("}")
+        if start != -1 and end > start:
+            content = content[start:end + 1]
+    return json.loads(content)
+
+def llm_request(backend, messages, deadline):
+    """Call the backend with retries; a concurrency slot is held per attempt, not across the backoff sleep."""
+    attempt = 0
+    while True:
+        if not backend.slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMDeadlineExceeded("Timed out waiting for an LLM slot")
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMDeadlineExceeded("LLM deadline exceeded")
+            return backend.complete(messages, timeout=min(GROQ_TIMEOUT_SECONDS, remaining))
+        except Exception as e:
+            if not backend.is_retryable(e):
+                raise
+            attempt += 1
+            if attempt > GROQ_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, e)
+            if time.monotonic() + delay >= deadline:
+                raise
+            error = e
+        finally:
+            backend.slots.release()
+        LLM_RETRIES.inc()
+        log("LLM call failed, retrying", logging.WARNING, backend=backend.name, error=type(error).__name__,
+            attempt=attempt, max_retries=GROQ_MAX_RETRIES, delay_seconds=round(delay, 2))
+        time.sleep(delay)
+
+def backoff_delay(attempt, error):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(GROQ_BACKOFF_MAX_SECONDS, GROQ_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return delay
+
+# ================== PROMPTS ==================
+# Extraction instructions are versioned assets in prompts/<kind>.v<version>.txt,
+# sent as the system message; the transcript is the user message, so the
+# static prefix is identical across calls. Bump the version (adding a new
+# file) whenever a prompt or its parsing changes: it is part of the
+# extraction cache key and labels the token and latency metrics.
+# Transcripts are held to a per-kind token budget: business transcripts are
+# trimmed to their start and end, product transcripts are split into several
+# prompts that run concurrently (see extract_products).
+PROMPTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+PROMPT_VERSIONS = {
+    "business": "2",
+    "products": "2"
+}
+TRANSCRIPT_TOKEN_BUDGETS = {
+    "business": int(os.getenv("BUSINESS_TRANSCRIPT_TOKENS", "1500")),
+    "products": int(os.getenv("PRODUCT_TRANSCRIPT_TOKENS", "400"))
+}
+# Rough tokens-per-character of English text for Llama-style tokenizers
+CHARS_PER_TOKEN = 4
+# Share of a trimmed business transcript kept from its start (the rest from its end)
+TRIM_HEAD_SHARE = 0.75
+
+def load_prompt(kind):
+    with open(os.path.join(PROMPTS_FOLDER, f"{kind}.v{PROMPT_VERSIONS[kind]}.txt"), "r") as f:
+        return f.read().strip()
+
+PROMPTS = {kind: load_prompt(kind) for kind in PROMPT_VERSIONS}
+
+def prompt_messages(kind, text):
+    return [{"role": "system", "content": PROMPTS[kind]}, {"role": "user", "content": text}]
+
+def budget_chars(kind):
+    return TRANSCRIPT_TOKEN_BUDGETS[kind] * CHARS_PER_TOKEN
+
+def trim_transcript(text, max_chars):
+    """Keep the start and end of a transcript longer than ``max_chars``, cutting at spaces."""
+    if len(text) <= max_chars:
+        return text
+    head = text[:int(max_chars * TRIM_HEAD_SHARE)].rsplit(" ", 1)[0]
+    tail = text[len(text) - (max_chars - len(head)):].split(" ", 1)[-1]
+    return f"{head} ... {tail}"
+
+def split_transcript(text, max_chars):
+    """Split a transcript into pieces of at most ``max_chars``, preferring sentence ends, then spaces."""
+    pieces = []
+    while len(text) > max_chars:
+        window = text[:max_chars + 1]
+        cut = max(window.rfind(". "), window.rfind("? "), window.rfind("! "))
+        cut = cut + 1 if cut > max_chars // 2 else window.rfind(" ")
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        pieces.append(text)
+    return pieces
 
 # ================== SESSION TRACKING ==================
-CURRENT_SESSION_FILE = None
-CURRENT_SESSION_FILENAME = None
+# Sessions are addressed explicitly by filename (the client echoes back the
+# filename it got from /upload_business_audio), never through module state, so
+# concurrent users cannot write into each other's sessions.
+SESSION_FILENAME_RE = re.compile(r"^[A-Za-z0-9_.-]+\.json$")
+SESSION_LOCKS = {}
+SESSION_LOCKS_GUARD = threading.Lock()
+
+def new_session_filename():
+    """Timestamped session name with a random suffix so two uploads in the same second never collide."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"session_{timestamp}_{uuid.uuid4().hex[:8]}.json"
+
+def session_path(filename):
+    """Resolve a client-supplied session filename inside DATA_FOLDER, rejecting path traversal."""
+    if not filename or not SESSION_FILENAME_RE.match(filename) or filename.startswith("."):
+        raise ValueError(f"Invalid session filename: {filename!r}")
+    return os.path.join(DATA_FOLDER, filename)
+
+def session_lock(filename):
+    with SESSION_LOCKS_GUARD:
+        lock = SESSION_LOCKS.get(filename)
+        if lock is None:
+            lock = SESSION_LOCKS[filename] = threading.Lock()
+        return lock
+
+# Listing sessions must not open every session body, so the fields the
+# profile list shows are kept in a SQLite index next to the JSON files. The
+# JSON files stay the source of truth: the index is reconciled with data/ on
+# startup and updated on every write.
+SESSION_INDEX_PATH = os.getenv("SESSION_INDEX_PATH", os.path.join(DATA_FOLDER, "index.sqlite3"))
+SESSION_INDEX_VERSION = 2  # bump when the schema changes; the index is rebuilt from data/
+SESSION_INDEX_LOCK = threading.Lock()
+SESSION_INDEX = None
+SESSION_INDEX_PID = None
+SESSION_FILENAME_TIMESTAMP_RE = re.compile(r"^session_(\d{8}_\d{6})")
+
+# Session JSON key -> index column, for listing and field projection
+SESSION_INDEX_FIELDS = {
+    "createdAt": "created_at",
+    "name": "name",
+    "personName": "person_name",
+    "city": "city",
+    "state": "state",
+    "category": "category",
+    "phone": "phone",
+    "productCount": "product_count",
+    "productNames": "product_names"
+}
+SESSION_FILTER_FIELDS = ("city", "state", "category")
+SESSION_PAGE_DEFAULT = 50
+SESSION_PAGE_MAX = 500
+
+def session_index():
+    """The process's index connection (callers hold SESSION_INDEX_LOCK); reopened after a fork."""
+    global SESSION_INDEX, SESSION_INDEX_PID
+    if SESSION_INDEX is None or SESSION_INDEX_PID != os.getpid():
+        db = sqlite3.connect(SESSION_INDEX_PATH, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        if db.execute("PRAGMA user_version").fetchone()[0] != SESSION_INDEX_VERSION:
+            db.execute("DROP TABLE IF EXISTS sessions")
+            db.execute(f"PRAGMA user_version = {SESSION_INDEX_VERSION}")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                filename TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                name TEXT NOT NULL,
+                person_name TEXT NOT NULL,
+                city TEXT NOT NULL COLLATE NOCASE,
+                state TEXT NOT NULL COLLATE NOCASE,
+                category TEXT NOT NULL COLLATE NOCASE,
+                phone TEXT NOT NULL,
+                product_count INTEGER NOT NULL,
+                product_names TEXT NOT NULL
+            )""")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_created_at ON sessions (created_at)")
+        db.commit()
+        SESSION_INDEX = db
+        SESSION_INDEX_PID = os.getpid()
+    return SESSION_INDEX
+
+def session_created_at(filename, mtime):
+    match = SESSION_FILENAME_TIMESTAMP_RE.match(filename)
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").isoformat()
+    return datetime.fromtimestamp(mtime).isoformat(timespec="seconds")
+
+def index_session(filename, data, mtime):
+    products = [product for product in data.get("products", []) if isinstance(product, dict)]
+    row = (
+        filename,
+        session_created_at(filename, mtime),
+        mtime,
+        str(data.get("name", "")),
+        str(data.get("personName", "")),
+        str(data.get("city", "")),
+        str(data.get("state", "")),
+        str(data.get("category", "")),
+        str(data.get("phone", "")),
+        len(data.get("products", [])),
+        json.dumps([product.get("name", "") for product in products if product.get("name")])
+    )
+    with SESSION_INDEX_LOCK:
+        db = session_index()
+        db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+        db.commit()
+
+def index_session_products(filename, products, mtime):
+    """Add appended products to a session's index row without re-reading the session."""
+    names = [product["name"] for product in products if isinstance(product, dict) and product.get("name")]
+    with SESSION_INDEX_LOCK:
+        db = session_index()
+        row = db.execute("SELECT product_count, product_names FROM sessions WHERE filename = ?",
+                         (filename,)).fetchone()
+        if row is not None:
+            db.execute("UPDATE sessions SET mtime = ?, product_count = ?, product_names = ? WHERE filename = ?",
+                       (mtime, row[0] + len(products), json.dumps(json.loads(row[1]) + names), filename))
+            db.commit()
+    if row is None:
+        index_session(filename, read_session(filename), mtime)
+
+def unindex_session(filename):
+    with SESSION_INDEX_LOCK:
+        db = session_index()
+        db.execute("DELETE FROM sessions WHERE filename = ?", (filename,))
+        db.commit()
+
+# Session writes are atomic (temp file, fsync, rename) and compact. Products
+# live in an append-only JSON Lines log next to the session body
+# (session_x.products.jsonl), so adding products costs O(new products)
+# instead of rewriting the whole catalog. Once a session has a log, the log
+# is the source of truth for its products; the body's "products" is the
+# snapshot from the last full write. Each log line is one batch
+# ({"batch": id, "products": [...]}), and a later line with the same batch
+# id replaces the earlier one.
+COMPACT_JSON = (",", ":")
+
+def product_log_path(filename):
+    return session_path(filename)[:-len(".json")] + ".products.jsonl"
+
+def atomic_write(path, text):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # Make the rename itself durable
+        directory = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+def product_log_line(batch, products):
+    return json.dumps({"batch": batch, "products": products}, separators=COMPACT_JSON) + "\n"
+
+def read_product_batches(filename):
+    """The product log as ``{batch id: products}`` in batch order, or None if the session has none."""
+    batches = {}
+    try:
+        with open(product_log_path(filename), "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn line from a crash mid-append
+                batches[entry["batch"]] = entry["products"]
+    except FileNotFoundError:
+        return None
+    return batches
+
+def read_product_log(filename):
+    """Materialize the product log, or None if the session has none."""
+    batches = read_product_batches(filename)
+    if batches is None:
+        return None
+    return [product for products in batches.values() for product in products]
+
+def read_session(filename):
+    with open(session_path(filename), "r") as f:
+        data = json.load(f)
+    products = read_product_log(filename)
+    if products is not None:
+        data["products"] = products
+    return data
+
+def session_mtime(filename):
+    mtime = os.stat(session_path(filename)).st_mtime
+    try:
+        return max(mtime, os.stat(product_log_path(filename)).st_mtime)
+    except FileNotFoundError:
+        return mtime
+
+def write_session(filename, data, batch=None):
+    """Atomically write a whole session and refresh its index row. Callers hold session_lock(filename).
+
+    The products become the single batch of a fresh product log, with id ``batch`` if given.
+    """
+    products = data.get("products", [])
+    # Log first: if the body write is then lost, the products are still current
+    atomic_write(product_log_path(filename), product_log_line(batch or uuid.uuid4().hex, products))
+    atomic_write(session_path(filename), json.dumps(data, separators=COMPACT_JSON))
+    index_session(filename, data, session_mtime(filename))
+
+def append_session_products(filename, products, batch=None):
+    """Append one batch of products to an existing session without rewriting it.
+
+    Passing the id of an earlier batch replaces that batch's products in
+    place. Callers hold session_lock(filename). Returns the batch id.
+    """
+    log_path = product_log_path(filename)
+    if not os.path.exists(log_path):
+        # Sessions written before the product log existed: seed it once from the body
+        with open(session_path(filename), "r") as f:
+            existing = json.load(f).get("products", [])
+        atomic_write(log_path, product_log_line(uuid.uuid4().hex, existing))
+
+    replaces = batch is not None
+    batch = batch or uuid.uuid4().hex
+    with open(log_path, "a+b") as f:
+        prefix = b""
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                prefix = b"\n"  # don't glue onto a torn line
+        f.write(prefix + product_log_line(batch, products).encode())
+        f.flush()
+        os.fsync(f.fileno())
+    if replaces:
+        # The line may replace an earlier batch, so the counts can't be updated incrementally
+        index_session(filename, read_session(filename), session_mtime(filename))
+    else:
+        index_session_products(filename, products, session_mtime(filename))
+    return batch
+
+def update_session_fields(filename, fields):
+    """Overwrite top-level fields of a session body, keeping its product log. Callers hold session_lock(filename)."""
+    with open(session_path(filename), "r") as f:
+        data = json.load(f)
+    data.update(fields)
+    atomic_write(session_path(filename), json.dumps(data, separators=COMPACT_JSON))
+    index_session(filename, read_session(filename), session_mtime(filename))
+
+def delete_session_file(filename):
+    """Remove a session, its product log and its index row. Callers hold session_lock(filename)."""
+    os.remove(session_path(filename))
+    if os.path.exists(product_log_path(filename)):
+        os.remove(product_log_path(filename))
+    unindex_session(filename)
+
+def query_sessions(filters=None, after=None, limit=SESSION_PAGE_DEFAULT, descending=False):
+    """One keyset page of index metadata, ordered by filename (i.e. by creation time).
+
+    ``filters`` maps city/state/category to a case-insensitive value and
+    ``from``/``to`` to ISO timestamps bounding createdAt; ``after`` is the
+    filename the previous page ended on.
+    """
+    columns = ", ".join(SESSION_INDEX_FIELDS.values())
+    clauses, params = [], []
+    for field, value in (filters or {}).items():
+        if field == "from":
+            clauses.append("created_at >= ?")
+        elif field == "to":
+            clauses.append("created_at <= ?")
+        else:
+            clauses.append(f"{SESSION_INDEX_FIELDS[field]} = ?")
+        params.append(value)
+    if after:
+        clauses.append("filename < ?" if descending else "filename > ?")
+        params.append(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = "DESC" if descending else "ASC"
+    with SESSION_INDEX_LOCK:
+        rows = session_index().execute(
+            f"SELECT filename, {columns} FROM sessions {where} ORDER BY filename {order} LIMIT ?",
+            (*params, limit)).fetchall()
+
+    sessions = []
+    for row in rows:
+        session = {"filename": row[0], **dict(zip(SESSION_INDEX_FIELDS, row[1:]))}
+        session["productNames"] = json.loads(session["productNames"])
+        sessions.append(session)
+    return sessions
+
+def iter_sessions(filters=None, descending=False):
+    """Every matching session, fetched a page at a time so memory stays flat however many exist."""
+    after = None
+    while True:
+        page = query_sessions(filters, after, SESSION_PAGE_MAX, descending)
+        yield from page
+        if len(page) < SESSION_PAGE_MAX:
+            return
+        after = page[-1]["filename"]
+
+def project_session(session, fields):
+    """Keep only the requested fields (filename always); ``data`` loads the session body."""
+    if fields is None:
+        return session
+    projected = {"filename": session["filename"]}
+    for field in fields:
+        if field == "data":
+            projected["data"] = read_session(session["filename"])
+        else:
+            projected[field] = session[field]
+    return projected
+
+def encode_session_cursor(filename):
+    return base64.urlsafe_b64encode(filename.encode()).decode().rstrip("=")
+
+def decode_session_cursor(cursor):
+    try:
+        filename = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        session_path(filename)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return filename
+
+def latest_session_filename():
+    with SESSION_INDEX_LOCK:
+        row = session_index().execute("SELECT filename FROM sessions ORDER BY filename DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+def sync_session_index():
+    """Reconcile the index with data/: index new or externally edited files, drop deleted ones.
+
+    Only files whose mtime differs from the indexed one are opened, so a warm
+    start costs one directory listing.
+    """
+    with SESSION_INDEX_LOCK:
+        indexed = dict(session_index().execute("SELECT filename, mtime FROM sessions"))
+    on_disk, log_mtimes = {}, {}
+    with os.scandir(DATA_FOLDER) as entries:
+        for entry in entries:
+            if entry.name.endswith(".products.jsonl") and entry.is_file():
+                log_mtimes[entry.name[:-len(".products.jsonl")] + ".json"] = entry.stat().st_mtime
+            elif entry.name.endswith(".json") and entry.is_file():
+                on_disk[entry.name] = entry.stat().st_mtime
+    for filename, mtime in log_mtimes.items():
+        if filename in on_disk:
+            on_disk[filename] = max(on_disk[filename], mtime)
+
+    stale = [filename for filename, mtime in on_disk.items() if indexed.get(filename) != mtime]
+    for filename in stale:
+        try:
+            index_session(filename, read_session(filename), on_disk[filename])
+        except Exception as e:
+            log("Error indexing session", logging.ERROR, filename=filename, error=str(e))
+    removed = indexed.keys() - on_disk.keys()
+    for filename in removed:
+        unindex_session(filename)
+    if stale or removed:
+        log("Session index synced", sessions=len(on_disk), indexed=len(stale), dropped=len(removed))
+
+if not is_reloader_parent():
+    sync_session_index()
 
 # ================== BUSINESS EXTRACTION ==================
+BUSINESS_FIELDS = ["personName", "name", "address", "city", "state", "pincode", "gstNumber", "category",
+                   "subcategory", "email", "phone", "website", "establishedYear"]
+
 def extract_business_info(text):
+    """Return ``(data, source)``; source is "llm", "rules" when the rules backend is configured,
+    or "fallback" when the LLM failed and the rule-based extractor was used."""
+    if not llm_backend("business").uses_llm:
+        return extract_business_info_fallback(text), "rules"
     try:
-        # Try GROQ API first
-        prompt = f"""
-Extract comprehensive business details from this English speech:
-
-"{text}"
-
-Return ONLY JSON:
-{{
-  "personName": "",
-  "name": "",
-  "address": "",
-  "city": "",
-  "state": "",
-  "pincode": "",
-  "gstNumber": "",
-  "category": "",
-  "subcategory": "",
-  "email": "",
-  "phone": "",
-  "website": "",
-  "establishedYear": "",
-  "products": []
-}}
-Rules:
-- Extract person name, business name, address, city, state, pincode, GST number, category, subcategory, email, phone, website, established year
-- Categories: Retail, Food & Restaurant, Services, Manufacturing, Healthcare, Education, Technology, Agriculture, Textile, Automotive, Electronics, Real Estate, Construction, Tourism, Logistics, Finance, Consulting
-- If any field is not mentioned, leave it empty
-- Extract phone numbers as 10-digit numbers (remove country codes if present)
-- Extract email addresses with @ symbol
-- Extract GST numbers (15-digit alphanumeric starting with digits)
-- Extract pincode as 6-digit numbers
-- Extract website URLs (with http/https or www)
-- Extract established year (4-digit numbers between 1900-2024)
-- If products are mentioned, include them as simple strings in the products array
-- Focus on clear English business information only
-- Make sure the response is valid JSON format only, without any extra text before or after the JSON
-"""
-        res = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role":"user","content":prompt}],
-            temperature=0
-        )
-        content = res.choices[0].message.content
-        
-        # Find the JSON in the response
-        start_idx = content.find("{")
-        end_idx = content.rfind("}")
-        
-        if start_idx != -1 and end_idx != -1 and start_idx < end_idx:
-            json_str = content[start_idx:end_idx+1]
-            return json.loads(json_str)
-        else:
-            # If we can't find a JSON object, return a default structure
-            return {
-                "personName": "",
-                "name": "",
-                "address": "",
-                "city": "",
-                "state": "",
-                "pincode": "",
-                "gstNumber": "",
-                "category": "",
-                "subcategory": "",
-                "email": "",
-                "phone": "",
-                "website": "",
-                "establishedYear": "",
-                "products": []
-            }
+        content = llm_complete(prompt_messages("business", trim_transcript(text, budget_chars("business"))),
+                               "business")
+        data = parse_llm_json(content)
+        if not isinstance(data, dict):
+            raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+        # Fields the model left out are filled in empty
+        return {**{field: "" for field in BUSINESS_FIELDS}, "products": [], **data}, "llm"
     except Exception as e:
-        print(f"API Error: {e}")
+        log("Business extraction LLM error, using fallback", logging.WARNING, error=str(e))
         # Fallback to basic text extraction from transcription
-        return extract_business_info_fallback(text)
+        with stage_timer("fallback"):
+            return extract_business_info_fallback(text), "fallback"
+
+# Rule-based extraction used when the LLM is unavailable. Everything below is
+# compiled once at import: the gazetteers (states, cities, category and
+# product keywords) become a single word-bounded trie regex and the structured
+# fields are read off one scan for digit-led tokens, so a transcript is
+# scanned a fixed number of times instead of once per keyword.
+INDIAN_STATES = ["andhra pradesh", "arunachal pradesh", "assam", "bihar", "chhattisgarh", "goa", "gujarat", "haryana", "himachal pradesh", "jammu & kashmir", "jharkhand", "karnataka", "kerala", "madhya pradesh", "maharashtra", "manipur", "meghalaya", "mizoram", "nagaland", "odisha", "punjab", "rajasthan", "sikkim", "tamil nadu", "telangana", "tripura", "uttar pradesh", "uttarakhand", "west bengal", "chandigarh", "delhi", "hyderabad", "bangalore", "mumbai", "chennai", "kolkata", "pune", "jaipur", "lucknow"]
+
+INDIAN_CITIES = ["chandigarh", "hyderabad", "bangalore", "delhi", "mumbai", "chennai", "kolkata", "pune", "jaipur", "lucknow", "ahmedabad", "surat", "nagpur", "indore", "thane", "bhopal", "visakhapatnam", "pimpri", "patna", "vadodara", "ghaziabad", "ludhiana", "agra", "nashik", "faridabad", "meerut", "rajkot", "kalyan", "vasai", "varanasi", "srinagar", "aurangabad", "dhanbad", "amritsar", "navi mumbai", "allahabad", "ranchi", "howrah", "coimbatore", "jabalpur", "gwalior", "vijayawada", "jodhpur", "madurai", "raipur", "kota", "guwahati", "hubli", "dharwad", "mysore"]
+
+BUSINESS_CATEGORY_KEYWORDS = {
+    "retail": ["retail", "shop", "store", "grocery", "market", "supermarket"],
+    "food & restaurant": ["food", "restaurant", "cafe", "hotel", "eatery", "sweet", "treat", "bakery"],
+    "services": ["service", "consulting", "repair", "maintenance"],
+    "manufacturing": ["manufacturing", "factory", "production"],
+    "healthcare": ["health", "medical", "hospital", "clinic", "pharmacy"],
+    "education": ["education", "school", "college", "tuition", "institute"],
+    "technology": ["tech", "technology", "software", "computer", "it"],
+    "agriculture": ["agriculture", "farming", "crops", "seeds"],
+    "textile": ["textile", "clothing", "garments", "fashion"],
+    "automotive": ["automotive", "car", "vehicle", "motor"]
+}
+
+BUSINESS_PRODUCT_KEYWORDS = ["vegetable", "fruit", "rice", "milk", "bread", "sweet", "snack", "food", "grocery"]
+
+# A 4-digit number only counts as the establishment year after one of these words
+YEAR_CONTEXT_RE = re.compile(r"\b(?:established|founded|started|since|year)\b")
+YEAR_CONTEXT_WINDOW = 40  # characters before the year searched for a context word
+
+# Structured fields: every alphanumeric run starting with a digit is a
+# candidate (phone, pincode, year or GST number) told apart by its shape. A
+# plain character class lets the regex engine skip ahead quickly.
+NUMBER_CANDIDATE_RE = re.compile(r"[0-9][0-9a-z]*")
+NUMBER_FIELDS = {10: "phone", 6: "pincode", 4: "establishedYear"}
+GST_RE = re.compile(r"\d{2}[a-z]{5}\d{4}[a-z][a-z0-9]z\d")
+# Only run when the transcript contains "www."/"http" or "@" at all
+WEBSITE_RE = re.compile(r"\b((?:https?://|www\.)[a-z0-9.-]+\.[a-z]{2,})\b")
+EMAIL_RE = re.compile(r"\b([a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,})\b")
+
+PERSON_NAME_PATTERNS = [re.compile(pattern) for pattern in (
+    r'(?:my name is|i am|this is)\s+([a-zA-Z\s]+?)(?:\s+(?:and|so|feed|my|i))',
+    r'(?:i\'m|i am)\s+([a-zA-Z\s]+?)(?:\s+(?:and|so|feed|my))',
+)]
+
+BUSINESS_NAME_PATTERNS = [re.compile(pattern) for pattern in (
+    r'(?:my name is|my business is|i own|we are|this is)\s+([a-zA-Z\s]+?)(?:\s+(?:in|at|and|located|so|feed))',
+    r'business\s+name\s+is\s+([a-zA-Z\s]+?)(?:\s+(?:and|we|located))',
+    r'we\s+are\s+([a-zA-Z\s]+?)(?:\s+(?:and|we|located|in))',
+    r'name\s+is\s+([a-zA-Z\s]+?)(?:\s+(?:and|so|feed))'
+)]
+
+ADDRESS_PATTERNS = [re.compile(pattern) for pattern in (
+    r'(?:located|address|at|in)\s+([a-zA-Z0-9\s,]+?)(?:\s+(?:city|and|we|phone|state))',
+    r'address\s+is\s+([a-zA-Z0-9\s,]+?)(?:\s+(?:city|and|we|phone|state))'
+)]
+
+def keyword_forms(keyword):
+    """A keyword plus its simple plural, so "shops" and "bakeries" still match whole words."""
+    if keyword.endswith("y") and not keyword.endswith(("ay", "ey", "oy", "uy")):
+        return [keyword, keyword[:-1] + "ies"]
+    if keyword.endswith(("s", "x", "ch", "sh")):
+        return [keyword, keyword + "es"]
+    return [keyword, keyword + "s"]
+
+def phrase_regex(phrases):
+    """Compile phrases into one word-bounded regex shaped like a character trie.
+
+    Sharing prefixes keeps the regex engine from retrying every phrase at
+    every position, so the whole gazetteer is matched in one scan.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def to_regex(node):
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A phrase may end here: prefer the longer match but allow stopping
+        return f"(?:{body})?" if "" in node else body
+
+    return re.compile(r"\b" + to_regex(trie) + r"\b")
+
+def build_gazetteer():
+    """Map every phrase (and keyword plural) to its (field, rank, value) hits; rank keeps the original list priority."""
+    entries = []
+    entries += [("state", rank, state, [state]) for rank, state in enumerate(INDIAN_STATES)]
+    entries += [("city", rank, city, [city]) for rank, city in enumerate(INDIAN_CITIES)]
+    rank = 0
+    for category, keywords in BUSINESS_CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            entries.append(("category", rank, category, keyword_forms(keyword)))
+            rank += 1
+    entries += [("product", rank, keyword, keyword_forms(keyword))
+                for rank, keyword in enumerate(BUSINESS_PRODUCT_KEYWORDS)]
+
+    hits = {}
+    for field, rank, value, phrases in entries:
+        for phrase in phrases:
+            hits.setdefault(phrase, []).append((field, rank, value))
+    return hits, phrase_regex(hits)
+
+GAZETTEER_HITS, GAZETTEER_RE = build_gazetteer()
+
+def scan_gazetteers(text_lower):
+    """Return ``{field: {value: best rank}}`` for every gazetteer phrase in the transcript."""
+    found = {"state": {}, "city": {}, "category": {}, "product": {}}
+    for match in GAZETTEER_RE.finditer(text_lower):
+        for field, rank, value in GAZETTEER_HITS[match.group()]:
+            if value not in found[field] or rank < found[field][value]:
+                found[field][value] = rank
+    return found
+
+def scan_fields(text_lower):
+    """First e-mail, website, GST number, phone, pincode and establishment year in the transcript."""
+    fields = {}
+    current_year = datetime.now().year
+    for match in NUMBER_CANDIDATE_RE.finditer(text_lower):
+        start = match.start()
+        if start and text_lower[start - 1].isalnum():
+            continue  # digits inside a word, not a standalone number
+        candidate = match.group()
+        if candidate.isdigit():
+            field = NUMBER_FIELDS.get(len(candidate))
+            if field is None or field in fields:
+                continue
+            if field == "establishedYear":
+                context = text_lower[max(0, start - YEAR_CONTEXT_WINDOW):start]
+                if not (1900 <= int(candidate) <= current_year and YEAR_CONTEXT_RE.search(context)):
+                    continue
+            fields[field] = candidate
+        elif "gstNumber" not in fields and len(candidate) == 15 and GST_RE.fullmatch(candidate):
+            fields["gstNumber"] = candidate.upper()
+    if "www." in text_lower or "http" in text_lower:
+        match = WEBSITE_RE.search(text_lower)
+        if match:
+            fields["website"] = match.group(1)
+    if "@" in text_lower:
+        match = EMAIL_RE.search(text_lower)
+        if match:
+            fields["email"] = match.group(1)
+    return fields
+
+def best_ranked(hits):
+    return min(hits, key=hits.get) if hits else ""
 
 def extract_business_info_fallback(text):
     """Fallback function to extract business info from transcription using basic text processing"""
-    import re
-    
     # Initialize result
     result = {
         "personName": "",
@@ -127,577 +1304,1925 @@ def extract_business_info_fallback(text):
         "establishedYear": "",
         "products": []
     }
-    
+
     # Convert to lowercase for processing
     text_lower = text.lower()
-    
-    # Extract state (look for common Indian states)
-    states = ["andhra pradesh", "arunachal pradesh", "assam", "bihar", "chhattisgarh", "goa", "gujarat", "haryana", "himachal pradesh", "jammu & kashmir", "jharkhand", "karnataka", "kerala", "madhya pradesh", "maharashtra", "manipur", "meghalaya", "mizoram", "nagaland", "odisha", "punjab", "rajasthan", "sikkim", "tamil nadu", "telangana", "tripura", "uttar pradesh", "uttarakhand", "west bengal", "chandigarh", "delhi", "hyderabad", "bangalore", "mumbai", "chennai", "kolkata", "pune", "jaipur", "lucknow"]
-    for state in states:
-        if state in text_lower:
-            result["state"] = state.title()
-            break
-    
-    # Extract pincode (6-digit patterns)
-    pincode_pattern = r'\b(\d{6})\b'
-    pincodes = re.findall(pincode_pattern, text_lower)
-    if pincodes:
-        result["pincode"] = pincodes[0]
-    
-    # Extract GST number (15-digit alphanumeric starting with digits)
-    gst_pattern = r'\b(\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z0-9]{1}Z\d{1})\b'
-    gst_matches = re.findall(gst_pattern, text.upper())
-    if gst_matches:
-        result["gstNumber"] = gst_matches[0]
-    
-    # Extract email addresses
-    email_pattern = r'\b([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b'
-    emails = re.findall(email_pattern, text_lower)
-    if emails:
-        result["email"] = emails[0]
-    
-    # Extract website URLs
-    website_pattern = r'\b((?:https?://|www\.)[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b'
-    websites = re.findall(website_pattern, text_lower)
-    if websites:
-        result["website"] = websites[0]
-    
-    # Extract established year (4-digit numbers between 1900-2024)
-    year_pattern = r'\b(19[0-9]{2}|20[0-2][0-4])\b'
-    years = re.findall(year_pattern, text_lower)
-    for year in years:
-        # Check if it's likely an establishment year (context keywords)
-        context_words = ["established", "founded", "started", "since", "year"]
-        if any(word in text_lower for word in context_words):
-            result["establishedYear"] = year
-            break
-    
-    # Extract city (look for common city names)
-    cities = ["chandigarh", "hyderabad", "bangalore", "delhi", "mumbai", "chennai", "kolkata", "pune", "jaipur", "lucknow", "ahmedabad", "surat", "nagpur", "indore", "thane", "bhopal", "visakhapatnam", "pimpri", "patna", "vadodara", "ghaziabad", "ludhiana", "agra", "nashik", "faridabad", "meerut", "rajkot", "kalyan", "vasai", "varanasi", "srinagar", "aurangabad", "dhanbad", "amritsar", "navi mumbai", "allahabad", "ranchi", "howrah", "coimbatore", "jabalpur", "gwalior", "vijayawada", "jodhpur", "madurai", "raipur", "kota", "guwahati", "chandigarh", "hubli", "dharwad", "mysore"]
-    for city in cities:
-        if city in text_lower:
-            result["city"] = city.title()
-            break
-    
-    # Extract phone numbers (10-digit patterns)
-    phone_pattern = r'\b(\d{10})\b'
-    phones = re.findall(phone_pattern, text_lower)
-    if phones:
-        result["phone"] = phones[0]
-    
+
+    # Gazetteers: earlier entries in each list win, as before, but only whole
+    # words match (so "it" no longer fires on "with")
+    found = scan_gazetteers(text_lower)
+    result["state"] = best_ranked(found["state"]).title()
+    result["city"] = best_ranked(found["city"]).title()
+    result["category"] = best_ranked(found["category"]).title()
+    result["products"] = [keyword.title() for keyword in sorted(found["product"], key=found["product"].get)][:3]
+
+    # Structured fields: first match of each kind
+    result.update(scan_fields(text_lower))
+
     # Extract person name (look for patterns like "my name is", "I am", etc.)
-    person_patterns = [
-        r'(?:my name is|i am|this is)\s+([a-zA-Z\s]+?)(?:\s+(?:and|so|feed|my|i))',
-        r'(?:i\'m|i am)\s+([a-zA-Z\s]+?)(?:\s+(?:and|so|feed|my))',
-    ]
-    
-    for pattern in person_patterns:
-        match = re.search(pattern, text_lower)
+    for pattern in PERSON_NAME_PATTERNS:
+        match = pattern.search(text_lower)
         if match:
             name = match.group(1).strip().title()
             if len(name) > 2 and len(name) < 50:
                 result["personName"] = name
                 break
-    
+
     # Extract business name (look for patterns like "my business is", "we are", "my name is", etc.)
-    name_patterns = [
-        r'(?:my name is|my business is|i own|we are|this is)\s+([a-zA-Z\s]+?)(?:\s+(?:in|at|and|located|so|feed))',
-        r'business\s+name\s+is\s+([a-zA-Z\s]+?)(?:\s+(?:and|we|located))',
-        r'we\s+are\s+([a-zA-Z\s]+?)(?:\s+(?:and|we|located|in))',
-        r'name\s+is\s+([a-zA-Z\s]+?)(?:\s+(?:and|so|feed))'
-    ]
-    
-    for pattern in name_patterns:
-        match = re.search(pattern, text_lower)
+    for pattern in BUSINESS_NAME_PATTERNS:
+        match = pattern.search(text_lower)
         if match:
             name = match.group(1).strip().title()
             if len(name) > 2 and len(name) < 50:
                 result["name"] = name
                 break
-    
+
     # Extract address (look for address patterns)
-    address_patterns = [
-        r'(?:located|address|at|in)\s+([a-zA-Z0-9\s,]+?)(?:\s+(?:city|and|we|phone|state))',
-        r'address\s+is\s+([a-zA-Z0-9\s,]+?)(?:\s+(?:city|and|we|phone|state))'
-    ]
-    
-    for pattern in address_patterns:
-        match = re.search(pattern, text_lower)
+    for pattern in ADDRESS_PATTERNS:
+        match = pattern.search(text_lower)
         if match:
             address = match.group(1).strip().title()
             if len(address) > 3 and len(address) < 100:
                 result["address"] = address
                 break
-    
-    # Extract category
-    categories = {
-        "retail": ["retail", "shop", "store", "grocery", "market", "supermarket"],
-        "food & restaurant": ["food", "restaurant", "cafe", "hotel", "eatery", "sweet", "treat", "bakery"],
-        "services": ["service", "consulting", "repair", "maintenance"],
-        "manufacturing": ["manufacturing", "factory", "production"],
-        "healthcare": ["health", "medical", "hospital", "clinic", "pharmacy"],
-        "education": ["education", "school", "college", "tuition", "institute"],
-        "technology": ["tech", "software", "computer", "it"],
-        "agriculture": ["agriculture", "farming", "crops", "seeds"],
-        "textile": ["textile", "clothing", "garments", "fashion"],
-        "automotive": ["automotive", "car", "vehicle", "motor"]
-    }
-    
-    for category, keywords in categories.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                result["category"] = category.title()
-                break
-        if result["category"]:
-            break
-    
-    # Extract products (simple keyword matching)
-    product_keywords = ["vegetable", "fruit", "rice", "milk", "bread", "sweet", "snack", "food", "grocery"]
-    found_products = []
-    
-    for keyword in product_keywords:
-        if keyword in text_lower:
-            # Handle plural forms
-            if keyword.endswith('y'):
-                plural = keyword[:-1] + 'ies'
-            else:
-                plural = keyword + 's'
-            
-            # Check both singular and plural
-            if keyword in text_lower:
-                found_products.append(keyword.title())
-            elif plural in text_lower:
-                found_products.append(plural.title())
-    
-    result["products"] = found_products[:3]  # Limit to 3 products
-    
+
     return result
 
 # ================== PRODUCT EXTRACTION ==================
 def extract_products(text):
+    """Return ``(products, source)``; source is "llm", "rules" or "fallback" (see extract_business_info).
+
+    A transcript over the product token budget is split into several
+    prompts (see extract_products_by_chunk).
+    """
+    if not llm_backend("products").uses_llm:
+        return extract_products_fallback(text), "rules"
+    pieces = split_transcript(text, budget_chars("products"))
+    if len(pieces) > 1:
+        return extract_products_by_chunk(pieces)
     try:
-        prompt = f"""
-Extract comprehensive product list from this speech. The speech may be in English only english.
-
-"{text}"
-
-Return ONLY JSON ARRAY:
-[
-  {{"name":"","price":0,"category":"","description":"","unit":"","quantity":0}}
-]
-Rules:
-- English only english speech processing
-- Listen carefully for quantities like "2 kg", "1 kg", "500 grams", "5 pcs", "3 liters" and extract the unit and quantity
-- Listen VERY carefully for prices like "250 rupees", "120 rupees per kg", "50 rupees each", "at 100", "costs 50", "price 30" and extract the NUMERIC price only
-- Extract product categories (Food, Electronics, Clothing, Books, Toys, Home & Kitchen, Sports, Beauty, Health, etc.)
-- Extract product descriptions (quality, features, specifications, brand details)
-- Listen for quantity numbers (2, 5, 10, etc.) and separate from unit
-- Common units: kg, grams, pcs, pieces, liters, ml, dozen, packet, bottle, box, set, meter, cm, inch
-- If no unit is mentioned, use "pcs"
-- If no price is mentioned, use 0
-- If no quantity is mentioned, use 1
-- Convert spoken numbers to digits (two -> 2, five -> 5, ten -> 10, twenty -> 20, fifty -> 50, hundred -> 100)
-- "per kg" = unit kg, "each" = unit pcs, "per piece" = unit pcs, "per liter" = unit liters
-- Focus on clear English product names and information only
-- Handle multiple products in the same speech
-- Extract product names exactly as spoken (brand names, variations, etc)
-- IMPORTANT: Extract actual price numbers, don't default to 1 or 0 unless no price is mentioned
-"""
-        res = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role":"user","content":prompt}],
-            temperature=0
-        )
-        content = res.choices[0].message.content
-        json_str = content[content.find("["):content.rfind("]")+1]
-        return json.loads(json_str)
+        products = parse_llm_json(llm_complete(prompt_messages("products", text), "products"))["products"]
+        if not isinstance(products, list):
+            raise ValueError(f"Expected a products array, got {type(products).__name__}")
+        return products, "llm"
     except Exception as e:
-        print(f"Product API Error: {e}")
+        log("Product extraction LLM error, using fallback", logging.WARNING, error=str(e))
         # Fallback to basic product extraction from transcription
-        return extract_products_fallback(text)
+        with stage_timer("fallback"):
+            return extract_products_fallback(text), "fallback"
+
+# Rule-based product parser used when the LLM is unavailable. The transcript is
+# tokenized once, spoken numbers are folded into numeric tokens, and a single
+# left-to-right walk assembles name / quantity / unit / price for each item.
+PRODUCT_CATEGORY_KEYWORDS = {
+    "Food": ["tomato", "potato", "onion", "vegetable", "fruit", "rice", "wheat", "flour", "milk", "bread", "egg", "chicken", "meat", "fish", "sugar", "salt", "oil", "tea", "coffee", "butter", "cheese", "curd", "sweet", "snack", "chocolate", "biscuit", "dal", "atta", "ghee", "paneer", "mango", "apple", "banana"],
+    "Electronics": ["phone", "laptop", "computer", "tablet", "camera", "tv", "headphone", "speaker"],
+    "Clothing": ["shirt", "pants", "dress", "jeans", "t-shirt", "jacket", "shoes", "socks"],
+    "Home & Kitchen": ["soap", "shampoo", "toothpaste", "detergent", "paper", "pen", "plate", "cup", "bowl"],
+    "Books": ["book", "notebook", "pen", "paper"],
+    "Toys": ["toy", "game", "puzzle", "doll"],
+    "Sports": ["ball", "bat", "racket", "shoes", "equipment"],
+    "Beauty": ["lipstick", "cream", "makeup", "perfume", "shampoo", "soap"],
+    "Health": ["medicine", "tablet", "vitamin", "cream", "oil"]
+}
+
+# keyword -> category; the first category listing a keyword wins, as before
+PRODUCT_CATEGORY_BY_KEYWORD = {}
+for _category, _keywords in PRODUCT_CATEGORY_KEYWORDS.items():
+    for _keyword in _keywords:
+        PRODUCT_CATEGORY_BY_KEYWORD.setdefault(_keyword, _category)
+
+PRODUCT_UNITS = {
+    "kg": "kg", "kgs": "kg", "kilo": "kg", "kilos": "kg", "kilogram": "kg", "kilograms": "kg",
+    "g": "grams", "gm": "grams", "gms": "grams", "gram": "grams", "grams": "grams",
+    "pc": "pcs", "pcs": "pcs", "piece": "pcs", "pieces": "pcs",
+    "l": "liters", "ltr": "liters", "liter": "liters", "liters": "liters", "litre": "liters", "litres": "liters",
+    "ml": "ml", "dozen": "dozen", "dozens": "dozen",
+    "packet": "packet", "packets": "packet", "pack": "packet", "packs": "packet",
+    "bottle": "bottle", "bottles": "bottle", "box": "box", "boxes": "box", "bag": "bag", "bags": "bag",
+    "set": "set", "sets": "set", "meter": "meter", "meters": "meter", "metre": "meter", "metres": "meter",
+    "cm": "cm", "inch": "inch", "inches": "inch"
+}
+CURRENCY_WORDS = {"rupee", "rupees", "rs", "inr", "₹", "bucks"}
+# Words that announce a price: "at 100", "for 50", "costs 30", "rs 20", "₹20"
+PRICE_MARKERS = {"at", "@", "for", "cost", "costs", "price", "priced", "rate", "rs", "inr", "₹", "mrp"}
+PRODUCT_SEPARATORS = {",", ";", ".", "!", "?", "and", "then", "also", "next", "plus"}
+# Whisper punctuates dictation ("Milk, 2 litres, 60 rupees."), so punctuation
+# only ends an item once it has a price or when a new name follows
+PRODUCT_PUNCTUATION = {",", ";", ".", "!", "?"}
+PRODUCT_STOPWORDS = {
+    "add", "adding", "i", "we", "have", "has", "sell", "selling", "sells", "the", "a", "an", "of", "is",
+    "are", "it", "its", "my", "our", "products", "product", "item", "items", "with", "in", "only", "please",
+    "list", "per", "each", "to", "be", "will", "would", "like", "want", "there", "this", "that", "these",
+    "those", "available", "stock", "new", "um", "uh", "so", "okay", "ok", "here", "you", "can", "get",
+    "rupee", "rupees", "bucks", "quantity", "unit", "about", "around", "just"
+}
+
+SPOKEN_NUMBERS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30,
+    "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90
+}
+SPOKEN_SCALES = {"hundred": 100, "thousand": 1000, "lakh": 100000, "lakhs": 100000}
+
+PRODUCT_TOKEN_RE = re.compile(r"\d+(?:\.\d+)?|[a-z]+(?:[-'][a-z]+)*|[₹@,;.!?]")
+
+def tokenize_products_text(text_lower):
+    """Tokens with spoken numbers folded into floats ("two hundred and fifty" -> 250.0).
+
+    "and" only joins a number after a scale word, so "six and seven mangoes"
+    stays two numbers; "and a half" adds 0.5 ("two and a half" -> 2.5).
+    """
+    raw = PRODUCT_TOKEN_RE.findall(text_lower)
+    tokens = []
+    i = 0
+    while i < len(raw):
+        token = raw[i]
+        if token in SPOKEN_NUMBERS or (token in SPOKEN_SCALES and i + 1 < len(raw)
+                                       and raw[i - 1:i] == ["a"]):
+            total, current = 0, 0
+            while i < len(raw):
+                token = raw[i]
+                if token in SPOKEN_NUMBERS:
+                    current += SPOKEN_NUMBERS[token]
+                elif token in SPOKEN_SCALES:
+                    scale = SPOKEN_SCALES[token]
+                    if scale == 100:
+                        current = max(current, 1) * 100
+                    else:
+                        total += max(current, 1) * scale
+                        current = 0
+                elif token == "and" and raw[i + 1:i + 3] == ["a", "half"]:
+                    current += 0.5
+                    i += 3
+                    break
+                elif token == "and" and raw[i - 1] in SPOKEN_SCALES and raw[i + 1:i + 2] \
+                        and raw[i + 1] in SPOKEN_NUMBERS:
+                    pass  # "two hundred and fifty"
+                else:
+                    break
+                i += 1
+            tokens.append(float(total + current))
+            continue
+        if token == "half" and i + 1 < len(raw) and raw[i + 1] in PRODUCT_UNITS:
+            tokens.append(0.5)
+        elif token[0].isdigit():
+            tokens.append(float(token))
+        else:
+            tokens.append(token)
+        i += 1
+    return tokens
+
+def singular(word):
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("oes") or word.endswith(("ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+def get_product_category(product_name):
+    """Helper function to determine product category"""
+    for word in product_name.lower().split():
+        category = PRODUCT_CATEGORY_BY_KEYWORD.get(word) or PRODUCT_CATEGORY_BY_KEYWORD.get(singular(word))
+        if category:
+            return category
+    return "General"  # Default category
+
+def as_number(value):
+    return int(value) if float(value).is_integer() else value
+
+def starts_product_name(token):
+    return isinstance(token, str) and token.isalpha() and token not in PRODUCT_STOPWORDS \
+        and token not in CURRENCY_WORDS and token not in PRICE_MARKERS and token not in PRODUCT_UNITS
 
 def extract_products_fallback(text):
     """Fallback function to extract products from transcription using basic text processing"""
-    import re
-    
-    text_lower = text.lower()
+    tokens = tokenize_products_text(text.lower())
     products = []
-    
-    # Look for product patterns with quantities and prices - improved patterns
-    product_patterns = [
-        # Pattern: product + quantity + unit + price (e.g., "2 kg tomatoes 50 rupees")
-        r'(\d+)\s+(kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box)\s+(\w+)\s+(?:at|@|for|rupees?|rs\.?|₹)\s*(\d+)',
-        # Pattern: product + unit + price (e.g., "tomatoes kg 50 rupees")
-        r'(\w+)\s+(kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box)\s+(?:at|@|for|rupees?|rs\.?|₹)\s*(\d+)',
-        # Pattern: product + price + unit (e.g., "tomatoes 50 rupees per kg")
-        r'(\w+)\s+(?:at|@|for|rupees?|rs\.?|₹)\s*(\d+)\s+(?:per\s+)?(kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box)',
-        # Pattern: product + price only (e.g., "tomatoes 50 rupees")
-        r'(\w+)\s+(?:at|@|for|rupees?|rs\.?|₹)\s*(\d+)',
-        # Pattern: quantity + product (e.g., "2 kg tomatoes")
-        r'(\d+)\s+(kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box)\s+(\w+)',
-        # Pattern: simple product mentions
-        r'(\w+)(?:\s+(?:kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box))?',
-    ]
-    
-    # Common product keywords
-    product_keywords = [
-        "tomato", "potato", "onion", "vegetable", "fruit", "rice", "wheat", "flour",
-        "milk", "bread", "egg", "chicken", "meat", "fish", "sugar", "salt", "oil",
-        "tea", "coffee", "butter", "cheese", "curd", "sweet", "snack", "chocolate",
-        "biscuit", "soap", "shampoo", "toothpaste", "detergent", "paper", "pen"
-    ]
-    
-    # Product categories mapping
-    category_keywords = {
-        "Food": ["tomato", "potato", "onion", "vegetable", "fruit", "rice", "wheat", "flour", "milk", "bread", "egg", "chicken", "meat", "fish", "sugar", "salt", "oil", "tea", "coffee", "butter", "cheese", "curd", "sweet", "snack", "chocolate", "biscuit"],
-        "Electronics": ["phone", "laptop", "computer", "tablet", "camera", "tv", "headphone", "speaker"],
-        "Clothing": ["shirt", "pants", "dress", "jeans", "t-shirt", "jacket", "shoes", "socks"],
-        "Home & Kitchen": ["soap", "shampoo", "toothpaste", "detergent", "paper", "pen", "plate", "cup", "bowl"],
-        "Books": ["book", "notebook", "pen", "paper"],
-        "Toys": ["toy", "game", "puzzle", "doll"],
-        "Sports": ["ball", "bat", "racket", "shoes", "equipment"],
-        "Beauty": ["lipstick", "cream", "makeup", "perfume", "shampoo", "soap"],
-        "Health": ["medicine", "tablet", "vitamin", "cream", "oil"]
-    }
-    
-    # Extract products using patterns
-    extracted_names = set()
-    
-    for pattern in product_patterns:
-        matches = re.findall(pattern, text_lower)
-        for match in matches:
-            if isinstance(match, tuple):
-                if len(match) == 4:  # quantity, unit, product, price
-                    quantity, unit, name, price = match
-                    if name not in extracted_names:
-                        extracted_names.add(name)
-                        category = get_product_category(name, category_keywords)
-                        products.append({
-                            "name": name.title(),
-                            "price": int(price),
-                            "category": category,
-                            "description": f"Fresh {name.title()}",
-                            "unit": unit,
-                            "quantity": int(quantity)
-                        })
-                elif len(match) == 3:  # product, unit, price OR product, price, unit
-                    if match[1].isdigit():  # product, price, unit
-                        name, price, unit = match
-                        if name not in extracted_names:
-                            extracted_names.add(name)
-                            category = get_product_category(name, category_keywords)
-                            products.append({
-                                "name": name.title(),
-                                "price": int(price),
-                                "category": category,
-                                "description": f"Fresh {name.title()}",
-                                "unit": unit,
-                                "quantity": 1
-                            })
-                    else:  # product, unit, price
-                        name, unit, price = match
-                        if name not in extracted_names:
-                            extracted_names.add(name)
-                            category = get_product_category(name, category_keywords)
-                            products.append({
-                                "name": name.title(),
-                                "price": int(price),
-                                "category": category,
-                                "description": f"Fresh {name.title()}",
-                                "unit": unit,
-                                "quantity": 1
-                            })
-                elif len(match) == 2:  # quantity, unit, product OR product, price
-                    if match[0].isdigit():  # quantity, unit, product
-                        quantity, unit, name = match
-                        if name not in extracted_names:
-                            extracted_names.add(name)
-                            category = get_product_category(name, category_keywords)
-                            products.append({
-                                "name": name.title(),
-                                "price": 0,
-                                "category": category,
-                                "description": f"Fresh {name.title()}",
-                                "unit": unit,
-                                "quantity": int(quantity)
-                            })
-                    else:  # product, price
-                        name, price = match
-                        if name not in extracted_names:
-                            extracted_names.add(name)
-                            category = get_product_category(name, category_keywords)
-                            products.append({
-                                "name": name.title(),
-                                "price": int(price),
-                                "category": category,
-                                "description": f"Fresh {name.title()}",
-                                "unit": "pcs",
-                                "quantity": 1
-                            })
-            else:  # single match
-                name = match.strip()
-                if len(name) > 2 and name not in extracted_names:
-                    extracted_names.add(name)
-                    category = get_product_category(name, category_keywords)
+    seen = set()
+    item = {}
+
+    def flush():
+        nonlocal item
+        words = item.get("name", [])
+        if words:
+            name = " ".join(words).title()
+            known = get_product_category(name) != "General"
+            # A bare word only counts as a product if it is a known product keyword
+            if "price" in item or "quantity" in item or known:
+                key = (name, item.get("unit", "pcs"))
+                if key not in seen:
+                    seen.add(key)
                     products.append({
-                        "name": name.title(),
-                        "price": 0,
-                        "category": category,
-                        "description": f"Fresh {name.title()}",
-                        "unit": "pcs",
-                        "quantity": 1
+                        "name": name,
+                        "price": as_number(item.get("price", 0)),
+                        "category": get_product_category(name),
+                        "description": f"Fresh {name}",
+                        "unit": item.get("unit", "pcs"),
+                        "quantity": as_number(item.get("quantity", 1))
                     })
-    
-    # Also look for product keywords directly
-    for keyword in product_keywords:
-        if keyword in text_lower and keyword not in extracted_names:
-            extracted_names.add(keyword)
-            category = get_product_category(keyword, category_keywords)
-            products.append({
-                "name": keyword.title(),
+        item = {}
+
+    price_pending = False
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+
+        if isinstance(token, float):
+            if following in PRODUCT_UNITS and not price_pending:
+                # "2 kg", "500 grams": a quantity; a second one starts the next item
+                if "quantity" in item and item.get("name"):
+                    flush()
+                item["quantity"], item["unit"] = token, PRODUCT_UNITS[following]
+                i += 2
+                continue
+            # The first price of an item sticks: in "25 rupees for one soap" the one is a count
+            if (price_pending or following in CURRENCY_WORDS) and "price" not in item:
+                item["price"] = token
+                price_pending = False
+                i += 2 if following in CURRENCY_WORDS else 1
+                # "50 rupees per kg" / "50 rupees each"
+                if i < len(tokens) and tokens[i] in ("per", "a") and i + 1 < len(tokens) \
+                        and tokens[i + 1] in PRODUCT_UNITS:
+                    item["unit"] = PRODUCT_UNITS[tokens[i + 1]]
+                    i += 2
+                continue
+            price_pending = False
+            # A bare number only reads as a count in front of a name ("5 mangoes");
+            # elsewhere ("open from nine to nine") it is ignored
+            if "quantity" not in item and not item.get("name"):
+                item["quantity"] = token
+            i += 1
+            continue
+
+        if token in PRICE_MARKERS and (isinstance(following, float) or following in PRICE_MARKERS):
+            price_pending = True
+        elif token in PRODUCT_PUNCTUATION:
+            if "price" in item or starts_product_name(following):
+                flush()
+                price_pending = False
+        elif token in PRODUCT_SEPARATORS:
+            # "and" inside a name ("salt and pepper") is rare next to prices; treat it as a boundary
+            flush()
+            price_pending = False
+        elif token == "per" and following in PRODUCT_UNITS:
+            item["unit"] = PRODUCT_UNITS[following]
+            i += 2
+            continue
+        elif token == "each":
+            item.setdefault("unit", "pcs")
+        elif token in PRODUCT_UNITS and "unit" not in item and item.get("name"):
+            item["unit"] = PRODUCT_UNITS[token]  # "tomatoes kg 50 rupees"
+        elif token not in PRODUCT_STOPWORDS and token not in CURRENCY_WORDS and token not in PRICE_MARKERS:
+            if "price" in item and item.get("name"):
+                flush()  # "rice 50 rupees dal 80 rupees"
+            item.setdefault("name", []).append(token)
+        i += 1
+
+    flush()
+    return products
+
+# ================== TRANSCRIPTION ==================
+CHUNK_EXECUTOR = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="chunk")
+BOUNDARY_MATCH_WORDS = 12  # longest repeated phrase looked for where overlapping chunks meet
+# Audio kept either side of a run of escalated segments, for the words Whisper's timestamps clip
+ESCALATION_PAD_SECONDS = 0.2
+ESCALATION_PROMPT_CHARS = 200  # preceding transcript given to the escalation model as context
+
+def transcribe_audio(audio, profile="default", on_segment=None):
+    """Transcribe a file path, a binary file-like object or a 16 kHz float32 PCM array.
+
+    faster-whisper decodes lazily, so ``on_segment`` is called with each
+    ``{"start", "end", "text"}`` segment as soon as it has been decoded.
+    Returns ``(transcript, audio_info)`` where ``audio_info`` holds the clip
+    duration and, when the profile enables VAD, how much silence was removed.
+    Recordings of LONG_AUDIO_SECONDS or more are decoded in parallel chunks
+    (see transcribe_chunked) and ``audio_info["chunks"]`` lists them. Each
+    segment's ``tier`` names the profile that decoded it; for a tiered
+    profile ``audio_info["tiers"]`` counts the segments per tier.
+    """
+    if hasattr(audio, "seek"):
+        audio.seek(0)
+    settings = TRANSCRIPTION_PROFILES[profile]
+    if not isinstance(audio, np.ndarray):
+        audio = decode_audio(audio, sampling_rate=SAMPLE_RATE)
+    if INFERENCE_SOCKET:
+        return remote_transcribe(audio, profile, on_segment)
+    if len(audio) >= LONG_AUDIO_SECONDS * SAMPLE_RATE:
+        return transcribe_chunked(audio, profile, on_segment)
+
+    timestamps_map = None
+    audio_info = {"duration": round(len(audio) / SAMPLE_RATE, 2), "vad": None}
+    if settings["vad_filter"]:
+        with stage_timer("vad"):
+            audio, timestamps_map, audio_info["vad"] = trim_silence(audio, settings["vad_parameters"])
+        if audio_info["vad"]["speech_seconds"] == 0:
+            return "", audio_info
+
+    segments = []
+    for segment in decode_segments(audio, profile):
+        if timestamps_map is not None:
+            # Map times in the trimmed audio back onto the original recording
+            segment["start"] = timestamps_map.get_original_time(segment["start"])
+            segment["end"] = timestamps_map.get_original_time(segment["end"])
+        segment["start"], segment["end"] = round(segment["start"], 2), round(segment["end"], 2)
+        segments.append(segment)
+        if on_segment:
+            on_segment(segment)
+    if settings["escalate_to"]:
+        audio_info["tiers"] = count_tiers(profile, segments)
+    return " ".join(segment["text"] for segment in segments), audio_info
+
+def decode_segments(audio, profile):
+    """Decode PCM with a profile's model, yielding ``{"start", "end", "text", "tier"}`` as segments are decoded.
+
+    Times are seconds into ``audio``. For a tiered profile (``escalate_to``),
+    each run of consecutive segments failing needs_escalation() is decoded
+    again by the escalation profile's model and replaced by its segments;
+    confident segments are yielded straight from the first pass.
+    """
+    settings = TRANSCRIPTION_PROFILES[profile]
+    pending = []
+    previous_text = ""
+    for seg in get_model(profile).transcribe(audio, **decode_options(settings))[0]:
+        segment = {"start": seg.start, "end": seg.end, "text": seg.text.strip(), "tier": profile}
+        if settings["escalate_to"] and needs_escalation(seg, settings):
+            pending.append(segment)
+            continue
+        if pending:
+            for escalated in escalate_segments(audio, pending, settings["escalate_to"], previous_text):
+                previous_text += " " + escalated["text"]
+                yield escalated
+            pending = []
+        previous_text += " " + segment["text"]
+        yield segment
+    if pending:
+        yield from escalate_segments(audio, pending, settings["escalate_to"], previous_text)
+
+def needs_escalation(seg, settings):
+    return (seg.avg_logprob < settings["escalate_avg_logprob"]
+            or seg.no_speech_prob > settings["escalate_no_speech_prob"]
+            or seg.compression_ratio > settings["escalate_compression_ratio"]
+            or (settings["escalate_invalid_fields"] and has_invalid_fields(seg.text)))
+
+def escalate_segments(audio, run, profile, previous_text):
+    """Re-decode the audio under a run of first-pass segments with ``profile``'s model."""
+    start = max(0, int((run[0]["start"] - ESCALATION_PAD_SECONDS) * SAMPLE_RATE))
+    end = min(len(audio), int((run[-1]["end"] + ESCALATION_PAD_SECONDS) * SAMPLE_RATE))
+    settings = TRANSCRIPTION_PROFILES[profile]
+    offset = start / SAMPLE_RATE
+    context = previous_text[-ESCALATION_PROMPT_CHARS:].strip() or None
+    with stage_timer("escalate"):
+        segments, _ = get_model(profile).transcribe(audio[start:end], initial_prompt=context,
+                                                    **decode_options(settings))
+        return [{"start": seg.start + offset, "end": seg.end + offset, "text": seg.text.strip(), "tier": profile}
+                for seg in segments]
+
+# The number read out right after a phone or pincode cue ("mobile number is
+# 98765 43210", "pin code 411-001"): digits joined by at most one space or
+# hyphen, so "45000 rupees" or "1999 2000" elsewhere are never checked. A
+# run of 5+ digits must have 6 (pincode), 10 or 12 (91 + phone) digits.
+FIELD_DIGITS_RE = re.compile(r"\b(?:phone|mobile|mob|contact|whatsapp|pin ?code|pin|postal code)\b"
+                             r"\D{0,25}?(\+?\d(?:[ -]?\d)*)", re.IGNORECASE)
+VALID_FIELD_DIGITS = {6, 10, 12}
+
+def has_invalid_fields(text):
+    """True when a segment reads out a phone number, pincode or email the small model likely garbled."""
+    for match in FIELD_DIGITS_RE.finditer(text):
+        digits = sum(char.isdigit() for char in match.group(1))
+        if digits >= 5 and digits not in VALID_FIELD_DIGITS:
+            return True
+    return "@" in text and not EMAIL_RE.search(text.lower())
+
+def count_tiers(profile, segments):
+    tiers = {}
+    for segment in segments:
+        tiers[segment["tier"]] = tiers.get(segment["tier"], 0) + 1
+    for tier, count in tiers.items():
+        TIER_SEGMENTS.labels(profile=profile, tier=tier).inc(count)
+    return tiers
+
+def decode_options(settings):
+    return {
+        "language": settings["language"],
+        "beam_size": settings["beam_size"],
+        "best_of": settings["best_of"],
+        "vad_filter": False,  # silence is removed by trim_silence / the chunk planner
+        "condition_on_previous_text": settings["condition_on_previous_text"]
+    }
+
+def vad_stats(audio_seconds, speech_seconds, speech_regions):
+    return {
+        "audio_seconds": audio_seconds,
+        "speech_seconds": speech_seconds,
+        "removed_seconds": round(audio_seconds - speech_seconds, 2),
+        "removed_ratio": round(1 - speech_seconds / audio_seconds, 3) if audio_seconds else 0.0,
+        "speech_regions": speech_regions
+    }
+
+def trim_silence(audio, vad_parameters):
+    """Drop non-speech regions with the Silero VAD bundled in faster-whisper.
+
+    Returns the speech-only PCM, a map from trimmed to original timestamps and
+    a summary of how much audio was removed.
+    """
+    if not isinstance(audio, np.ndarray):
+        audio = decode_audio(audio, sampling_rate=SAMPLE_RATE)
+    speech_chunks = get_speech_timestamps(audio, VadOptions(**vad_parameters))
+    speech = collect_chunks(audio, speech_chunks) if speech_chunks else np.zeros(0, dtype=np.float32)
+
+    stats = vad_stats(round(len(audio) / SAMPLE_RATE, 2), round(len(speech) / SAMPLE_RATE, 2), len(speech_chunks))
+    log("VAD trimmed silence", audio_seconds=stats["audio_seconds"], speech_seconds=stats["speech_seconds"],
+        removed_seconds=stats["removed_seconds"])
+    return speech, SpeechTimestampsMap(speech_chunks, SAMPLE_RATE), stats
+
+def transcribe_chunked(audio, profile, on_segment=None):
+    """Split a long recording at VAD silences and decode the chunks in parallel.
+
+    Chunks are decoded on CHUNK_EXECUTOR (one model replica each, up to the
+    profile's num_workers), each through decode_segments; segments are still delivered to ``on_segment`` in
+    order, and words repeated where a forced split made two chunks overlap
+    are dropped from the later chunk.
+    """
+    settings = TRANSCRIPTION_PROFILES[profile]
+    audio_seconds = round(len(audio) / SAMPLE_RATE, 2)
+    with stage_timer("vad"):
+        speech_regions = get_speech_timestamps(audio, VadOptions(**settings["vad_parameters"]))
+    if not speech_regions and not settings["vad_filter"]:
+        # Profiles without VAD still decode everything; just cut at fixed windows
+        speech_regions = [{"start": 0, "end": len(audio)}]
+    chunks = plan_chunks(speech_regions, len(audio))
+    audio_info = {"duration": audio_seconds, "vad": None, "chunks": []}
+    if settings["vad_filter"]:
+        speech_seconds = round(sum(region["end"] - region["start"] for region in speech_regions) / SAMPLE_RATE, 2)
+        audio_info["vad"] = vad_stats(audio_seconds, speech_seconds, len(speech_regions))
+    log("Transcribing long recording in chunks", audio_seconds=audio_seconds, chunks=len(chunks),
+        workers=CHUNK_WORKERS, profile=profile)
+
+    futures = [CHUNK_EXECUTOR.submit(contextvars.copy_context().run, transcribe_chunk, profile, audio, chunk)
+               for chunk in chunks]
+    texts = []
+    previous_words = []
+    all_segments = []
+    for chunk, future in zip(chunks, futures):
+        segments = future.result()
+        segments = drop_leading_words(segments, repeated_word_count(previous_words, segments))
+        chunk_text = " ".join(segment["text"] for segment in segments)
+        for segment in segments:
+            if on_segment:
+                on_segment(segment)
+        all_segments.extend(segments)
+        texts.append(chunk_text)
+        previous_words = (previous_words + chunk_text.split())[-BOUNDARY_MATCH_WORDS:]
+        audio_info["chunks"].append({"start": round(chunk["start"] / SAMPLE_RATE, 2),
+                                     "end": round(chunk["end"] / SAMPLE_RATE, 2),
+                                     "text": chunk_text})
+    if settings["escalate_to"]:
+        audio_info["tiers"] = count_tiers(profile, all_segments)
+    return " ".join(text for text in texts if text), audio_info
+
+def plan_chunks(speech_regions, total_samples):
+    """Group VAD speech regions into chunks of at most CHUNK_SECONDS.
+
+    Cuts fall in the silence between regions (halfway through the gap), so
+    the chunks tile the recording. A region longer than a chunk is split
+    into overlapping windows, the only place text can repeat across chunks.
+    Each chunk is ``{"start", "end", "regions"}`` in samples.
+    """
+    target = int(CHUNK_SECONDS * SAMPLE_RATE)
+    overlap = int(CHUNK_OVERLAP_SECONDS * SAMPLE_RATE)
+    pieces = []
+    for region in speech_regions:
+        start, end = region["start"], region["end"]
+        while end - start > target:
+            pieces.append({"start": start, "end": start + target})
+            start += target - overlap
+        pieces.append({"start": start, "end": end})
+
+    groups = []
+    for piece in pieces:
+        if groups and piece["end"] - groups[-1][0]["start"] <= target:
+            groups[-1].append(piece)
+        else:
+            groups.append([piece])
+
+    chunks = []
+    for i, group in enumerate(groups):
+        start = chunks[-1]["end"] if chunks else 0
+        if i + 1 < len(groups):
+            gap_start, gap_end = group[-1]["end"], groups[i + 1][0]["start"]
+            end = (gap_start + gap_end) // 2 if gap_end > gap_start else gap_start
+        else:
+            end = total_samples
+        chunks.append({"start": min(start, group[0]["start"]), "end": end, "regions": group})
+    return chunks
+
+def transcribe_chunk(profile, audio, chunk):
+    """Decode one chunk; returns its segments with times on the original recording."""
+    settings = TRANSCRIPTION_PROFILES[profile]
+    if settings["vad_filter"]:
+        chunk_audio = collect_chunks(audio, chunk["regions"])
+        timestamps_map = SpeechTimestampsMap(chunk["regions"], SAMPLE_RATE)
+        original_time = timestamps_map.get_original_time
+    else:
+        chunk_audio = audio[chunk["start"]:chunk["end"]]
+        offset = chunk["start"] / SAMPLE_RATE
+        original_time = lambda t: t + offset
+    return [{**segment, "start": round(original_time(segment["start"]), 2),
+             "end": round(original_time(segment["end"]), 2)} for segment in decode_segments(chunk_audio, profile)]
+
+def normalized_words(text):
+    return [word.strip(".,!?;:'\"").lower() for word in text.split()]
+
+def repeated_word_count(previous_words, segments):
+    """Length of the longest run of words ending the previous chunk that also starts this one."""
+    head = normalized_words(" ".join(segment["text"] for segment in segments[:3]))
+    tail = normalized_words(" ".join(previous_words))
+    for size in range(min(len(head), len(tail), BOUNDARY_MATCH_WORDS), 0, -1):
+        if head[:size] == tail[-size:]:
+            return size
+    return 0
+
+def drop_leading_words(segments, count):
+    segments = [dict(segment) for segment in segments]
+    while count and segments:
+        words = segments[0]["text"].split()
+        if len(words) <= count:
+            count -= len(words)
+            segments.pop(0)
+        else:
+            segments[0]["text"] = " ".join(words[count:])
+            count = 0
+    return segments
+
+def read_upload(audio, name):
+    """Keep an uploaded clip in memory, spilling to UPLOAD_FOLDER only above SPILL_TO_DISK_BYTES.
+
+    Returns ``(audio, sha256)`` where audio is a BytesIO for small clips or
+    the path of the spilled file, and sha256 is the hex digest of the bytes.
+    """
+    digest = hashlib.sha256()
+    head = audio.stream.read(SPILL_TO_DISK_BYTES + 1)
+    digest.update(head)
+    if len(head) <= SPILL_TO_DISK_BYTES:
+        return io.BytesIO(head), digest.hexdigest()
+
+    path = os.path.join(UPLOAD_FOLDER, name)
+    with open(path, "wb") as f:
+        f.write(head)
+        for chunk in iter(lambda: audio.stream.read(1024 * 1024), b""):
+            digest.update(chunk)
+            f.write(chunk)
+    return path, digest.hexdigest()
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def discard_upload(audio):
+    if isinstance(audio, str):
+        if os.path.exists(audio):
+            os.remove(audio)
+    else:
+        audio.close()
+
+def probe_duration(audio):
+    """Duration in seconds of an uploaded clip, read from its container without decoding it.
+
+    MediaRecorder webm files carry no duration header, so for those the
+    packet durations are summed instead (a demux only, still far cheaper
+    than a decode). Raises ``av.error.FFmpegError`` for unreadable audio.
+    """
+    try:
+        with av.open(audio, metadata_errors="ignore") as container:
+            if container.duration is not None:
+                return container.duration / av.time_base
+            stream = container.streams.audio[0]
+            ticks = sum(packet.duration or 0 for packet in container.demux(stream))
+            return float(ticks * stream.time_base)
+    finally:
+        if not isinstance(audio, str):
+            audio.seek(0)
+
+# ================== TRANSCODING ==================
+# Admitted uploads are demuxed, decoded and resampled to 16 kHz mono PCM in a
+# pool of processes (transcode.py) while they wait in the job queue, so the
+# next clip is transcoded while the worker threads run the model on the
+# current one, and PyAV never competes with inference for the GIL. Each job
+# lane has its own pool (the lane's "transcode_workers"), so a burst of long
+# dictations never holds up the transcoding of short interactive clips. The
+# stage also rejects unusable audio (no audio stream, a sample rate below
+# MIN_SAMPLE_RATE, longer than MAX_AUDIO_SECONDS once decoded) before any
+# model time is spent on it. Jobs without a transcode future -- batch clips,
+# or a lane with no transcoding processes -- are transcoded inline by their worker.
+TRANSCODE_EXECUTORS = {}  # lane -> ProcessPoolExecutor, started on first use
+TRANSCODE_LOCK = threading.Lock()
+
+def transcode_executor(lane):
+    with TRANSCODE_LOCK:
+        if lane not in TRANSCODE_EXECUTORS:
+            # Spawned workers import transcode.py, and this module too when it is
+            # the main script (`python app.py`), without loading models (see is_pool_worker)
+            TRANSCODE_EXECUTORS[lane] = ProcessPoolExecutor(max_workers=JOB_LANES[lane]["transcode_workers"],
+                                                            mp_context=multiprocessing.get_context("spawn"))
+        return TRANSCODE_EXECUTORS[lane]
+
+def reset_transcode_executor(lane):
+    """Drop a lane's pool whose worker died; the next upload in the lane starts a fresh one."""
+    with TRANSCODE_LOCK:
+        broken = TRANSCODE_EXECUTORS.pop(lane, None)
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+def start_transcode(audio, lane):
+    """Queue an upload (BytesIO or spilled path) on its lane's pool; returns a future of its PCM, or None."""
+    if not JOB_LANES[lane]["transcode_workers"]:
+        return None
+    source = audio if isinstance(audio, str) else audio.getvalue()
+    try:
+        return transcode_executor(lane).submit(transcode, source, MAX_AUDIO_SECONDS, MIN_SAMPLE_RATE)
+    except BrokenProcessPool:
+        # A pool process died since the last job; the worker decodes this one inline
+        log("Transcoding pool broke, decoding inline", logging.WARNING, lane=lane)
+        reset_transcode_executor(lane)
+        return None
+
+def job_audio(job):
+    """The job's 16 kHz PCM, from its transcode future or decoded here.
+
+    The "transcode" stage times only what the worker waited for: close to
+    zero when the clip was transcoded while it was queued.
+    """
+    future = job.get("transcode")
+    with stage_timer("transcode"):
+        if future is not None:
+            try:
+                return future.result()
+            except BrokenProcessPool:
+                log("Transcoding pool broke, decoding inline", logging.WARNING, job_id=job["id"], lane=job["lane"])
+                reset_transcode_executor(job["lane"])
+            except CancelledError:
+                pass  # queued in a pool that was reset after another job broke it
+        if hasattr(job["audio"], "seek"):
+            job["audio"].seek(0)
+        # MAX_AUDIO_SECONDS limits uploads; archived recordings in a batch may be any length
+        max_seconds = None if job["options"].get("batch") else MAX_AUDIO_SECONDS
+        return transcode(job["audio"], max_seconds, MIN_SAMPLE_RATE)
+
+# ================== RESULT CACHE ==================
+# Content-addressed on-disk cache so re-uploads of the same recording skip the
+# decode and the LLM call. Keys combine the SHA-256 of the uploaded bytes with
+# the transcription profile settings (and the prompt version for extraction),
+# so changing either never serves a stale result. Entries are evicted least
+# recently used once CACHE_MAX_ENTRIES or CACHE_MAX_BYTES is exceeded.
+CACHE_FOLDER = os.getenv("CACHE_FOLDER", "cache")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+
+CACHE_INDEX = OrderedDict()  # key -> size in bytes, least recently used first
+CACHE_BYTES = 0
+CACHE_LOCK = threading.Lock()
+CACHE_STATS = {
+    "transcript": {"hits": 0, "misses": 0},
+    "extraction": {"hits": 0, "misses": 0}
+}
+
+def load_cache_index():
+    global CACHE_BYTES
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    entries = []
+    for name in os.listdir(CACHE_FOLDER):
+        if name.endswith(".json"):
+            stat = os.stat(os.path.join(CACHE_FOLDER, name))
+            entries.append((stat.st_mtime, name[:-5], stat.st_size))
+    for _, key, size in sorted(entries):
+        CACHE_INDEX[key] = size
+        CACHE_BYTES += size
+
+def cache_file(key):
+    return os.path.join(CACHE_FOLDER, f"{key}.json")
+
+def cache_key(*parts):
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+def cache_get(kind, key):
+    with CACHE_LOCK:
+        if key in CACHE_INDEX:
+            try:
+                with open(cache_file(key)) as f:
+                    value = json.load(f)
+                os.utime(cache_file(key))
+                CACHE_INDEX.move_to_end(key)
+                CACHE_STATS[kind]["hits"] += 1
+                return value
+            except (OSError, ValueError):
+                forget_cache_entry(key)
+        CACHE_STATS[kind]["misses"] += 1
+        return None
+
+def cache_put(key, value):
+    global CACHE_BYTES
+    payload = json.dumps(value, separators=(",", ":"))
+    tmp = f"{cache_file(key)}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        f.write(payload)
+    os.replace(tmp, cache_file(key))
+    with CACHE_LOCK:
+        if key in CACHE_INDEX:
+            CACHE_BYTES -= CACHE_INDEX.pop(key)
+        CACHE_INDEX[key] = len(payload)
+        CACHE_BYTES += len(payload)
+        while CACHE_INDEX and (len(CACHE_INDEX) > CACHE_MAX_ENTRIES or CACHE_BYTES > CACHE_MAX_BYTES):
+            forget_cache_entry(next(iter(CACHE_INDEX)))
+
+def forget_cache_entry(key):
+    """Drop an entry from the index and disk (caller holds CACHE_LOCK)."""
+    global CACHE_BYTES
+    CACHE_BYTES -= CACHE_INDEX.pop(key, 0)
+    try:
+        os.remove(cache_file(key))
+    except OSError:
+        pass
+
+def profile_signature(profile):
+    settings = TRANSCRIPTION_PROFILES[profile]
+    decode_settings = {name: settings[name] for name in (
+        "model_size", "compute_type", "beam_size", "best_of", "vad_filter",
+        "vad_parameters", "condition_on_previous_text", "language")}
+    if settings["escalate_to"]:
+        decode_settings["escalation"] = {name: settings[name] for name in (
+            "escalate_avg_logprob", "escalate_no_speech_prob", "escalate_compression_ratio",
+            "escalate_invalid_fields")}
+        decode_settings["escalation"]["profile"] = profile_signature(settings["escalate_to"])
+    return json.dumps(decode_settings, sort_keys=True)
+
+def extraction_signature(kind):
+    """Everything besides the transcript that decides an extraction: backend, model, prompt and budget."""
+    backend = llm_backend(kind)
+    return json.dumps({
+        "backend": backend.name,
+        "model": backend.model,
+        "prompt_version": PROMPT_VERSIONS[kind],
+        "transcript_tokens": TRANSCRIPT_TOKEN_BUDGETS[kind],
+        "json_mode": LLM_JSON_MODE
+    }, sort_keys=True)
+
+def cached_transcribe(job):
+    """transcribe_audio() for a job, served from the cache when the same audio was decoded with the same settings."""
+    on_segment = job_segment_callback(job["id"])
+    key = None
+    if CACHE_ENABLED and job["audio_hash"]:
+        key = cache_key("transcript", job["audio_hash"], profile_signature(job["profile"]))
+        cached = cache_get("transcript", key)
+        if cached is not None:
+            log("Transcript cache hit", audio_hash=job["audio_hash"][:12])
+            if job.get("transcode"):
+                job["transcode"].cancel()
+            for segment in cached["segments"]:
+                on_segment(segment)
+            return cached["transcript"], cached["audio"]
+
+    segments = []
+    def collect(segment):
+        segments.append(segment)
+        on_segment(segment)
+    audio = job_audio(job)
+    started = time.perf_counter()
+    with stage_timer("transcribe"):
+        transcript, audio_info = transcribe_audio(audio, job["profile"], on_segment=collect)
+    decode_seconds = time.perf_counter() - started
+    if audio_info["duration"]:
+        AUDIO_SECONDS.labels(profile=job["profile"]).inc(audio_info["duration"])
+        REAL_TIME_FACTOR.labels(profile=job["profile"]).observe(audio_info["duration"] / decode_seconds)
+
+    if key:
+        cache_put(key, {"transcript": transcript, "segments": segments, "audio": audio_info})
+    return transcript, audio_info
+
+def cached_extract(job, kind, transcript, extractor):
+    """Run an LLM extractor, reusing a cached result for the same audio, profile and extraction settings.
+
+    Returns ``(result, source)`` with source "cache" on a hit. Rule-based
+    fallback results are never cached, so a transient LLM failure does not
+    pin the weaker output.
+    """
+    key = None
+    if CACHE_ENABLED and job["audio_hash"]:
+        key = cache_key("extraction", kind, job["audio_hash"], profile_signature(job["profile"]),
+                        extraction_signature(kind))
+        cached = cache_get("extraction", key)
+        if cached is not None:
+            log("Extraction cache hit", kind=kind, audio_hash=job["audio_hash"][:12])
+            EXTRACTIONS.labels(kind=kind, source="cache").inc()
+            return cached, "cache"
+
+    with stage_timer("extract"):
+        result, source = extractor(transcript)
+    EXTRACTIONS.labels(kind=kind, source=source).inc()
+    if key and source == "llm":
+        cache_put(key, result)
+    return result, source
+
+if CACHE_ENABLED:
+    load_cache_index()
+
+# ================== PIPELINES ==================
+# Per-route extraction deadline in seconds (0: wait for the LLM). With one,
+# the rule-based extractor runs at once as a hedge; when the LLM misses the
+# deadline the rules' result is returned marked provisional and the session
+# is upgraded in the background once the LLM answer lands.
+EXTRACTION_DEADLINES = {
+    "business": float(os.getenv("EXTRACTION_DEADLINE_BUSINESS", "0")),
+    "products": float(os.getenv("EXTRACTION_DEADLINE_PRODUCTS", "0"))
+}
+# Per-chunk product prompts get their own pool: they are submitted from tasks
+# already running on EXTRACTION_EXECUTOR, which must not wait on itself.
+CHUNK_EXTRACTION_EXECUTOR = ThreadPoolExecutor(max_workers=2 * GROQ_MAX_CONCURRENCY,
+                                               thread_name_prefix="chunk-extraction")
+
+def products_extractor(audio_info):
+    """extract_products, or for a chunked recording a per-chunk extractor over its chunk texts."""
+    chunks = audio_info.get("chunks") or []
+    if len(chunks) < 2:
+        return extract_products
+    return lambda transcript: extract_products_by_chunk(group_chunk_texts(chunks))
+
+def group_chunk_texts(chunks):
+    """Join consecutive chunk transcripts into prompts within the product token budget.
+
+    Groups break between chunks; a chunk is only split when it alone is over budget.
+    """
+    groups = []
+    for chunk in chunks:
+        # An oversized chunk is split here, so extract_products never splits
+        # (and submits to CHUNK_EXTRACTION_EXECUTOR) from inside that pool
+        for text in split_transcript(chunk["text"], budget_chars("products")):
+            if groups and len(groups[-1]) + len(text) < budget_chars("products"):
+                groups[-1] += " " + text
+            else:
+                groups.append(text)
+    return groups
+
+def product_identity(product):
+    if not isinstance(product, dict):
+        return str(product).lower()
+    return (str(product.get("name", "")).lower(), product.get("price"), product.get("unit"), product.get("quantity"))
+
+def extract_products_by_chunk(texts):
+    """Run the product prompt on every chunk concurrently and merge the lists in order.
+
+    A product that opens a chunk exactly as it appeared among the last ones of
+    the previous chunk was read twice across the boundary and is dropped. The
+    source is "llm" only when every chunk's was, so partial fallbacks are not cached.
+    """
+    futures = [CHUNK_EXTRACTION_EXECUTOR.submit(contextvars.copy_context().run, extract_products, text)
+               for text in texts]
+    merged, sources = [], set()
+    for future in futures:
+        products, source = future.result()
+        sources.add(source)
+        boundary = {product_identity(product) for product in merged[-3:]}
+        for i, product in enumerate(products):
+            if i < 3 and product_identity(product) in boundary:
+                continue
+            merged.append(product)
+    source = sources.pop() if len(sources) == 1 else "fallback"
+    return merged, source
+
+def start_extraction(job, kind, transcript, extractor):
+    return EXTRACTION_EXECUTOR.submit(contextvars.copy_context().run, cached_extract, job, kind, transcript, extractor)
+
+def extraction_deadline(job):
+    """Monotonic time by which the job's extractions should answer, or None to wait for the LLM."""
+    seconds = EXTRACTION_DEADLINES.get(job["kind"], 0)
+    if not seconds or job["options"].get("batch"):
+        return None  # backfills have no one waiting and want the LLM result
+    return time.monotonic() + seconds
+
+def finish_extraction(kind, future, transcript, deadline):
+    """Wait for an extraction started by start_extraction().
+
+    With a deadline the rule-based extractor is run at once as a hedge: if
+    the LLM has not answered by then its result is returned instead, with
+    source "provisional", along with the still-running future (else None).
+    """
+    if deadline is None or not llm_backend(kind).uses_llm:
+        return (*future.result(), None)
+    with stage_timer("fallback"):
+        hedge = RULE_EXTRACTORS[kind](transcript)
+    try:
+        result, source = future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        HEDGED_EXTRACTIONS.labels(kind=kind, winner="rules").inc()
+        log("LLM extraction missed the deadline, returning the rule-based result", logging.WARNING, kind=kind)
+        return hedge, "provisional", future
+    HEDGED_EXTRACTIONS.labels(kind=kind, winner="llm").inc()
+    return result, source, None
+
+def format_products(products):
+    """Session product objects from extracted products, which may be bare names."""
+    formatted_products = []
+    for item in products:
+        if isinstance(item, str):
+            # Convert simple string to object format with new fields
+            formatted_products.append({
+                "name": item,
                 "price": 0,
-                "category": category,
-                "description": f"Fresh {keyword.title()}",
-                "unit": "pcs",
+                "category": "",
+                "description": f"Fresh {item}",
+                "unit": "",
                 "quantity": 1
             })
-    
-    # Remove duplicates and limit results
-    unique_products = []
-    seen = set()
-    for product in products:
-        key = (product["name"], product["unit"])
-        if key not in seen:
-            seen.add(key)
-            unique_products.append(product)
-    
-    return unique_products[:5]  # Limit to 5 products
+        elif isinstance(item, dict):
+            # Already in object format, ensure it has required fields
+            formatted_products.append({
+                "name": item.get("name", ""),
+                "price": item.get("price", 0),
+                "category": item.get("category", ""),
+                "description": item.get("description", ""),
+                "unit": item.get("unit", ""),
+                "quantity": item.get("quantity", 1)
+            })
+        else:
+            # Fallback for unexpected formats
+            formatted_products.append({
+                "name": str(item),
+                "price": 0,
+                "category": "",
+                "description": f"Fresh {item}",
+                "unit": "",
+                "quantity": 1
+            })
+    return formatted_products
 
-def get_product_category(product_name, category_keywords):
-    """Helper function to determine product category"""
-    product_lower = product_name.lower()
-    for category, keywords in category_keywords.items():
-        for keyword in keywords:
-            if keyword in product_lower:
-                return category
-    return "General"  # Default category
+def business_session_data(data):
+    session_data = {field: data.get(field, "") for field in BUSINESS_FIELDS}
+    # Ensure products is always an array of objects for consistent structure
+    session_data["products"] = format_products(data.get("products", []))
+    return session_data
 
-# ================== TRANSCRIPTION ==================
-def transcribe_audio(path):
-    segments, _ = model.transcribe(path, beam_size=5, language="en")
-    return " ".join(seg.text.strip() for seg in segments)
+def process_business_audio(job):
+    log("Starting transcription", job_id=job["id"], kind=job["kind"])
+    update_job(job["id"], status=JOB_TRANSCRIBING)
+    transcript, audio_info = cached_transcribe(job)
+    log("Transcription completed", job_id=job["id"], chars=len(transcript), duration=audio_info["duration"])
+
+    log("Starting business info extraction", job_id=job["id"])
+    update_job(job["id"], status=JOB_EXTRACTING)
+    deadline = extraction_deadline(job)
+    pending = {}
+    business_future = start_extraction(job, "business", transcript, extract_business_info)
+    extraction = {}
+    if job["options"].get("with_products"):
+        # Detailed product extraction runs alongside the business prompt
+        # instead of after it, so the slower of the two sets the latency.
+        products_future = start_extraction(job, "products", transcript, products_extractor(audio_info))
+        data, extraction["business"], pending["business"] = finish_extraction("business", business_future,
+                                                                              transcript, deadline)
+        products, extraction["products"], pending["products"] = finish_extraction("products", products_future,
+                                                                                  transcript, deadline)
+        data = {**data, "products": products or data.get("products", [])}
+    else:
+        data, extraction["business"], pending["business"] = finish_extraction("business", business_future,
+                                                                              transcript, deadline)
+    log("Extraction completed", job_id=job["id"], data=data, extraction=extraction)
+
+    session_filename = new_session_filename()
+    final_json = business_session_data(data)
+
+    with stage_timer("persist"), session_lock(session_filename):
+        # The job id names the product batch, so a late LLM result can replace it
+        write_session(session_filename, final_json, batch=job["id"])
+
+    log("Session saved", job_id=job["id"], filename=session_filename)
+    pending_upgrades = [(kind, future, session_filename, job["id"]) for kind, future in pending.items() if future]
+    if pending_upgrades:
+        update_job(job["id"], pending_upgrades=pending_upgrades)
+
+    return {
+        "data": final_json,
+        "filename": session_filename,
+        "transcription": transcript,
+        "audio": audio_info,
+        "extraction": extraction,
+        "provisional": "provisional" in extraction.values()
+    }
+
+def process_product_audio(job):
+    log("Starting transcription", job_id=job["id"], kind=job["kind"])
+    update_job(job["id"], status=JOB_TRANSCRIBING)
+    transcript, audio_info = cached_transcribe(job)
+    log("Transcription completed", job_id=job["id"], chars=len(transcript), duration=audio_info["duration"])
+
+    log("Starting product extraction", job_id=job["id"])
+    update_job(job["id"], status=JOB_EXTRACTING)
+    future = start_extraction(job, "products", transcript, products_extractor(audio_info))
+    products, source, pending = finish_extraction("products", future, transcript, extraction_deadline(job))
+    log("Product extraction completed", job_id=job["id"], products=products, source=source)
+
+    session_filename = job["session"]
+    if not session_filename:
+        # If no business session was given, create one for products only
+        log("No business session given, creating new session for products", job_id=job["id"])
+        session_filename = new_session_filename()
+    session_file = session_path(session_filename)
+
+    # Appends to the same session are serialized by the session lock, and each
+    # one only adds a line to the product log, so none can drop another's products.
+    with stage_timer("persist"), session_lock(session_filename):
+        if not os.path.exists(session_file):
+            # Create a basic business structure with new fields
+            session_data = {field: "" for field in BUSINESS_FIELDS}
+            session_data["products"] = []
+            write_session(session_filename, session_data)
+            log("Created new session", job_id=job["id"], filename=session_filename)
+
+        # 🔁 Append new products after the existing ones (phase 1 products are kept)
+        batch = append_session_products(session_filename, products)
+        session_data = read_session(session_filename)
+
+    log("Session updated with products", job_id=job["id"], filename=session_filename, added=len(products))
+    if pending is not None:
+        update_job(job["id"], pending_upgrades=[("products", pending, session_filename, batch)])
+
+    return {
+        "data": session_data,
+        "filename": session_filename,
+        "transcription": transcript,
+        "audio": audio_info,
+        "extraction": {"products": source},
+        "provisional": pending is not None
+    }
+
+def watch_provisional(job_id):
+    """Upgrade the job's session as each LLM extraction that missed the deadline completes.
+
+    Called once the job's result is stored, so an upgrade always finds it.
+    """
+    job = get_job(job_id)
+    for kind, future, filename, batch in job.get("pending_upgrades", []):
+        context = contextvars.copy_context()
+        future.add_done_callback(lambda done, kind=kind, filename=filename, batch=batch, context=context:
+                                 context.run(upgrade_session, job, kind, done, filename, batch))
+
+def upgrade_session(job, kind, future, filename, batch):
+    """Replace a provisional (rule-based) extraction in a session with the late LLM result.
+
+    Business fields are overwritten and product batch ``batch`` replaced in
+    place, so products appended since are kept. Nothing is changed when the
+    LLM failed as well, or when the session was saved from the editor since
+    (which rewrites the product log, dropping ``batch``).
+    """
+    try:
+        result, source = future.result()
+        if source not in ("llm", "cache"):
+            outcome = "failed"
+        else:
+            with stage_timer("persist"), session_lock(filename):
+                if batch not in (read_product_batches(filename) or {}):
+                    outcome = "skipped"
+                else:
+                    if kind == "business":
+                        upgraded = business_session_data(result)
+                        update_session_fields(filename, {field: upgraded[field] for field in BUSINESS_FIELDS})
+                        if not job["options"].get("with_products"):
+                            append_session_products(filename, upgraded["products"], batch=batch)
+                    elif result:
+                        products = format_products(result) if job["kind"] == "business" else result
+                        append_session_products(filename, products, batch=batch)
+                    outcome = "upgraded"
+                    record_upgrade(job["id"], kind, read_session(filename))
+    except Exception as e:
+        outcome = "failed"
+        log("Provisional session upgrade failed", logging.ERROR, exc_info=True, job_id=job["id"], filename=filename,
+            error=str(e))
+    SESSION_UPGRADES.labels(kind=kind, outcome=outcome).inc()
+    log("Provisional session resolved", job_id=job["id"], kind=kind, filename=filename, outcome=outcome)
+
+def record_upgrade(job_id, kind, session_data):
+    """Show an upgraded session in the finished job's result. Callers hold the session lock."""
+    job = get_job(job_id)
+    if job is None or not job["result"]:
+        return
+    extraction = {**job["result"]["extraction"], kind: "llm"}
+    update_job(job_id, result={**job["result"], "data": session_data, "extraction": extraction,
+                               "provisional": "provisional" in extraction.values()})
+
+def process_transcription(job):
+    log("Starting transcription", job_id=job["id"], kind=job["kind"])
+    update_job(job["id"], status=JOB_TRANSCRIBING)
+    transcript, audio_info = cached_transcribe(job)
+    log("Transcription completed", job_id=job["id"], chars=len(transcript), duration=audio_info["duration"])
+
+    return {
+        "transcription": transcript,
+        "segments": get_job(job["id"])["segments"],
+        "audio": audio_info
+    }
+
+PIPELINES = {
+    "business": process_business_audio,
+    "products": process_product_audio,
+    "transcribe": process_transcription
+}
+
+# Rule-based extractors per kind: partial results while streaming, and the hedge under a deadline
+RULE_EXTRACTORS = {
+    "business": extract_business_info_fallback,
+    "products": extract_products_fallback
+}
+
+# ================== JOB QUEUE ==================
+# Uploads are decoded by a small pool of worker threads that share the loaded
+# WhisperModel (CTranslate2 runs up to `num_workers` transcriptions in
+# parallel). Jobs wait in one of two priority lanes:
+#   interactive  business intakes and plain transcriptions
+#   bulk         product dictations and any clip of LONG_AUDIO_SECONDS or more
+# Workers always take interactive jobs first, and bulk jobs may hold at most
+# BULK_MAX_WORKERS workers, so a short intake never waits behind a backlog of
+# long dictations. Each lane is bounded twice: JOB_QUEUE_SIZE queued jobs and
+# an audio-seconds budget of queued plus running clips. An upload that would
+# overflow either is refused at once (429 for the budget, 503 for the queue)
+# with a Retry-After estimated from the recent decode rate.
+JOB_QUEUED = "queued"
+JOB_TRANSCRIBING = "transcribing"
+JOB_EXTRACTING = "extracting"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_FINISHED_STATES = (JOB_DONE, JOB_ERROR)
+
+JOB_LANES = {
+    # Highest priority first
+    "interactive": {
+        "max_workers": TRANSCRIBE_WORKERS,
+        "max_pending_audio_seconds": INTERACTIVE_PENDING_AUDIO_SECONDS,
+        "transcode_workers": TRANSCODE_WORKERS
+    },
+    "bulk": {
+        "max_workers": BULK_MAX_WORKERS,
+        "max_pending_audio_seconds": BULK_PENDING_AUDIO_SECONDS,
+        "transcode_workers": BULK_TRANSCODE_WORKERS
+    }
+}
+LANE_BY_KIND = {
+    "business": "interactive",
+    "transcribe": "interactive",
+    "products": "bulk"
+}
+RETRY_AFTER_MAX_SECONDS = 300
+
+class Overloaded(Exception):
+    """An upload refused by admission control; ``retry_after`` is in seconds.
+
+    ``status`` is 429 when the lane's audio budget is spent and 503 when its
+    queue is full.
+    """
+    def __init__(self, message, retry_after, status=429):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status = status
+
+class LaneQueue:
+    """Job ids in one bounded FIFO per lane, served in lane priority order.
+
+    get() returns the oldest job of the highest-priority lane that is below
+    its worker limit; the worker calls done(lane) when the job is finished.
+    """
+    def __init__(self, lanes, maxsize):
+        self.lanes = lanes
+        self.maxsize = maxsize
+        self.queues = {lane: deque() for lane in lanes}
+        self.running = {lane: 0 for lane in lanes}
+        self.condition = threading.Condition()
+
+    def put_nowait(self, job_id, lane):
+        with self.condition:
+            if len(self.queues[lane]) >= self.maxsize:
+                raise queue.Full
+            self.queues[lane].append(job_id)
+            self.condition.notify_all()
+
+    def get(self):
+        with self.condition:
+            while True:
+                for lane, settings in self.lanes.items():
+                    if self.queues[lane] and self.running[lane] < settings["max_workers"]:
+                        self.running[lane] += 1
+                        return self.queues[lane].popleft(), lane
+                self.condition.wait()
+
+    def done(self, lane):
+        with self.condition:
+            self.running[lane] -= 1
+            self.condition.notify_all()
+
+    def position(self, job_id):
+        """1-based position of a queued job within its lane, 0 once it has left the queue."""
+        with self.condition:
+            for pending in self.queues.values():
+                if job_id in pending:
+                    return pending.index(job_id) + 1
+        return 0
+
+    def qsize(self):
+        with self.condition:
+            return sum(len(pending) for pending in self.queues.values())
+
+JOB_QUEUE = LaneQueue(JOB_LANES, JOB_QUEUE_SIZE)
+QUEUE_DEPTH.set_function(JOB_QUEUE.qsize)
+# Audio-seconds admitted per lane and not yet finished, and the recent decode
+# rate (audio-seconds per wall-second per worker) used to estimate Retry-After
+PENDING_AUDIO = {lane: 0.0 for lane in JOB_LANES}
+DRAIN_RATE = {"audio_seconds_per_second": 1.0}
+ADMISSION_LOCK = threading.Lock()
+for lane_name in JOB_LANES:
+    PENDING_AUDIO_SECONDS.labels(lane=lane_name).set_function(lambda lane=lane_name: PENDING_AUDIO[lane])
+JOBS = {}
+JOBS_CONDITION = threading.Condition()
+WORKER_THREADS = []
+WORKER_PID = None
+
+def new_job(job_id, kind, audio, session=None, profile=None, audio_hash=None, options=None):
+    now = time.time()
+    return {
+        "id": job_id,
+        "kind": kind,
+        "audio": audio,
+        "audio_hash": audio_hash,
+        "options": options or {},
+        "session": session,
+        "profile": profile or ROUTE_PROFILES.get(kind, "default"),
+        "status": JOB_QUEUED,
+        "segments": [],
+        "result": None,
+        "error": None,
+        "error_status": None,  # HTTP status for errors caused by the upload itself
+        "request_id": REQUEST_ID.get(),
+        "created_at": now,
+        "updated_at": now
+    }
+
+def submit_job(job_id, kind, audio, session=None, profile=None, audio_hash=None, options=None, audio_seconds=0.0):
+    """Queue a job in its lane. Raises Overloaded when the lane is full or over its audio budget."""
+    ensure_workers()
+    lane = job_lane(kind, audio_seconds)
+    admit_audio(lane, audio_seconds)
+    try:
+        job = new_job(job_id, kind, audio, session=session, profile=profile,
+                      audio_hash=audio_hash, options=options)
+        job.update(lane=lane, audio_seconds=audio_seconds, transcode=start_transcode(audio, lane))
+    except BaseException:
+        release_audio(lane, audio_seconds)
+        raise
+    with JOBS_CONDITION:
+        prune_jobs(job["created_at"])
+        JOBS[job_id] = job
+    try:
+        JOB_QUEUE.put_nowait(job_id, lane)
+    except queue.Full:
+        with JOBS_CONDITION:
+            JOBS.pop(job_id, None)
+        if job["transcode"]:
+            job["transcode"].cancel()
+        release_audio(lane, audio_seconds)
+        ADMISSION_REJECTIONS.labels(lane=lane, reason="queue_full").inc()
+        raise Overloaded(f"The {lane} queue is full", retry_after_seconds(lane, audio_seconds), status=503)
+    log("Queued job", job_id=job_id, kind=kind, lane=lane, audio_seconds=audio_seconds,
+        queue_depth=JOB_QUEUE.qsize())
+    return snapshot_job(job)
+
+def job_lane(kind, audio_seconds):
+    return "bulk" if audio_seconds >= LONG_AUDIO_SECONDS else LANE_BY_KIND.get(kind, "interactive")
+
+def admit_audio(lane, audio_seconds):
+    """Reserve ``audio_seconds`` of the lane's budget, or raise Overloaded."""
+    if not reserve_audio(lane, audio_seconds):
+        ADMISSION_REJECTIONS.labels(lane=lane, reason="budget").inc()
+        budget = JOB_LANES[lane]["max_pending_audio_seconds"]
+        raise Overloaded(f"The {lane} lane has {PENDING_AUDIO[lane]:.0f}s of audio pending "
+                         f"(budget {budget:.0f}s)", retry_after_seconds(lane, audio_seconds))
+
+def reserve_audio(lane, audio_seconds):
+    """Reserve ``audio_seconds`` of the lane's budget if it fits; returns whether it did.
+
+    A clip is always admitted into an idle lane, however long, so no clip
+    within MAX_AUDIO_SECONDS is refused forever.
+    """
+    budget = JOB_LANES[lane]["max_pending_audio_seconds"]
+    with ADMISSION_LOCK:
+        if PENDING_AUDIO[lane] and PENDING_AUDIO[lane] + audio_seconds > budget:
+            return False
+        PENDING_AUDIO[lane] += audio_seconds
+        return True
+
+def release_audio(lane, audio_seconds):
+    with ADMISSION_LOCK:
+        PENDING_AUDIO[lane] = max(0.0, PENDING_AUDIO[lane] - audio_seconds)
+
+def retry_after_seconds(lane, audio_seconds):
+    """Seconds until the lane has drained enough to admit ``audio_seconds``, at the recent decode rate."""
+    excess = PENDING_AUDIO[lane] + audio_seconds - JOB_LANES[lane]["max_pending_audio_seconds"]
+    rate = DRAIN_RATE["audio_seconds_per_second"] * JOB_LANES[lane]["max_workers"]
+    seconds = max(excess, audio_seconds) / rate
+    return int(min(RETRY_AFTER_MAX_SECONDS, max(1, math.ceil(seconds))))
+
+def record_drain_rate(audio_seconds, processing_seconds):
+    if audio_seconds and processing_seconds > 0:
+        with ADMISSION_LOCK:
+            # Exponential moving average over recent jobs
+            DRAIN_RATE["audio_seconds_per_second"] += 0.2 * (audio_seconds / processing_seconds
+                                                             - DRAIN_RATE["audio_seconds_per_second"])
+
+def get_job(job_id):
+    with JOBS_CONDITION:
+        job = JOBS.get(job_id)
+        return snapshot_job(job) if job else None
+
+def snapshot_job(job):
+    snapshot = dict(job)
+    snapshot["segments"] = list(job["segments"])
+    return snapshot
+
+def update_job(job_id, **fields):
+    with JOBS_CONDITION:
+        job = JOBS.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        job["updated_at"] = time.time()
+        JOBS_CONDITION.notify_all()
+
+def wait_for_job(job_id, timeout=None):
+    with JOBS_CONDITION:
+        JOBS_CONDITION.wait_for(
+            lambda: JOBS[job_id]["status"] in JOB_FINISHED_STATES,
+            timeout=timeout
+        )
+        return snapshot_job(JOBS[job_id])
+
+def job_segment_callback(job_id):
+    def on_segment(segment):
+        with JOBS_CONDITION:
+            job = JOBS.get(job_id)
+            if job is None:
+                return
+            job["segments"].append(segment)
+            job["updated_at"] = time.time()
+            JOBS_CONDITION.notify_all()
+    return on_segment
+
+def job_events(job_id, partial=False):
+    """Yield Server-Sent Events for a job: each decoded segment, status changes and the final result.
+
+    With ``partial`` the cheap rule-based extractor is re-run on the text
+    decoded so far and sent as a ``partial`` event after every segment.
+    """
+    sent_segments = 0
+    sent_status = None
+    while True:
+        with JOBS_CONDITION:
+            JOBS_CONDITION.wait_for(
+                lambda: job_id not in JOBS
+                or len(JOBS[job_id]["segments"]) > sent_segments
+                or JOBS[job_id]["status"] != sent_status,
+                timeout=JOB_EVENTS_KEEPALIVE_SECONDS
+            )
+            job = JOBS.get(job_id)
+            if job is not None:
+                job = snapshot_job(job)
+
+        if job is None:
+            yield sse_event("error", {"error": "Job not found"})
+            return
+
+        new_segments = job["segments"][sent_segments:]
+        if not new_segments and job["status"] == sent_status:
+            yield ": keep-alive\n\n"
+            continue
+
+        for segment in new_segments:
+            yield sse_event("segment", segment)
+        sent_segments += len(new_segments)
+
+        if partial and new_segments and job["kind"] in RULE_EXTRACTORS:
+            text = " ".join(seg["text"] for seg in job["segments"])
+            yield sse_event("partial", RULE_EXTRACTORS[job["kind"]](text))
+
+        if job["status"] != sent_status:
+            sent_status = job["status"]
+            yield sse_event("status", {"job_id": job_id, "status": sent_status})
+
+        if sent_status == JOB_DONE:
+            yield sse_event("result", job["result"])
+            return
+        if sent_status == JOB_ERROR:
+            body, status = job_error(job)
+            yield sse_event("error", {**body, "status": status})
+            return
+
+def job_error(job):
+    """``(body, status)`` for a failed job: 400/413 when the upload was unusable, 500 otherwise."""
+    if job["error_status"]:
+        return {"error": job["error"]}, job["error_status"]
+    return {"error": f"Server error: {job['error']}"}, 500
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def job_queue_position(job_id):
+    return JOB_QUEUE.position(job_id)
+
+def prune_jobs(now):
+    """Forget finished jobs older than JOB_TTL_SECONDS (caller holds the lock)."""
+    expired = [
+        job_id for job_id, job in JOBS.items()
+        if job["status"] in JOB_FINISHED_STATES and now - job["updated_at"] > JOB_TTL_SECONDS
+    ]
+    for job_id in expired:
+        del JOBS[job_id]
+
+def ensure_workers():
+    """Start the worker pool on first use (once per process, so forked workers get their own)."""
+    global WORKER_PID
+    with JOBS_CONDITION:
+        if WORKER_PID == os.getpid():
+            return
+        WORKER_PID = os.getpid()
+        WORKER_THREADS.clear()
+        for i in range(TRANSCRIBE_WORKERS):
+            thread = threading.Thread(target=job_worker, name=f"transcribe-worker-{i}", daemon=True)
+            thread.start()
+            WORKER_THREADS.append(thread)
+    log("Started transcription workers", workers=TRANSCRIBE_WORKERS)
+
+def job_worker():
+    while True:
+        job_id, lane = JOB_QUEUE.get()
+        try:
+            job = get_job(job_id)
+            if job is None:
+                continue
+            REQUEST_ID.set(job["request_id"])
+            STAGE_SECONDS.labels(stage="queue_wait").observe(time.time() - job["created_at"])
+            JOBS_IN_PROGRESS.inc()
+            status = JOB_DONE
+            started = time.perf_counter()
+            try:
+                result = PIPELINES[job["kind"]](job)
+                update_job(job_id, status=JOB_DONE, result=result)
+                watch_provisional(job_id)
+            except TranscodeError as e:
+                status = JOB_ERROR
+                log("Job rejected: unusable audio", logging.WARNING, job_id=job_id, kind=job["kind"], error=str(e))
+                update_job(job_id, status=JOB_ERROR, error=str(e), error_status=e.status)
+            except Exception as e:
+                status = JOB_ERROR
+                log("Job failed", logging.ERROR, exc_info=True, job_id=job_id, kind=job["kind"], error=str(e))
+                update_job(job_id, status=JOB_ERROR, error=str(e))
+            finally:
+                JOBS_IN_PROGRESS.dec()
+                JOB_SECONDS.labels(kind=job["kind"], status=status).observe(time.time() - job["created_at"])
+                discard_upload(job["audio"])
+                if job["transcode"]:
+                    # Finished jobs stay queryable for JOB_TTL_SECONDS; don't keep their PCM that long
+                    job["transcode"].cancel()
+                    update_job(job_id, transcode=None)
+                release_audio(lane, job["audio_seconds"])
+                if status == JOB_DONE:
+                    record_drain_rate(job["audio_seconds"], time.perf_counter() - started)
+        finally:
+            JOB_QUEUE.done(lane)
+
+# ================== BATCH TRANSCRIPTION ==================
+# Bulk backfill of archived recordings. Clips are fanned out over a process
+# pool where every worker process loads its own WhisperModel, so decoding
+# scales across cores without the web server's worker threads competing.
+# Batches started through /batch_jobs share the machine with uploads, so
+# each clip is charged against the bulk lane's audio budget while it runs:
+# a backfill only takes up what bulk uploads leave free, and never touches
+# the interactive lane's share.
+AUDIO_EXTENSIONS = (".webm", ".wav", ".mp3", ".m4a", ".ogg", ".opus", ".flac", ".mp4")
+BATCH_INPUT_FOLDER = os.getenv("BATCH_INPUT_FOLDER", "archive")
+BATCH_LANE = "bulk"
+# How often a batch that is over its lane's budget checks for room again
+BATCH_ADMISSION_POLL_SECONDS = 1.0
+
+def collect_clips(inputs):
+    """Expand files and directories (searched recursively) into a sorted list of audio clips."""
+    clips = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                clips.extend(os.path.join(root, name) for name in files
+                             if name.lower().endswith(AUDIO_EXTENSIONS))
+        elif os.path.isfile(item):
+            clips.append(item)
+        else:
+            raise FileNotFoundError(f"No such clip or directory: {item}")
+    return sorted(clips)
+
+def init_batch_worker(profile, cpu_threads):
+    if INFERENCE_SOCKET:
+        return  # the inference server decodes for every worker
+    # One model per process: pin its thread count so N workers don't oversubscribe the CPU
+    for name in profile_models(profile):
+        TRANSCRIPTION_PROFILES[name] = {**TRANSCRIPTION_PROFILES[name],
+                                        "cpu_threads": cpu_threads, "num_workers": 1}
+        get_model(name)
+
+def batch_worker(clip, kind, profile):
+    started = time.time()
+    report = {"clip": clip, "status": JOB_DONE}
+    try:
+        job = new_job(uuid.uuid4().hex, kind, clip, profile=profile, audio_hash=hash_file(clip),
+                      options={"batch": True})
+        result = PIPELINES[kind](job)
+        report["filename"] = result.get("filename")
+        report["audio_seconds"] = result["audio"]["duration"] or 0.0
+    except Exception as e:
+        report.update(status=JOB_ERROR, error=str(e), audio_seconds=0.0)
+    report["seconds"] = round(time.time() - started, 2)
+    return report
+
+def run_batch(clips, kind="business", profile=None, workers=None, on_clip=None, lane=None):
+    """Transcribe and extract every clip, writing one session per clip.
+
+    Returns ``{"clips": [...per-clip reports...], "summary": {...}}`` with
+    aggregate throughput in audio-seconds per wall-second. With ``lane`` a
+    clip is only started once its duration fits in the lane's audio budget,
+    and holds it until it finishes.
+    """
+    profile = profile or ROUTE_PROFILES[kind]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(clips) or 1))
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # Spawned workers re-import this module but skip the warm-up (see is_pool_worker)
+    context = multiprocessing.get_context("spawn")
+
+    log("Starting batch", clips=len(clips), kind=kind, workers=workers, cpu_threads=cpu_threads, profile=profile)
+    started = time.time()
+    reports = []
+    pending = deque(clips)
+    durations = {}
+    running = {}  # future -> audio-seconds reserved for it
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_batch_worker,
+                                 initargs=(profile, cpu_threads)) as pool:
+            while pending or running:
+                while pending and len(running) < workers:
+                    seconds = 0.0
+                    if lane:
+                        if pending[0] not in durations:
+                            durations[pending[0]] = batch_clip_seconds(pending[0])
+                        seconds = durations[pending[0]]
+                        if not reserve_audio(lane, seconds):
+                            break
+                    running[pool.submit(batch_worker, pending.popleft(), kind, profile)] = seconds
+                if not running:
+                    time.sleep(BATCH_ADMISSION_POLL_SECONDS)  # the lane is full of uploads
+                    continue
+                done, _ = wait(running, timeout=BATCH_ADMISSION_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if lane:
+                        release_audio(lane, running[future])
+                    del running[future]
+                    report = future.result()
+                    reports.append(report)
+                    if on_clip:
+                        on_clip(report, len(reports), len(clips))
+    finally:
+        if lane:
+            for seconds in running.values():
+                release_audio(lane, seconds)
+
+    wall_seconds = time.time() - started
+    audio_seconds = sum(report["audio_seconds"] for report in reports)
+    summary = {
+        "clips": len(clips),
+        "succeeded": sum(1 for report in reports if report["status"] == JOB_DONE),
+        "failed": sum(1 for report in reports if report["status"] == JOB_ERROR),
+        "workers": workers,
+        "profile": profile,
+        "audio_seconds": round(audio_seconds, 2),
+        "wall_seconds": round(wall_seconds, 2),
+        "throughput": round(audio_seconds / wall_seconds, 2) if wall_seconds else 0.0
+    }
+    reports.sort(key=lambda report: report["clip"])
+    return {"clips": reports, "summary": summary}
+
+def batch_clip_seconds(clip):
+    """A clip's duration for the lane budget; unreadable clips cost nothing and fail in their worker."""
+    try:
+        return probe_duration(clip)
+    except (av.error.FFmpegError, IndexError):
+        return 0.0
+
+def run_batch_job(job_id, clips, kind, profile, workers):
+    def on_clip(report, done, total):
+        update_job(job_id, progress={"done": done, "total": total})
+
+    update_job(job_id, status=JOB_TRANSCRIBING, progress={"done": 0, "total": len(clips)})
+    try:
+        update_job(job_id, status=JOB_DONE,
+                   result=run_batch(clips, kind, profile, workers, on_clip=on_clip, lane=BATCH_LANE))
+    except Exception as e:
+        log("Batch job failed", logging.ERROR, exc_info=True, job_id=job_id, error=str(e))
+        update_job(job_id, status=JOB_ERROR, error=str(e))
 
 # ================== ROUTES ==================
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+@app.before_request
+def assign_request_id():
+    request_id = request.headers.get("X-Request-ID", "")
+    REQUEST_ID.set(request_id if REQUEST_ID_RE.match(request_id) else uuid.uuid4().hex)
+
+@app.after_request
+def echo_request_id(response):
+    response.headers["X-Request-ID"] = REQUEST_ID.get()
+    return response
+
 @app.route("/")
 def index():
     # Redirect to React app instead of serving HTML template
     return redirect("http://localhost:3000")
 
+@app.route("/ready")
+def ready():
+    """Readiness probe: 200 once every route's model is loaded, 503 while warming up."""
+    statuses = model_statuses()
+    status = {
+        "ready": models_ready(statuses),
+        "warmup": "remote" if INFERENCE_SOCKET else WHISPER_WARMUP,
+        "routes": ROUTE_PROFILES,
+        "models": {name: dict(statuses.get(name, {"state": "not_loaded"}))
+                   for name in TRANSCRIPTION_PROFILES}
+    }
+    return jsonify(status), 200 if status["ready"] else 503
+
 @app.route("/api")
 def api_info():
     return jsonify({
         "message": "Flask API is running",
         "react_app": "http://localhost:3000",
         "endpoints": [
+            "/ready",
             "/upload_business_audio",
             "/upload_product_audio", 
+            "/job_status/<job_id>",
+            "/job_events/<job_id>",
+            "/batch_jobs",
+            "/cache_stats",
+            "/metrics",
+            "/stream_transcription",
             "/save",
             "/get_sessions",
             "/get_session/<filename>",
             "/delete_session/<filename>"
-        ]
+        ],
+        "transcription_profiles": ROUTE_PROFILES,
+        "llm_backends": LLM_BACKEND_BY_KIND,
+        "prompt_versions": PROMPT_VERSIONS
     })
 
 # -------- PHASE 1 --------
 @app.route("/upload_business_audio", methods=["POST"])
 def upload_business_audio():
-    global CURRENT_SESSION_FILE
+    return submit_upload("business")
+
+# -------- PHASE 2 --------
+@app.route("/upload_product_audio", methods=["POST"])
+def upload_product_audio():
+    return submit_upload("products")
+
+def submit_upload(kind, stream=False):
+    """Save the uploaded audio and queue it for the worker pool.
+
+    Clients that send ``async=1`` (query string or form field) get a job id
+    back immediately and poll ``/job_status/<job_id>``; everyone else waits
+    for the job to finish, so the existing response shape is unchanged.
+    With ``stream`` the job's events are returned as a Server-Sent Events
+    stream instead.
+    """
     try:
-        print("🎤 Received business audio upload request")
-        
+        log("Received audio upload request", kind=kind)
+
         if 'audio' not in request.files:
-            print("❌ No audio file in request")
+            log("No audio file in request", logging.WARNING)
             return jsonify({"error": "No audio file provided"}), 400
-            
+
         audio = request.files["audio"]
         if audio.filename == '':
-            print("❌ Empty audio filename")
+            log("Empty audio filename", logging.WARNING)
             return jsonify({"error": "No audio file selected"}), 400
-            
-        print(f"📁 Audio file received: {audio.filename}")
-        
-        path = os.path.join(UPLOAD_FOLDER, "business_audio.webm")
-        audio.save(path)
-        print(f"💾 Audio saved to: {path}")
-
-        print("🔍 Starting transcription...")
-        transcript = transcribe_audio(path)
-        print(f"📝 Transcription completed: {transcript[:100]}...")
-        
-        print("🤖 Starting business info extraction...")
-        data = extract_business_info(transcript)
-        print(f"✅ Extraction completed: {data}")
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        CURRENT_SESSION_FILENAME = f"session_{timestamp}.json"
-        CURRENT_SESSION_FILE = os.path.join(DATA_FOLDER, CURRENT_SESSION_FILENAME)
-
-        # Ensure products is always an array of objects for consistent structure
-        products = data.get("products", [])
-        formatted_products = []
-        for item in products:
-            if isinstance(item, str):
-                # Convert simple string to object format with new fields
-                formatted_products.append({
-                    "name": item,
-                    "price": 0,
-                    "category": "",
-                    "description": f"Fresh {item}",
-                    "unit": "",
-                    "quantity": 1
-                })
-            elif isinstance(item, dict):
-                # Already in object format, ensure it has required fields
-                formatted_products.append({
-                    "name": item.get("name", ""),
-                    "price": item.get("price", 0),
-                    "category": item.get("category", ""),
-                    "description": item.get("description", ""),
-                    "unit": item.get("unit", ""),
-                    "quantity": item.get("quantity", 1)
-                })
-            else:
-                # Fallback for unexpected formats
-                formatted_products.append({
-                    "name": str(item),
-                    "price": 0,
-                    "category": "",
-                    "description": f"Fresh {item}",
-                    "unit": "",
-                    "quantity": 1
-                })
-
-        final_json = {
-            "personName": data.get("personName", ""),
-            "name": data.get("name", ""),
-            "address": data.get("address", ""),
-            "city": data.get("city", ""),
-            "state": data.get("state", ""),
-            "pincode": data.get("pincode", ""),
-            "gstNumber": data.get("gstNumber", ""),
-            "category": data.get("category", ""),
-            "subcategory": data.get("subcategory", ""),
-            "email": data.get("email", ""),
-            "phone": data.get("phone", ""),
-            "website": data.get("website", ""),
-            "establishedYear": data.get("establishedYear", ""),
-            "products": formatted_products  # structured as objects with new fields
-        }
 
-        with open(CURRENT_SESSION_FILE, "w") as f:
-            json.dump(final_json, f, indent=4)
-        
-        print(f"💾 Session saved to: {CURRENT_SESSION_FILE}")
+        log("Audio file received", audio_filename=audio.filename)
 
-        return jsonify({
-            "data": final_json, 
-            "filename": CURRENT_SESSION_FILENAME,
-            "transcription": transcript
-        })
-        
+        # Product uploads append to the session named by the client; without
+        # one a new products-only session is created.
+        session = request.form.get("filename") or request.args.get("filename")
+        if kind == "products" and session:
+            try:
+                if not os.path.exists(session_path(session)):
+                    return jsonify({"error": "Session file not found"}), 404
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+        profile = request.form.get("profile") or request.args.get("profile")
+        if profile and profile not in TRANSCRIPTION_PROFILES:
+            return jsonify({"error": f"Unknown transcription profile: {profile}"}), 400
+
+        job_id = uuid.uuid4().hex
+        with stage_timer("upload"):
+            upload, audio_hash = read_upload(audio, f"{kind}_{job_id}.webm")
+        if isinstance(upload, str):
+            log("Large audio spilled to disk", path=upload)
+
+        try:
+            audio_seconds = probe_duration(upload)
+        except (av.error.FFmpegError, IndexError) as e:
+            discard_upload(upload)
+            log("Unreadable audio upload", logging.WARNING, error=str(e))
+            return jsonify({"error": "Could not read the audio file"}), 400
+        if audio_seconds > MAX_AUDIO_SECONDS:
+            discard_upload(upload)
+            ADMISSION_REJECTIONS.labels(lane=job_lane(kind, audio_seconds), reason="too_long").inc()
+            log("Audio too long", logging.WARNING, audio_seconds=round(audio_seconds, 1))
+            return jsonify({"error": f"Audio is {audio_seconds:.0f}s long; the limit is {MAX_AUDIO_SECONDS:.0f}s"}), 413
+
+        try:
+            job = submit_job(job_id, kind, upload,
+                             session=session if kind == "products" else None,
+                             profile=profile, audio_hash=audio_hash,
+                             options={"with_products": request_flag("with_products")},
+                             audio_seconds=audio_seconds)
+        except Overloaded as e:
+            discard_upload(upload)
+            log("Upload refused", logging.WARNING, kind=kind, reason=str(e), retry_after=e.retry_after,
+                queue_depth=JOB_QUEUE.qsize())
+            return (jsonify({"error": "Server is busy, please retry shortly", "retry_after": e.retry_after}),
+                    e.status, {"Retry-After": str(e.retry_after)})
+
+        if stream:
+            return event_stream_response(job["id"], partial=request_flag("partial"))
+
+        if request_flag("async"):
+            return jsonify({
+                "job_id": job["id"],
+                "status": job["status"],
+                "status_url": f"/job_status/{job['id']}"
+            }), 202
+
+        job = wait_for_job(job["id"])
+        if job["status"] == JOB_ERROR:
+            body, status = job_error(job)
+            return jsonify(body), status
+        return jsonify(job["result"])
+
+    except RequestEntityTooLarge:
+        raise  # answered by the 413 handler below
     except Exception as e:
-        print(f"❌ Error in upload_business_audio: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log("Error in upload", logging.ERROR, exc_info=True, kind=kind, error=str(e))
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
-# -------- PHASE 2 --------
-@app.route("/upload_product_audio", methods=["POST"])
-def upload_product_audio():
-    global CURRENT_SESSION_FILE, CURRENT_SESSION_FILENAME
-    try:
-        print("🛒 Received product audio upload request")
-        
-        # If no business session exists, create one for products only
-        if not CURRENT_SESSION_FILE:
-            print("📝 No business session found, creating new session for products")
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            CURRENT_SESSION_FILENAME = f"session_{timestamp}.json"
-            CURRENT_SESSION_FILE = os.path.join(DATA_FOLDER, CURRENT_SESSION_FILENAME)
-            
-            # Create a basic business structure with new fields
-            basic_session = {
-                "personName": "",
-                "name": "",
-                "address": "",
-                "city": "",
-                "state": "",
-                "pincode": "",
-                "gstNumber": "",
-                "category": "",
-                "subcategory": "",
-                "email": "",
-                "phone": "",
-                "website": "",
-                "establishedYear": "",
-                "products": []
-            }
-            
-            with open(CURRENT_SESSION_FILE, "w") as f:
-                json.dump(basic_session, f, indent=4)
-            
-            print(f"📁 Created new session: {CURRENT_SESSION_FILE}")
+@app.errorhandler(413)
+def upload_too_large(e):
+    ADMISSION_REJECTIONS.labels(lane="none", reason="too_large").inc()
+    log("Upload too large", logging.WARNING, path=request.path, content_length=request.content_length)
+    limit_mb = app.config["MAX_CONTENT_LENGTH"] / (1024 * 1024)
+    return jsonify({"error": f"Upload is larger than the {limit_mb:g} MB limit"}), 413
 
-        if 'audio' not in request.files:
-            print("❌ No audio file in request")
-            return jsonify({"error": "No audio file provided"}), 400
-            
-        audio = request.files["audio"]
-        if audio.filename == '':
-            print("❌ Empty audio filename")
-            return jsonify({"error": "No audio file selected"}), 400
-            
-        print(f"📁 Audio file received: {audio.filename}")
+def request_flag(name):
+    value = request.args.get(name) or request.form.get(name) or ""
+    return value.lower() in ("1", "true", "yes")
 
-        path = os.path.join(UPLOAD_FOLDER, "product_audio.webm")
-        audio.save(path)
-        print(f"💾 Audio saved to: {path}")
+def event_stream_response(job_id, partial=False):
+    return Response(
+        job_events(job_id, partial=partial),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-        print("🔍 Starting transcription...")
-        transcript = transcribe_audio(path)
-        print(f"📝 Transcription completed: {transcript[:100]}...")
-        
-        print("🤖 Starting product extraction...")
-        products = extract_products(transcript)  # detailed objects
-        print(f"✅ Product extraction completed: {products}")
+# -------- STREAMING TRANSCRIPTION --------
+@app.route("/stream_transcription", methods=["POST"])
+def stream_transcription():
+    """Upload a clip and receive its segments as Server-Sent Events while it is decoded.
 
-        with open(CURRENT_SESSION_FILE, "r") as f:
-            session_data = json.load(f)
+    ``extract=business|products`` runs the matching upload pipeline (and
+    saves the session) after the decode; ``partial=1`` also streams
+    rule-based extraction on the partial transcript.
+    """
+    kind = request.args.get("extract") or request.form.get("extract") or "transcribe"
+    if kind not in PIPELINES:
+        return jsonify({"error": f"Unknown extract mode: {kind}"}), 400
+    return submit_upload(kind, stream=True)
 
-        # 🔁 Append new products to existing products instead of replacing them completely
-        # Preserve any existing products from phase 1 and combine with new products from phase 2
-        existing_products = session_data.get("products", [])
-        combined_products = existing_products + products
+@app.route("/job_events/<job_id>")
+def job_events_stream(job_id):
+    if get_job(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    return event_stream_response(job_id, partial=request_flag("partial"))
 
-        # Update the session data with combined products
-        session_data["products"] = combined_products
+@app.route("/job_status/<job_id>")
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
 
-        with open(CURRENT_SESSION_FILE, "w") as f:
-            json.dump(session_data, f, indent=4)
-        
-        print(f"💾 Session updated with products: {CURRENT_SESSION_FILE}")
+    response = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "profile": job["profile"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
+    if job["status"] == JOB_QUEUED:
+        response["queue_position"] = job_queue_position(job_id)
+    if "progress" in job:
+        response["progress"] = job["progress"]
+    if job["status"] in (JOB_TRANSCRIBING, JOB_EXTRACTING):
+        response["segments"] = job["segments"]
+    if job["status"] == JOB_DONE:
+        response["result"] = job["result"]
+    if job["status"] == JOB_ERROR:
+        response["error"] = job["error"]
+        if job["error_status"]:
+            # The upload itself was unusable: answer with its client error
+            return jsonify(response), job["error_status"]
+    return jsonify(response)
+
+# -------- BATCH BACKFILL --------
+@app.route("/batch_jobs", methods=["POST"])
+def submit_batch_job():
+    """Start a batch over clips on the server under BATCH_INPUT_FOLDER.
 
+    Body: ``{"paths": [...], "kind": "business|products", "profile": ..., "workers": N}``
+    where paths are files or directories relative to BATCH_INPUT_FOLDER.
+    Progress and the final report are available from ``/job_status/<job_id>``.
+    """
+    body = request.json or {}
+    kind = body.get("kind", "business")
+    if kind not in ("business", "products"):
+        return jsonify({"error": f"Unknown batch kind: {kind}"}), 400
+    profile = body.get("profile")
+    if profile and profile not in TRANSCRIPTION_PROFILES:
+        return jsonify({"error": f"Unknown transcription profile: {profile}"}), 400
+
+    root = os.path.realpath(BATCH_INPUT_FOLDER)
+    inputs = []
+    for item in body.get("paths") or [""]:
+        path = os.path.realpath(os.path.join(root, item))
+        if path != root and not path.startswith(root + os.sep):
+            return jsonify({"error": f"Path outside {BATCH_INPUT_FOLDER}: {item}"}), 400
+        inputs.append(path)
+    try:
+        clips = collect_clips(inputs)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    if not clips:
+        return jsonify({"error": "No audio clips found"}), 400
+
+    job_id = uuid.uuid4().hex
+    job = new_job(job_id, "batch", None, profile=profile or ROUTE_PROFILES[kind])
+    job["progress"] = {"done": 0, "total": len(clips)}
+    with JOBS_CONDITION:
+        prune_jobs(job["created_at"])
+        JOBS[job_id] = job
+    threading.Thread(target=contextvars.copy_context().run, name=f"batch-{job_id}", daemon=True,
+                     args=(run_batch_job, job_id, clips, kind, profile, body.get("workers"))).start()
+
+    return jsonify({
+        "job_id": job_id,
+        "clips": len(clips),
+        "status_url": f"/job_status/{job_id}"
+    }), 202
+
+@app.route("/cache_stats")
+def cache_stats():
+    with CACHE_LOCK:
         return jsonify({
-            "data": session_data, 
-            "filename": CURRENT_SESSION_FILENAME,
-            "transcription": transcript
+            "enabled": CACHE_ENABLED,
+            "entries": len(CACHE_INDEX),
+            "bytes": CACHE_BYTES,
+            "max_entries": CACHE_MAX_ENTRIES,
+            "max_bytes": CACHE_MAX_BYTES,
+            "stats": CACHE_STATS
         })
-        
-    except Exception as e:
-        print(f"❌ Error in upload_product_audio: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
 
 # -------- SAVE EDITED JSON --------
 @app.route("/save", methods=["POST"])
@@ -709,68 +3234,127 @@ def save_edited_data():
     if not filename or not session_data:
         return jsonify({"error": "Missing filename or data"}), 400
     
-    file_path = os.path.join(DATA_FOLDER, filename)
+    try:
+        session_path(filename)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    with open(file_path, "w") as f:
-        json.dump(session_data, f, indent=4)
+    with stage_timer("persist"), session_lock(filename):
+        write_session(filename, session_data)
     
     return jsonify({"success": True, "message": "Data saved successfully"})
 
 # -------- VIEW FINAL JSON --------
 @app.route("/editor")
 def editor():
-    files = sorted(os.listdir(DATA_FOLDER))
-    if not files:
+    filename = latest_session_filename()
+    if not filename:
         return "No sessions found"
 
-    with open(os.path.join(DATA_FOLDER, files[-1])) as f:
-        data = json.load(f)
-
-    return jsonify(data)
+    return jsonify(read_session(filename))
 
 @app.route("/get_session/<filename>")
 def get_session(filename):
-    file_path = os.path.join(DATA_FOLDER, filename)
+    try:
+        file_path = session_path(filename)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            data = json.load(f)
-        return jsonify(data)
+        return jsonify(read_session(filename))
     else:
         return jsonify({"error": "Session file not found"}), 404
 
 @app.route("/get_sessions")
 def get_sessions():
+    """List session metadata from the session index.
+
+    Query parameters (all optional):
+      limit, cursor  paginate; the response becomes {"sessions": [...], "next_cursor": ...}
+      fields         comma-separated projection, e.g. name,city,phone (``data`` adds the full body)
+      city, state, category, from, to
+                     filters; from/to are ISO dates or timestamps on createdAt
+      order          asc (default, oldest first) or desc
+      format         ndjson streams one session per line instead of a JSON array
+
+    Without limit/cursor every matching session is returned, streamed from
+    the index page by page rather than built up in memory.
+    """
     try:
-        files = sorted(os.listdir(DATA_FOLDER))
-        sessions = []
-        
-        for filename in files:
-            if filename.endswith('.json'):
-                file_path = os.path.join(DATA_FOLDER, filename)
+        filters = {field: request.args[field] for field in SESSION_FILTER_FIELDS if request.args.get(field)}
+        for bound, suffix in (("from", "T00:00:00"), ("to", "T23:59:59")):
+            value = request.args.get(bound)
+            if value:
+                datetime.fromisoformat(value)  # validates
+                filters[bound] = value + suffix if len(value) == 10 else value
+
+        fields = None
+        if request.args.get("fields"):
+            fields = [field.strip() for field in request.args["fields"].split(",") if field.strip()]
+            unknown = [field for field in fields if field not in SESSION_INDEX_FIELDS and field not in ("filename", "data")]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+            fields = [field for field in fields if field != "filename"]
+
+        order = request.args.get("order", "asc")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Unknown order: {order!r}")
+        descending = order == "desc"
+
+        output = request.args.get("format", "json")
+        if output not in ("json", "ndjson"):
+            raise ValueError(f"Unknown format: {output!r}")
+
+        paginate = "limit" in request.args or "cursor" in request.args
+        limit = int(request.args.get("limit", SESSION_PAGE_DEFAULT))
+        if not 1 <= limit <= SESSION_PAGE_MAX:
+            raise ValueError(f"limit must be between 1 and {SESSION_PAGE_MAX}")
+        after = decode_session_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        if paginate:
+            page = query_sessions(filters, after, limit + 1, descending)
+            next_cursor = encode_session_cursor(page[limit - 1]["filename"]) if len(page) > limit else None
+            sessions = [project_session(session, fields) for session in page[:limit]]
+            if output == "ndjson":
+                lines = [json.dumps(session) + "\n" for session in sessions]
+                return Response(lines, mimetype="application/x-ndjson",
+                                headers={"X-Next-Cursor": next_cursor or ""})
+            return jsonify({"sessions": sessions, "next_cursor": next_cursor})
+
+        def stream():
+            separator = "" if output == "ndjson" else "["
+            for session in iter_sessions(filters, descending):
                 try:
-                    with open(file_path, "r") as f:
-                        data = json.load(f)
-                        sessions.append({
-                            "filename": filename,
-                            "data": data
-                        })
-                except Exception as e:
-                    print(f"Error reading file {filename}: {e}")
-                    continue
-        
-        return jsonify(sessions)
+                    line = json.dumps(project_session(session, fields))
+                except FileNotFoundError:
+                    continue  # deleted while streaming
+                if output == "ndjson":
+                    yield line + "\n"
+                else:
+                    yield separator + line
+                    separator = ","
+            if output == "json":
+                yield "]" if separator == "," else "[]"
+
+        mimetype = "application/x-ndjson" if output == "ndjson" else "application/json"
+        return Response(stream(), mimetype=mimetype)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/delete_session/<filename>", methods=["DELETE"])
 def delete_session(filename):
     try:
-        file_path = os.path.join(DATA_FOLDER, filename)
+        file_path = session_path(filename)
         if os.path.exists(file_path):
-            os.remove(file_path)
+            with session_lock(filename):
+                delete_session_file(filename)
             return jsonify({"success": True, "message": "Session deleted successfully"})
         else:
             return jsonify({"error": "Session file not found"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
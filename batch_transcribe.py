@@ -0,0 +1,61 @@
+"""Bulk backfill: transcribe and extract archived recordings into sessions.
+
+Usage:
+    python batch_transcribe.py archive/2025/ extra_clip.webm --kind business --workers 4
+    python batch_transcribe.py archive/ --kind products --profile balanced --report report.json
+
+Each clip becomes its own session in data/. Per-clip timings and the
+aggregate throughput (audio-seconds per wall-second) are printed and can be
+written to a JSON report.
+"""
+import argparse
+import json
+import os
+import sys
+
+# Don't start the background model warm-up on import; the batch workers load
+# their own models.
+os.environ.setdefault("WHISPER_WARMUP", "lazy")
+
+from app import JOB_DONE, TRANSCRIPTION_PROFILES, collect_clips, run_batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-transcribe archived intake recordings")
+    parser.add_argument("inputs", nargs="+", help="audio files or directories (searched recursively)")
+    parser.add_argument("--kind", choices=["business", "products"], default="business",
+                        help="which extraction pipeline to run (default: business)")
+    parser.add_argument("--profile", choices=sorted(TRANSCRIPTION_PROFILES),
+                        help="transcription profile (default: the route's profile)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, one WhisperModel each (default: CPU count)")
+    parser.add_argument("--report", help="write the per-clip report and summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    clips = collect_clips(args.inputs)
+    if not clips:
+        print("No audio clips found")
+        return 1
+
+    def on_clip(report, done, total):
+        if report["status"] == JOB_DONE:
+            print(f"[{done}/{total}] {report['clip']}: {report['audio_seconds']}s audio "
+                  f"in {report['seconds']}s -> {report['filename']}")
+        else:
+            print(f"[{done}/{total}] {report['clip']}: FAILED ({report['error']})")
+
+    result = run_batch(clips, kind=args.kind, profile=args.profile, workers=args.workers, on_clip=on_clip)
+    summary = result["summary"]
+    print(f"Done: {summary['succeeded']}/{summary['clips']} clips, {summary['audio_seconds']}s audio "
+          f"in {summary['wall_seconds']}s wall ({summary['throughput']} audio-s/s on {summary['workers']} workers)")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(result, f, indent=4)
+        print(f"Report written to {args.report}")
+
+    return 0 if summary["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
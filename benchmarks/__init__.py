@@ -0,0 +1,12 @@
+"""Benchmarks for the transcription and extraction pipeline.
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_business_fallback``.
+
+- bench_decode: model load time and decode real-time factor per profile
+- bench_extractors: rule-based extractor microbenchmarks
+- bench_business_fallback / bench_product_fallback: comparisons with the previous implementations
+- load_test: concurrent uploads against a server whose Groq calls go to groq_stub
+- compare: diff two result files
+
+Results are written as JSON to benchmarks/results/.
+"""
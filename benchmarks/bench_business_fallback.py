@@ -0,0 +1,223 @@
+"""Microbenchmark: precompiled business fallback extractor vs. the previous implementation.
+
+    python -m benchmarks.bench_business_fallback [--repeat 2000]
+
+Prints per-call time for both implementations on a set of intake-style
+transcripts and lists the fields where their outputs differ.
+"""
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("WHISPER_WARMUP", "lazy")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from app import extract_business_info_fallback
+
+SAMPLE_TRANSCRIPTS = [
+    "Hi, I run Sree's Grocery Store in Hyderabad near Jubilee Hills. My number is 9876543210. "
+    "We sell vegetables and dairy products.",
+    "My name is Ravi Kumar and my business is Ravi Sweets located in MG Road city Pune Maharashtra "
+    "pincode 411001 phone 9123456789 email ravi@sweets.com website www.ravisweets.in "
+    "established in 2015 GST 27ABCDE1234F1Z5",
+    "We are Tech Solutions and we do software with IT services in Bangalore Karnataka since 1999.",
+    "This is Priya and I sell fruits with milk and bread in Chennai, Tamil Nadu.",
+    "Good morning, this is Anil Sharma and we are Sharma Textiles located in Surat Gujarat and "
+    "we make garments and clothing, started the year 1987, contact 9988776655 or "
+    "sharmatextiles@gmail.com, our pincode is 395003.",
+]
+# A long rambling intake to show how both scale with transcript length
+SAMPLE_TRANSCRIPTS.append(" ".join(SAMPLE_TRANSCRIPTS) * 8)
+
+
+def legacy_extract_business_info_fallback(text):
+    """extract_business_info_fallback as it was before the precompiled rule engine (kept verbatim for comparison)."""
+    import re
+    
+    # Initialize result
+    result = {
+        "personName": "",
+        "name": "",
+        "address": "",
+        "city": "",
+        "state": "",
+        "pincode": "",
+        "gstNumber": "",
+        "category": "",
+        "subcategory": "",
+        "email": "",
+        "phone": "",
+        "website": "",
+        "establishedYear": "",
+        "products": []
+    }
+    
+    # Convert to lowercase for processing
+    text_lower = text.lower()
+    
+    # Extract state (look for common Indian states)
+    states = ["andhra pradesh", "arunachal pradesh", "assam", "bihar", "chhattisgarh", "goa", "gujarat", "haryana", "himachal pradesh", "jammu & kashmir", "jharkhand", "karnataka", "kerala", "madhya pradesh", "maharashtra", "manipur", "meghalaya", "mizoram", "nagaland", "odisha", "punjab", "rajasthan", "sikkim", "tamil nadu", "telangana", "tripura", "uttar pradesh", "uttarakhand", "west bengal", "chandigarh", "delhi", "hyderabad", "bangalore", "mumbai", "chennai", "kolkata", "pune", "jaipur", "lucknow"]
+    for state in states:
+        if state in text_lower:
+            result["state"] = state.title()
+            break
+    
+    # Extract pincode (6-digit patterns)
+    pincode_pattern = r'\b(\d{6})\b'
+    pincodes = re.findall(pincode_pattern, text_lower)
+    if pincodes:
+        result["pincode"] = pincodes[0]
+    
+    # Extract GST number (15-digit alphanumeric starting with digits)
+    gst_pattern = r'\b(\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z0-9]{1}Z\d{1})\b'
+    gst_matches = re.findall(gst_pattern, text.upper())
+    if gst_matches:
+        result["gstNumber"] = gst_matches[0]
+    
+    # Extract email addresses
+    email_pattern = r'\b([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b'
+    emails = re.findall(email_pattern, text_lower)
+    if emails:
+        result["email"] = emails[0]
+    
+    # Extract website URLs
+    website_pattern = r'\b((?:https?://|www\.)[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})\b'
+    websites = re.findall(website_pattern, text_lower)
+    if websites:
+        result["website"] = websites[0]
+    
+    # Extract established year (4-digit numbers between 1900-2024)
+    year_pattern = r'\b(19[0-9]{2}|20[0-2][0-4])\b'
+    years = re.findall(year_pattern, text_lower)
+    for year in years:
+        # Check if it's likely an establishment year (context keywords)
+        context_words = ["established", "founded", "started", "since", "year"]
+        if any(word in text_lower for word in context_words):
+            result["establishedYear"] = year
+            break
+    
+    # Extract city (look for common city names)
+    cities = ["chandigarh", "hyderabad", "bangalore", "delhi", "mumbai", "chennai", "kolkata", "pune", "jaipur", "lucknow", "ahmedabad", "surat", "nagpur", "indore", "thane", "bhopal", "visakhapatnam", "pimpri", "patna", "vadodara", "ghaziabad", "ludhiana", "agra", "nashik", "faridabad", "meerut", "rajkot", "kalyan", "vasai", "varanasi", "srinagar", "aurangabad", "dhanbad", "amritsar", "navi mumbai", "allahabad", "ranchi", "howrah", "coimbatore", "jabalpur", "gwalior", "vijayawada", "jodhpur", "madurai", "raipur", "kota", "guwahati", "chandigarh", "hubli", "dharwad", "mysore"]
+    for city in cities:
+        if city in text_lower:
+            result["city"] = city.title()
+            break
+    
+    # Extract phone numbers (10-digit patterns)
+    phone_pattern = r'\b(\d{10})\b'
+    phones = re.findall(phone_pattern, text_lower)
+    if phones:
+        result["phone"] = phones[0]
+    
+    # Extract person name (look for patterns like "my name is", "I am", etc.)
+    person_patterns = [
+        r'(?:my name is|i am|this is)\s+([a-zA-Z\s]+?)(?:\s+(?:and|so|feed|my|i))',
+        r'(?:i\'m|i am)\s+([a-zA-Z\s]+?)(?:\s+(?:and|so|feed|my))',
+    ]
+    
+    for pattern in person_patterns:
+        match = re.search(pattern, text_lower)
+        if match:
+            name = match.group(1).strip().title()
+            if len(name) > 2 and len(name) < 50:
+                result["personName"] = name
+                break
+    
+    # Extract business name (look for patterns like "my business is", "we are", "my name is", etc.)
+    name_patterns = [
+        r'(?:my name is|my business is|i own|we are|this is)\s+([a-zA-Z\s]+?)(?:\s+(?:in|at|and|located|so|feed))',
+        r'business\s+name\s+is\s+([a-zA-Z\s]+?)(?:\s+(?:and|we|located))',
+        r'we\s+are\s+([a-zA-Z\s]+?)(?:\s+(?:and|we|located|in))',
+        r'name\s+is\s+([a-zA-Z\s]+?)(?:\s+(?:and|so|feed))'
+    ]
+    
+    for pattern in name_patterns:
+        match = re.search(pattern, text_lower)
+        if match:
+            name = match.group(1).strip().title()
+            if len(name) > 2 and len(name) < 50:
+                result["name"] = name
+                break
+    
+    # Extract address (look for address patterns)
+    address_patterns = [
+        r'(?:located|address|at|in)\s+([a-zA-Z0-9\s,]+?)(?:\s+(?:city|and|we|phone|state))',
+        r'address\s+is\s+([a-zA-Z0-9\s,]+?)(?:\s+(?:city|and|we|phone|state))'
+    ]
+    
+    for pattern in address_patterns:
+        match = re.search(pattern, text_lower)
+        if match:
+            address = match.group(1).strip().title()
+            if len(address) > 3 and len(address) < 100:
+                result["address"] = address
+                break
+    
+    # Extract category
+    categories = {
+        "retail": ["retail", "shop", "store", "grocery", "market", "supermarket"],
+        "food & restaurant": ["food", "restaurant", "cafe", "hotel", "eatery", "sweet", "treat", "bakery"],
+        "services": ["service", "consulting", "repair", "maintenance"],
+        "manufacturing": ["manufacturing", "factory", "production"],
+        "healthcare": ["health", "medical", "hospital", "clinic", "pharmacy"],
+        "education": ["education", "school", "college", "tuition", "institute"],
+        "technology": ["tech", "software", "computer", "it"],
+        "agriculture": ["agriculture", "farming", "crops", "seeds"],
+        "textile": ["textile", "clothing", "garments", "fashion"],
+        "automotive": ["automotive", "car", "vehicle", "motor"]
+    }
+    
+    for category, keywords in categories.items():
+        for keyword in keywords:
+            if keyword in text_lower:
+                result["category"] = category.title()
+                break
+        if result["category"]:
+            break
+    
+    # Extract products (simple keyword matching)
+    product_keywords = ["vegetable", "fruit", "rice", "milk", "bread", "sweet", "snack", "food", "grocery"]
+    found_products = []
+    
+    for keyword in product_keywords:
+        if keyword in text_lower:
+            # Handle plural forms
+            if keyword.endswith('y'):
+                plural = keyword[:-1] + 'ies'
+            else:
+                plural = keyword + 's'
+            
+            # Check both singular and plural
+            if keyword in text_lower:
+                found_products.append(keyword.title())
+            elif plural in text_lower:
+                found_products.append(plural.title())
+    
+    result["products"] = found_products[:3]  # Limit to 3 products
+    
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="calls per transcript (default: 2000)")
+    args = parser.parse_args(argv)
+
+    print(f"{'chars':>7} {'legacy us':>10} {'current us':>11} {'speedup':>8}")
+    for text in SAMPLE_TRANSCRIPTS:
+        legacy = timeit.timeit(lambda: legacy_extract_business_info_fallback(text), number=args.repeat)
+        current = timeit.timeit(lambda: extract_business_info_fallback(text), number=args.repeat)
+        print(f"{len(text):>7} {legacy / args.repeat * 1e6:>10.1f} {current / args.repeat * 1e6:>11.1f} "
+              f"{legacy / current:>7.1f}x")
+
+    print()
+    for i, text in enumerate(SAMPLE_TRANSCRIPTS):
+        old = legacy_extract_business_info_fallback(text)
+        new = extract_business_info_fallback(text)
+        for field in old:
+            if old[field] != new[field]:
+                print(f"transcript {i} {field}: legacy={old[field]!r} current={new[field]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Decode real-time factor per transcription profile.
+
+    python -m benchmarks.bench_decode [--profiles default fast] [--durations 5 15 60]
+                                      [--clips recordings/] [--repeat 3] [--output result.json]
+
+Loads each profile's model (timed separately), then transcribes every clip
+``--repeat`` times and reports wall time and RTF (audio seconds per decode
+second, higher is faster) per profile and clip. For a tiered profile the
+escalation model is loaded up front too, and the segment count per tier is
+recorded, so the share escalated on real recordings can be tracked.
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("WHISPER_WARMUP", "lazy")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from app import MODEL_STATUS, TRANSCRIPTION_PROFILES, get_model, profile_models, transcribe_audio
+from benchmarks.clips import DEFAULT_DURATIONS, benchmark_clips
+from benchmarks.common import latency_summary, peak_rss_mb, write_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", choices=sorted(TRANSCRIPTION_PROFILES),
+                        default=sorted(TRANSCRIPTION_PROFILES), help="profiles to benchmark (default: all)")
+    parser.add_argument("--durations", nargs="+", type=int, default=list(DEFAULT_DURATIONS),
+                        help="synthetic clip lengths in seconds (default: 5 15 60)")
+    parser.add_argument("--clips", help="folder of recorded clips to use instead of synthetic ones")
+    parser.add_argument("--repeat", type=int, default=3, help="decodes per clip (default: 3)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/decode_<time>.json)")
+    args = parser.parse_args(argv)
+
+    clips = benchmark_clips(args.durations, args.clips)
+    results = []
+    print(f"{'profile':<10} {'clip':<24} {'audio s':>8} {'p50 ms':>9} {'RTF':>7}")
+    for profile in args.profiles:
+        for name in profile_models(profile):
+            get_model(name)
+        load_seconds = MODEL_STATUS[profile].get("load_seconds", 0.0)
+        for label, path, seconds in clips:
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                transcript, audio_info = transcribe_audio(path, profile)
+                timings.append(time.perf_counter() - started)
+            summary = latency_summary(timings)
+            rtf = round(seconds / (summary["p50_ms"] / 1000), 2)
+            print(f"{profile:<10} {label:<24} {seconds:>8.1f} {summary['p50_ms']:>9.1f} {rtf:>7.2f}")
+            results.append({
+                "profile": profile,
+                "clip": label,
+                "audio_seconds": seconds,
+                "model_load_seconds": load_seconds,
+                "decode": summary,
+                "rtf": rtf,
+                "vad": audio_info["vad"],
+                "tiers": audio_info.get("tiers"),
+                "transcript_chars": len(transcript)
+            })
+
+    write_results("decode", {"runs": results, "peak_rss_mb": peak_rss_mb()}, args.output)
+
+
+if __name__ == "__main__":
+    main()
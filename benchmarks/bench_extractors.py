@@ -0,0 +1,59 @@
+"""Fallback extractor microbenchmarks with JSON results.
+
+    python -m benchmarks.bench_extractors [--repeat 1000] [--output result.json]
+
+Times the rule-based business and product extractors per transcript (the
+same transcripts as bench_business_fallback and the product regression
+corpus) so changes to either can be tracked across runs with
+``python -m benchmarks.compare``.
+"""
+import argparse
+import json
+import os
+import timeit
+
+os.environ.setdefault("WHISPER_WARMUP", "lazy")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from app import extract_business_info_fallback, extract_products_fallback
+from benchmarks.bench_business_fallback import SAMPLE_TRANSCRIPTS
+from benchmarks.bench_product_fallback import CORPUS_PATH
+from benchmarks.common import latency_summary, write_results
+
+
+def time_extractor(extractor, texts, repeat):
+    per_call = []
+    for text in texts:
+        # Median of five rounds per transcript, reported per call
+        rounds = timeit.repeat(lambda: extractor(text), number=repeat, repeat=5)
+        per_call.append(sorted(rounds)[2] / repeat)
+    return {
+        "transcripts": len(texts),
+        "chars": sum(len(text) for text in texts),
+        "per_call": latency_summary(per_call),
+        "us_per_kchar": round(sum(per_call) / sum(len(text) for text in texts) * 1e9, 2)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1000, help="calls per transcript and round (default: 1000)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/extractors_<time>.json)")
+    args = parser.parse_args(argv)
+
+    with open(CORPUS_PATH) as f:
+        product_texts = [case["text"] for case in json.load(f)]
+
+    results = {
+        "business_fallback": time_extractor(extract_business_info_fallback, SAMPLE_TRANSCRIPTS, args.repeat),
+        "products_fallback": time_extractor(extract_products_fallback, product_texts, args.repeat)
+    }
+    for name, result in results.items():
+        print(f"{name:<18} p50 {result['per_call']['p50_ms'] * 1000:>8.1f} us  "
+              f"p99 {result['per_call']['p99_ms'] * 1000:>8.1f} us  {result['us_per_kchar']:>7.1f} us/kchar")
+
+    write_results("extractors", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
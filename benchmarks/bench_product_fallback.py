@@ -0,0 +1,237 @@
+"""Regression corpus and microbenchmark for the product fallback parser.
+
+    python -m benchmarks.bench_product_fallback [--repeat 1000]
+
+Checks extract_products_fallback against benchmarks/product_corpus.json
+(name, price, unit and quantity of every product, in order) and exits
+non-zero on any mismatch. Then times it against the previous regex-sweep
+implementation per transcript.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+os.environ.setdefault("WHISPER_WARMUP", "lazy")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+from app import extract_products_fallback
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "product_corpus.json")
+COMPARED_FIELDS = ("name", "price", "unit", "quantity")
+
+
+def legacy_extract_products_fallback(text):
+    """extract_products_fallback as it was before the token parser (kept verbatim for comparison)."""
+    import re
+    
+    text_lower = text.lower()
+    products = []
+    
+    # Look for product patterns with quantities and prices - improved patterns
+    product_patterns = [
+        # Pattern: product + quantity + unit + price (e.g., "2 kg tomatoes 50 rupees")
+        r'(\d+)\s+(kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box)\s+(\w+)\s+(?:at|@|for|rupees?|rs\.?|₹)\s*(\d+)',
+        # Pattern: product + unit + price (e.g., "tomatoes kg 50 rupees")
+        r'(\w+)\s+(kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box)\s+(?:at|@|for|rupees?|rs\.?|₹)\s*(\d+)',
+        # Pattern: product + price + unit (e.g., "tomatoes 50 rupees per kg")
+        r'(\w+)\s+(?:at|@|for|rupees?|rs\.?|₹)\s*(\d+)\s+(?:per\s+)?(kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box)',
+        # Pattern: product + price only (e.g., "tomatoes 50 rupees")
+        r'(\w+)\s+(?:at|@|for|rupees?|rs\.?|₹)\s*(\d+)',
+        # Pattern: quantity + product (e.g., "2 kg tomatoes")
+        r'(\d+)\s+(kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box)\s+(\w+)',
+        # Pattern: simple product mentions
+        r'(\w+)(?:\s+(?:kg|grams|pcs|pieces|liter|litre|dozen|packet|bottle|box))?',
+    ]
+    
+    # Common product keywords
+    product_keywords = [
+        "tomato", "potato", "onion", "vegetable", "fruit", "rice", "wheat", "flour",
+        "milk", "bread", "egg", "chicken", "meat", "fish", "sugar", "salt", "oil",
+        "tea", "coffee", "butter", "cheese", "curd", "sweet", "snack", "chocolate",
+        "biscuit", "soap", "shampoo", "toothpaste", "detergent", "paper", "pen"
+    ]
+    
+    # Product categories mapping
+    category_keywords = {
+        "Food": ["tomato", "potato", "onion", "vegetable", "fruit", "rice", "wheat", "flour", "milk", "bread", "egg", "chicken", "meat", "fish", "sugar", "salt", "oil", "tea", "coffee", "butter", "cheese", "curd", "sweet", "snack", "chocolate", "biscuit"],
+        "Electronics": ["phone", "laptop", "computer", "tablet", "camera", "tv", "headphone", "speaker"],
+        "Clothing": ["shirt", "pants", "dress", "jeans", "t-shirt", "jacket", "shoes", "socks"],
+        "Home & Kitchen": ["soap", "shampoo", "toothpaste", "detergent", "paper", "pen", "plate", "cup", "bowl"],
+        "Books": ["book", "notebook", "pen", "paper"],
+        "Toys": ["toy", "game", "puzzle", "doll"],
+        "Sports": ["ball", "bat", "racket", "shoes", "equipment"],
+        "Beauty": ["lipstick", "cream", "makeup", "perfume", "shampoo", "soap"],
+        "Health": ["medicine", "tablet", "vitamin", "cream", "oil"]
+    }
+    
+    # Extract products using patterns
+    extracted_names = set()
+    
+    for pattern in product_patterns:
+        matches = re.findall(pattern, text_lower)
+        for match in matches:
+            if isinstance(match, tuple):
+                if len(match) == 4:  # quantity, unit, product, price
+                    quantity, unit, name, price = match
+                    if name not in extracted_names:
+                        extracted_names.add(name)
+                        category = legacy_get_product_category(name, category_keywords)
+                        products.append({
+                            "name": name.title(),
+                            "price": int(price),
+                            "category": category,
+                            "description": f"Fresh {name.title()}",
+                            "unit": unit,
+                            "quantity": int(quantity)
+                        })
+                elif len(match) == 3:  # product, unit, price OR product, price, unit
+                    if match[1].isdigit():  # product, price, unit
+                        name, price, unit = match
+                        if name not in extracted_names:
+                            extracted_names.add(name)
+                            category = legacy_get_product_category(name, category_keywords)
+                            products.append({
+                                "name": name.title(),
+                                "price": int(price),
+                                "category": category,
+                                "description": f"Fresh {name.title()}",
+                                "unit": unit,
+                                "quantity": 1
+                            })
+                    else:  # product, unit, price
+                        name, unit, price = match
+                        if name not in extracted_names:
+                            extracted_names.add(name)
+                            category = legacy_get_product_category(name, category_keywords)
+                            products.append({
+                                "name": name.title(),
+                                "price": int(price),
+                                "category": category,
+                                "description": f"Fresh {name.title()}",
+                                "unit": unit,
+                                "quantity": 1
+                            })
+                elif len(match) == 2:  # quantity, unit, product OR product, price
+                    if match[0].isdigit():  # quantity, unit, product
+                        quantity, unit, name = match
+                        if name not in extracted_names:
+                            extracted_names.add(name)
+                            category = legacy_get_product_category(name, category_keywords)
+                            products.append({
+                                "name": name.title(),
+                                "price": 0,
+                                "category": category,
+                                "description": f"Fresh {name.title()}",
+                                "unit": unit,
+                                "quantity": int(quantity)
+                            })
+                    else:  # product, price
+                        name, price = match
+                        if name not in extracted_names:
+                            extracted_names.add(name)
+                            category = legacy_get_product_category(name, category_keywords)
+                            products.append({
+                                "name": name.title(),
+                                "price": int(price),
+                                "category": category,
+                                "description": f"Fresh {name.title()}",
+                                "unit": "pcs",
+                                "quantity": 1
+                            })
+            else:  # single match
+                name = match.strip()
+                if len(name) > 2 and name not in extracted_names:
+                    extracted_names.add(name)
+                    category = legacy_get_product_category(name, category_keywords)
+                    products.append({
+                        "name": name.title(),
+                        "price": 0,
+                        "category": category,
+                        "description": f"Fresh {name.title()}",
+                        "unit": "pcs",
+                        "quantity": 1
+                    })
+    
+    # Also look for product keywords directly
+    for keyword in product_keywords:
+        if keyword in text_lower and keyword not in extracted_names:
+            extracted_names.add(keyword)
+            category = legacy_get_product_category(keyword, category_keywords)
+            products.append({
+                "name": keyword.title(),
+                "price": 0,
+                "category": category,
+                "description": f"Fresh {keyword.title()}",
+                "unit": "pcs",
+                "quantity": 1
+            })
+    
+    # Remove duplicates and limit results
+    unique_products = []
+    seen = set()
+    for product in products:
+        key = (product["name"], product["unit"])
+        if key not in seen:
+            seen.add(key)
+            unique_products.append(product)
+    
+    return unique_products[:5]  # Limit to 5 products
+
+def legacy_get_product_category(product_name, category_keywords):
+    product_lower = product_name.lower()
+    for category, keywords in category_keywords.items():
+        for keyword in keywords:
+            if keyword in product_lower:
+                return category
+    return "General"  # Default category
+
+
+def check_corpus(corpus):
+    failures = 0
+    for case in corpus:
+        got = [{field: product[field] for field in COMPARED_FIELDS}
+               for product in extract_products_fallback(case["text"])]
+        if got != case["expected"]:
+            failures += 1
+            print(f"FAIL: {case['text']!r}")
+            print(f"  expected: {case['expected']}")
+            print(f"  got:      {got}")
+    print(f"Corpus: {len(corpus) - failures}/{len(corpus)} transcripts match")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1000, help="calls per transcript (default: 1000)")
+    args = parser.parse_args(argv)
+
+    with open(CORPUS_PATH) as f:
+        corpus = json.load(f)
+    failures = check_corpus(corpus)
+
+    texts = [case["text"] for case in corpus]
+    # A 200-item dictated price list, the case the LLM fallback struggles with most
+    texts.append(", ".join(case["text"] for case in corpus) * 10)
+
+    print()
+    print(f"{'chars':>7} {'legacy us':>10} {'current us':>11} {'speedup':>8} {'legacy n':>9} {'current n':>10}")
+    for text in texts:
+        current = timeit.timeit(lambda: extract_products_fallback(text), number=args.repeat)
+        found = len(extract_products_fallback(text))
+        try:
+            legacy_found = len(legacy_extract_products_fallback(text))
+        except ValueError:
+            # The old price sweep int()s whatever word follows "rs"/"at"
+            print(f"{len(text):>7} {'crash':>10} {current / args.repeat * 1e6:>11.1f} {'-':>8} {'-':>9} {found:>10}")
+            continue
+        legacy = timeit.timeit(lambda: legacy_extract_products_fallback(text), number=args.repeat)
+        print(f"{len(text):>7} {legacy / args.repeat * 1e6:>10.1f} {current / args.repeat * 1e6:>11.1f} "
+              f"{legacy / current:>7.1f}x {legacy_found:>9} {found:>10}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
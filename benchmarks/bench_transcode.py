@@ -0,0 +1,143 @@
+"""End-to-end decode throughput with and without the transcoding stage.
+
+    python -m benchmarks.bench_transcode [--profile default] [--durations 15 60] [--clips recordings/]
+                                         [--uploads 16] [--format webm|wav] [--output result.json]
+
+Pushes ``--uploads`` clips (round-robin over the fixtures) through
+TRANSCRIBE_WORKERS worker threads twice, as a burst of queued jobs: first
+with each worker demuxing and resampling its clip inside transcribe_audio
+(the old path), then with every clip handed on admission to the interactive
+lane's transcoding pool (TRANSCODE_WORKERS processes), so later clips are
+decoded to PCM while earlier ones hold the model. Synthetic WAVs are
+re-encoded to webm/Opus first, like browser uploads, unless ``--format wav``.
+Reports audio-seconds per wall-second for both runs, the speedup, and how
+long workers waited for PCM.
+"""
+import argparse
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("WHISPER_WARMUP", "lazy")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+import av
+
+from app import (TRANSCODE_WORKERS, TRANSCRIBE_WORKERS, TRANSCRIPTION_PROFILES, get_model, profile_models,
+                 start_transcode, transcribe_audio)
+from benchmarks.clips import CLIP_FOLDER, benchmark_clips
+from benchmarks.common import latency_summary, peak_rss_mb, write_results
+
+LANE = "interactive"  # its pool has TRANSCODE_WORKERS processes
+
+
+def encode_webm(path):
+    """Re-encode a clip to 48 kHz mono Opus in webm, as MediaRecorder sends it; cached next to the WAV."""
+    target = os.path.join(CLIP_FOLDER, os.path.splitext(os.path.basename(path))[0] + ".webm")
+    if os.path.exists(target):
+        return target
+    with av.open(path) as source, av.open(target, "w") as output:
+        stream = output.add_stream("libopus", rate=48000)
+        stream.layout = "mono"
+        for frame in source.decode(audio=0):
+            frame.pts = None
+            for packet in stream.encode(frame):
+                output.mux(packet)
+        for packet in stream.encode(None):
+            output.mux(packet)
+    return target
+
+
+def run(uploads, profile, workers, transcode_stage):
+    """Transcribe every upload on ``workers`` threads; returns (wall seconds, PCM wait per upload)."""
+    waits = []
+
+    def inline(data):
+        transcribe_audio(io.BytesIO(data), profile)
+
+    def pipelined(future):
+        started = time.perf_counter()
+        audio = future.result()
+        waits.append(time.perf_counter() - started)
+        transcribe_audio(audio, profile)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if transcode_stage:
+            # Every upload is admitted at once and starts transcoding while it queues
+            jobs = [start_transcode(io.BytesIO(data), LANE) for data in uploads]
+            list(pool.map(pipelined, jobs))
+        else:
+            list(pool.map(inline, uploads))
+    return time.perf_counter() - started, waits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(TRANSCRIPTION_PROFILES), default="default",
+                        help="transcription profile (default: default)")
+    parser.add_argument("--durations", nargs="+", type=int, default=[15, 60],
+                        help="synthetic clip lengths in seconds (default: 15 60)")
+    parser.add_argument("--clips", help="folder of recorded clips to use instead of synthetic ones")
+    parser.add_argument("--uploads", type=int, default=16, help="uploads per run (default: 16)")
+    parser.add_argument("--workers", type=int, default=TRANSCRIBE_WORKERS,
+                        help="worker threads (default: TRANSCRIBE_WORKERS)")
+    parser.add_argument("--format", choices=["webm", "wav"], default="webm",
+                        help="container of the synthetic uploads (default: webm)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/transcode_<time>.json)")
+    args = parser.parse_args(argv)
+    if not TRANSCODE_WORKERS:
+        parser.error("TRANSCODE_WORKERS=0 disables the transcoding stage")
+
+    clips = benchmark_clips(args.durations, args.clips)
+    if args.clips is None and args.format == "webm":
+        clips = [(label, encode_webm(path), seconds) for label, path, seconds in clips]
+    fixtures = []
+    for label, path, seconds in clips:
+        with open(path, "rb") as f:
+            fixtures.append((label, f.read(), seconds))
+    selected = [fixtures[i % len(fixtures)] for i in range(args.uploads)]
+    uploads = [data for _, data, _ in selected]
+    audio_seconds = sum(seconds for _, _, seconds in selected)
+
+    for name in profile_models(args.profile):
+        get_model(name)
+    # Unmeasured: load the model's lazily initialised state and spawn the transcoding processes
+    transcribe_audio(io.BytesIO(uploads[0]), args.profile)
+    for future in [start_transcode(io.BytesIO(uploads[0]), LANE) for _ in range(TRANSCODE_WORKERS)]:
+        future.result()
+
+    inline_seconds, _ = run(uploads, args.profile, args.workers, transcode_stage=False)
+    staged_seconds, waits = run(uploads, args.profile, args.workers, transcode_stage=True)
+    inline_throughput = round(audio_seconds / inline_seconds, 2)
+    staged_throughput = round(audio_seconds / staged_seconds, 2)
+    speedup = round(inline_seconds / staged_seconds, 3)
+    wait = latency_summary(waits)
+
+    print(f"{args.uploads} uploads, {audio_seconds:.0f} audio-s, {args.workers} workers, "
+          f"{TRANSCODE_WORKERS} transcode processes")
+    print(f"inline transcode   {inline_seconds:8.2f} s  {inline_throughput:8.2f} audio-s/s")
+    print(f"transcode stage    {staged_seconds:8.2f} s  {staged_throughput:8.2f} audio-s/s  ({speedup:.2f}x)")
+    print(f"PCM wait p50 {wait['p50_ms']:.1f} ms  p95 {wait['p95_ms']:.1f} ms")
+
+    write_results("transcode", {
+        "config": {
+            "profile": args.profile,
+            "uploads": args.uploads,
+            "workers": args.workers,
+            "transcode_workers": TRANSCODE_WORKERS,
+            "format": args.format if args.clips is None else "recorded",
+            "clips": [label for label, _, _ in clips],
+            "audio_seconds": audio_seconds
+        },
+        "inline": {"wall_seconds": round(inline_seconds, 2), "audio_seconds_per_second": inline_throughput},
+        "transcode_stage": {"wall_seconds": round(staged_seconds, 2), "audio_seconds_per_second": staged_throughput,
+                            "pcm_wait": wait},
+        "speedup": speedup,
+        "peak_rss_mb": peak_rss_mb()
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark audio fixtures: synthetic clips of fixed durations, or recorded clips from a folder.
+
+Synthetic clips are 16 kHz mono WAVs of noise bursts shaped like syllables
+with pauses between phrases. They give Whisper and the VAD realistic work
+for timing, but will not transcribe to meaningful text; point ``--clips`` at
+a folder of real recordings to benchmark accuracy-relevant audio too.
+"""
+import math
+import os
+import random
+import struct
+import wave
+
+SAMPLE_RATE = 16000
+DEFAULT_DURATIONS = (5, 15, 60)
+CLIP_FOLDER = os.path.join(os.path.dirname(__file__), "results", "clips")
+RECORDED_EXTENSIONS = (".wav", ".webm", ".mp3", ".m4a", ".ogg", ".opus", ".flac")
+
+
+def synthetic_clip(seconds, path, seed=0):
+    """Write a ``seconds``-long speech-like WAV to ``path`` (deterministic for a given seed)."""
+    rng = random.Random(seed)
+    frames = bytearray()
+    t = 0
+    total = int(seconds * SAMPLE_RATE)
+    while t < total:
+        # A 1-3 s phrase of 4 Hz "syllables" followed by a 0.3-1 s pause
+        phrase = int(rng.uniform(1, 3) * SAMPLE_RATE)
+        pause = int(rng.uniform(0.3, 1.0) * SAMPLE_RATE)
+        pitch = rng.uniform(110, 220)
+        for i in range(min(phrase, total - t)):
+            envelope = abs(math.sin(math.pi * 4 * i / SAMPLE_RATE))
+            voiced = math.sin(2 * math.pi * pitch * i / SAMPLE_RATE) + 0.5 * math.sin(4 * math.pi * pitch * i / SAMPLE_RATE)
+            sample = envelope * (0.5 * voiced + 0.2 * rng.uniform(-1, 1))
+            frames += struct.pack("<h", int(max(-1.0, min(1.0, sample * 0.6)) * 32767))
+        t += phrase
+        silence = min(pause, max(0, total - t))
+        frames += b"\x00\x00" * silence
+        t += silence
+
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(bytes(frames))
+    return path
+
+
+def benchmark_clips(durations=DEFAULT_DURATIONS, recorded=None):
+    """Return ``[(label, path, seconds)]``: recorded clips from a folder, else cached synthetic ones."""
+    if recorded:
+        clips = []
+        for name in sorted(os.listdir(recorded)):
+            if name.lower().endswith(RECORDED_EXTENSIONS):
+                path = os.path.join(recorded, name)
+                clips.append((name, path, clip_seconds(path)))
+        return clips
+
+    os.makedirs(CLIP_FOLDER, exist_ok=True)
+    clips = []
+    for seconds in durations:
+        path = os.path.join(CLIP_FOLDER, f"synthetic_{seconds}s.wav")
+        if not os.path.exists(path):
+            synthetic_clip(seconds, path, seed=seconds)
+        clips.append((f"synthetic_{seconds}s", path, float(seconds)))
+    return clips
+
+
+def clip_seconds(path):
+    """Duration of a clip; WAVs are read directly, anything else is decoded with faster-whisper."""
+    if path.lower().endswith(".wav"):
+        with wave.open(path) as f:
+            return f.getnframes() / f.getframerate()
+    from faster_whisper.audio import decode_audio
+    return len(decode_audio(path, sampling_rate=SAMPLE_RATE)) / SAMPLE_RATE
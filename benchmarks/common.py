@@ -0,0 +1,76 @@
+"""Shared helpers for the benchmark scripts: latency statistics, peak RSS and JSON result files."""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+from datetime import datetime
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(seconds):
+    """p50/p95/p99/mean/max in milliseconds for a list of durations in seconds."""
+    if not seconds:
+        return {"count": 0}
+    return {
+        "count": len(seconds),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 3),
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3)
+    }
+
+
+def peak_rss_mb(pid=None):
+    """Peak resident set size of this process, or of ``pid`` (Linux only), in MB."""
+    if pid is not None:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            return None
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def environment():
+    """Where a result came from, so runs can be compared meaningfully."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def write_results(name, results, output=None):
+    """Write ``results`` with environment metadata to ``output`` or benchmarks/results/<name>_<time>.json."""
+    if output is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump({"benchmark": name, "environment": environment(), "results": results}, f, indent=4)
+    print(f"Results written to {output}")
+    return output
@@ -0,0 +1,50 @@
+"""Diff two benchmark result files.
+
+    python -m benchmarks.compare benchmarks/results/load_20260201_100000.json benchmarks/results/load_20260202_100000.json
+
+Prints every numeric value that appears in both files with its relative
+change, so a parameter or prompt change can be checked for regressions.
+For latencies a positive change is slower; for rtf/throughput it is faster.
+"""
+import argparse
+import json
+
+
+def flatten(value, prefix=""):
+    """``{"a": {"b": 1}, "runs": [{"x": 2}]}`` -> ``{"a.b": 1, "runs.0.x": 2}`` (numbers only)."""
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {prefix: value}
+    items = value.items() if isinstance(value, dict) else enumerate(value) if isinstance(value, list) else ()
+    flat = {}
+    for key, item in items:
+        flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.0,
+                        help="only show changes of at least this many percent")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"{before['benchmark']}: {before['environment'].get('commit')} -> {after['environment'].get('commit')}")
+
+    old, new = flatten(before["results"]), flatten(after["results"])
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] == new[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else float("inf")
+        if abs(change) >= args.threshold:
+            print(f"{key:<60} {old[key]:>12g} -> {new[key]:>12g} ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
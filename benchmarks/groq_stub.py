@@ -0,0 +1,113 @@
+"""Local stand-in for the Groq chat completions API, for load tests that should not hit (or pay for) Groq.
+
+    python -m benchmarks.groq_stub [--port 8765] [--latency-ms 300] [--jitter-ms 100] [--error-rate 0.05]
+
+Point the app at it with ``GROQ_BASE_URL=http://127.0.0.1:8765`` (or, for
+``LLM_BACKEND=openai``, ``OPENAI_COMPAT_BASE_URL=http://127.0.0.1:8765/v1``). Business
+prompts get a canned business JSON object and product prompts a
+``{"products": [...]}`` object, after a simulated model latency. With
+``--error-rate`` a fraction of calls answer 429 with a Retry-After header to
+exercise the retry path.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUSINESS_REPLY = {
+    "personName": "Ravi Kumar",
+    "name": "Ravi Sweets",
+    "address": "MG Road",
+    "city": "Pune",
+    "state": "Maharashtra",
+    "pincode": "411001",
+    "gstNumber": "",
+    "category": "Food & Restaurant",
+    "subcategory": "Sweets",
+    "email": "",
+    "phone": "9123456789",
+    "website": "",
+    "establishedYear": "2015",
+    "products": ["sweets", "snacks"]
+}
+PRODUCTS_REPLY = [
+    {"name": "rice", "price": 60, "category": "Food", "description": "Basmati rice", "unit": "kg", "quantity": 1},
+    {"name": "tomatoes", "price": 40, "category": "Food", "description": "Fresh tomatoes", "unit": "kg", "quantity": 2}
+]
+
+
+def make_handler(latency_ms, jitter_ms, error_rate):
+    class GroqStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                return self.reply(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            time.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+            if random.random() < error_rate:
+                return self.reply(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                                  {"Retry-After": "1"})
+
+            prompt = " ".join(message.get("content", "") for message in body.get("messages", []))
+            # The product prompt's reply schema is a products array of objects
+            content = json.dumps({"products": PRODUCTS_REPLY} if '"products":[{' in prompt else BUSINESS_REPLY)
+            prompt_tokens = len(prompt) // 4
+            completion_tokens = len(content) // 4
+            self.reply(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            })
+
+        def reply(self, status, payload, headers=None):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # one line per call would drown the load test output
+
+    return GroqStubHandler
+
+
+def start_stub(port=0, latency_ms=300, jitter_ms=100, error_rate=0.0):
+    """Serve the stub on a background thread; returns the server (``server.server_port`` has the port)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_ms, jitter_ms, error_rate))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="groq-stub", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300, help="mean simulated latency (default: 300)")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="latency standard deviation (default: 100)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.latency_ms, args.jitter_ms, args.error_rate))
+    print(f"Groq stub listening on http://127.0.0.1:{args.port} (set GROQ_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
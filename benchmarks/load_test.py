@@ -0,0 +1,185 @@
+"""Concurrent load test for the upload endpoints, with Groq replaced by a local stub.
+
+    python -m benchmarks.load_test [--concurrency 4] [--requests 40] [--endpoints business products]
+                                   [--duration 15] [--clips recordings/] [--llm-latency-ms 300]
+                                   [--llm-backend groq|openai|rules|replay] [--replay-file recordings.jsonl]
+                                   [--url http://127.0.0.1:5000] [--output result.json]
+
+By default a server is spawned in a scratch directory (so its data/, cache/
+and uploads/ don't touch the repository's) with the result cache disabled,
+models preloaded and its LLM backend pointed at an in-process Groq stub:
+``groq`` and ``openai`` go through the stub over HTTP, ``rules`` skips the
+LLM and ``replay`` answers from a recordings file.
+Reports p50/p95/p99 latency per endpoint, request and audio throughput, and
+the server's peak RSS. ``--url`` targets an already running server instead
+(start it with GROQ_BASE_URL set to ``python -m benchmarks.groq_stub``).
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from benchmarks.clips import benchmark_clips
+from benchmarks.common import latency_summary, peak_rss_mb, write_results
+from benchmarks.groq_stub import start_stub
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = {
+    "business": "/upload_business_audio",
+    "products": "/upload_product_audio"
+}
+
+
+def spawn_server(port, stub_url, workdir, log_file, llm_backend="groq", replay_file=None):
+    env = {
+        **os.environ,
+        "PYTHONPATH": REPO_ROOT,
+        "LLM_BACKEND": llm_backend,
+        "GROQ_BASE_URL": stub_url,
+        "GROQ_API_KEY": "benchmark",
+        "OPENAI_COMPAT_BASE_URL": f"{stub_url}/v1",
+        "WHISPER_WARMUP": "preload",
+        "CACHE_ENABLED": "0"  # every request should do the full work
+    }
+    if replay_file:
+        env["LLM_REPLAY_FILE"] = os.path.abspath(replay_file)
+    command = [sys.executable, "-c",
+               f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(url, process=None, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} before becoming ready")
+        try:
+            if httpx.get(f"{url}/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} not ready after {timeout}s")
+
+
+def run_load(url, clip_path, endpoints, total, concurrency):
+    """Send ``total`` uploads round-robin over ``endpoints`` from ``concurrency`` threads."""
+    with open(clip_path, "rb") as f:
+        clip = f.read()
+    name = os.path.basename(clip_path)
+
+    def one(i):
+        endpoint = endpoints[i % len(endpoints)]
+        started = time.perf_counter()
+        try:
+            response = http.post(f"{url}{ENDPOINTS[endpoint]}", files={"audio": (name, clip)})
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        return {"endpoint": endpoint, "status": status, "seconds": time.perf_counter() - started}
+
+    with httpx.Client(timeout=600, limits=httpx.Limits(max_connections=concurrency)) as http:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(one, range(total)))
+        wall_seconds = time.perf_counter() - started
+    return samples, wall_seconds
+
+
+def summarize(samples, wall_seconds, audio_seconds):
+    ok = [sample for sample in samples if sample["status"] == 200]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample["status"])] = statuses.get(str(sample["status"]), 0) + 1
+    return {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "statuses": statuses,
+        "wall_seconds": round(wall_seconds, 2),
+        "requests_per_second": round(len(ok) / wall_seconds, 2),
+        "audio_seconds_per_second": round(len(ok) * audio_seconds / wall_seconds, 2),
+        "latency": latency_summary([sample["seconds"] for sample in ok]),
+        "latency_by_endpoint": {
+            endpoint: latency_summary([sample["seconds"] for sample in ok if sample["endpoint"] == endpoint])
+            for endpoint in sorted({sample["endpoint"] for sample in samples})
+        }
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target an already running server instead of spawning one")
+    parser.add_argument("--port", type=int, default=5055, help="port for the spawned server (default: 5055)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent clients (default: 4)")
+    parser.add_argument("--requests", type=int, default=40, help="measured uploads (default: 40)")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured uploads sent first (default: 2)")
+    parser.add_argument("--endpoints", nargs="+", choices=sorted(ENDPOINTS), default=["business", "products"],
+                        help="endpoints to hit round-robin (default: both)")
+    parser.add_argument("--duration", type=int, default=15, help="synthetic clip length in seconds (default: 15)")
+    parser.add_argument("--clips", help="folder of recorded clips; the first one is uploaded")
+    parser.add_argument("--llm-backend", choices=["groq", "openai", "rules", "replay"], default="groq",
+                        help="LLM backend of the spawned server (default: groq, via the stub)")
+    parser.add_argument("--replay-file", help="recordings for --llm-backend replay")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Groq stub mean latency (default: 300)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="fraction of stub calls answering 429")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load_<time>.json)")
+    args = parser.parse_args(argv)
+
+    label, clip_path, audio_seconds = benchmark_clips([args.duration], args.clips)[0]
+    process = None
+    url = args.url
+    if url is None:
+        stub = start_stub(latency_ms=args.llm_latency_ms, error_rate=args.llm_error_rate)
+        workdir = tempfile.mkdtemp(prefix="ai-stt-load-")
+        log_path = os.path.join(workdir, "server.log")
+        print(f"Spawning server in {workdir} (log: {log_path})")
+        log_file = open(log_path, "w")
+        process = spawn_server(args.port, f"http://127.0.0.1:{stub.server_port}", workdir, log_file,
+                               args.llm_backend, args.replay_file)
+        url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        wait_until_ready(url, process)
+        if args.warmup:
+            run_load(url, clip_path, args.endpoints, args.warmup, min(args.warmup, args.concurrency))
+        samples, wall_seconds = run_load(url, clip_path, args.endpoints, args.requests, args.concurrency)
+        server_rss = peak_rss_mb(process.pid) if process else None
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+            log_file.close()
+
+    summary = summarize(samples, wall_seconds, audio_seconds)
+    results = {
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "endpoints": args.endpoints,
+            "clip": label,
+            "llm_backend": args.llm_backend if args.url is None else None,
+            "audio_seconds": audio_seconds,
+            "llm_latency_ms": args.llm_latency_ms if args.url is None else None,
+            "llm_error_rate": args.llm_error_rate if args.url is None else None
+        },
+        **summary,
+        "server_peak_rss_mb": server_rss
+    }
+
+    latency = summary["latency"]
+    print(f"{summary['succeeded']}/{summary['requests']} ok in {summary['wall_seconds']}s: "
+          f"{summary['requests_per_second']} req/s, {summary['audio_seconds_per_second']} audio-s/s")
+    if latency["count"]:
+        print(f"latency p50 {latency['p50_ms']:.0f} ms  p95 {latency['p95_ms']:.0f} ms  p99 {latency['p99_ms']:.0f} ms")
+    if server_rss is not None:
+        print(f"server peak RSS {server_rss} MB")
+    write_results("load", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""gunicorn settings for app.py, read from the working directory:
+
+    gunicorn -w 4 app:app
+
+Whisper models are loaded in each worker after it is forked, never in the
+master: CTranslate2's thread pools do not survive fork(), so with --preload a
+model loaded before the fork would hang the worker's first decode. app.py
+skips its import-time warm-up under gunicorn and this hook runs it instead.
+"""
+
+
+def post_worker_init(worker):
+    import app
+
+    app.start_warm_up()
@@ -0,0 +1,137 @@
+"""Local inference server: one process owns the Whisper models for every web worker on the machine.
+
+Usage:
+    python inference_server.py --socket /run/ai-stt/inference.sock --workers 2 --cpu-threads 8
+    INFERENCE_SOCKET=/run/ai-stt/inference.sock gunicorn -w 8 app:app
+
+Web workers started with INFERENCE_SOCKET load no model: they decode uploads
+to 16 kHz PCM and send it here over the Unix socket. Decodes from all of
+them share ``max(--workers, CHUNK_WORKERS)`` model replicas of
+``--cpu-threads`` threads each, so the cores are divided once for the whole
+machine instead of every web worker sizing its own thread pool. Requests
+beyond ``--workers`` wait here.
+
+Requests are not batched: each clip is still decoded on its own, through the
+same per-clip pipeline as in-process decoding (VAD, chunking, tiered
+escalation, segment streaming), and concurrency is bounded rather than
+merged. Batching across requests would need a decoder that runs several
+clips' features through one generate call, which faster-whisper's
+transcribe() does not offer; the gain here is the shared thread budget and
+one copy of the models, not higher per-decode throughput.
+
+Protocol (multiprocessing.connection framing, never pickles): the client
+sends a JSON header and a payload -- ``{"op": "transcribe", "profile": name}``
+with float32 PCM, or ``{"op": "status"}`` with an empty one. It receives
+``{"segment": {...}}`` messages as they are decoded, then one final reply:
+``{"transcript", "audio"}``, ``{"ready", "models"}`` or ``{"error"}``.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+
+# This process is the server (never a client of itself) and makes no LLM calls
+SOCKET_PATH = os.environ.pop("INFERENCE_SOCKET", "") or "/tmp/ai-stt-inference.sock"
+os.environ.setdefault("LLM_BACKEND", "rules")
+# Models are loaded in main(), once the thread settings are applied
+os.environ["WHISPER_WARMUP"] = "lazy"
+
+from multiprocessing.connection import Listener
+
+import numpy as np
+from prometheus_client import start_http_server
+
+from app import (CHUNK_WORKERS, REQUEST_ID, TRANSCRIBE_WORKERS, TRANSCRIPTION_PROFILES, log, model_statuses,
+                 models_ready, transcribe_audio, warm_up_models)
+
+
+def serve_connection(connection, slots):
+    """Answer requests on one client connection until the client disconnects."""
+    with connection:
+        while True:
+            try:
+                header = json.loads(connection.recv_bytes())
+                payload = connection.recv_bytes()
+            except (EOFError, OSError):
+                return
+            REQUEST_ID.set(header.get("request_id"))
+            try:
+                reply = handle_request(connection, header, payload, slots)
+            except Exception as e:
+                log("Inference request failed", logging.ERROR, exc_info=True, op=header.get("op"))
+                reply = {"error": str(e)}
+            try:
+                connection.send_bytes(json.dumps(reply).encode())
+            except OSError:
+                return
+
+
+def handle_request(connection, header, payload, slots):
+    if header.get("op") == "status":
+        statuses = model_statuses()
+        return {"ready": models_ready(statuses), "models": statuses}
+    if header.get("op") != "transcribe":
+        raise ValueError(f"Unknown op: {header.get('op')!r}")
+
+    profile = header.get("profile", "default")
+    if profile not in TRANSCRIPTION_PROFILES:
+        raise ValueError(f"Unknown transcription profile: {profile!r}")
+    audio = np.frombuffer(payload, dtype=np.float32).copy()
+
+    def send_segment(segment):
+        connection.send_bytes(json.dumps({"segment": segment}).encode())
+
+    with slots:
+        transcript, audio_info = transcribe_audio(audio, profile, on_segment=send_segment)
+    return {"transcript": transcript, "audio": audio_info}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=SOCKET_PATH,
+                        help="Unix socket path; web workers set INFERENCE_SOCKET to the same path "
+                             "(default: $INFERENCE_SOCKET or /tmp/ai-stt-inference.sock)")
+    parser.add_argument("--workers", type=int, default=TRANSCRIBE_WORKERS,
+                        help="concurrent decodes, one model replica each (default: TRANSCRIBE_WORKERS)")
+    parser.add_argument("--cpu-threads", type=int, default=None,
+                        help="threads per replica (default: CPU count / replicas)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve this process's Prometheus metrics on this port")
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers)
+    # Chunks of long recordings run on CHUNK_WORKERS threads and need a replica
+    # each too; every replica gets an equal share of the cores
+    replicas = max(workers, CHUNK_WORKERS)
+    cpu_threads = args.cpu_threads or max(1, (os.cpu_count() or 1) // replicas)
+    for name, settings in TRANSCRIPTION_PROFILES.items():
+        TRANSCRIPTION_PROFILES[name] = {**settings, "cpu_threads": cpu_threads, "num_workers": replicas}
+    warm_up_models()
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)  # left over from a previous run
+    umask = os.umask(0o177)  # the socket is created 0600: only this user's web workers may connect
+    try:
+        listener = Listener(args.socket, family="AF_UNIX")
+    finally:
+        os.umask(umask)
+    log("Inference server listening", socket=args.socket, workers=workers, replicas=replicas,
+        cpu_threads=cpu_threads)
+
+    slots = threading.BoundedSemaphore(workers)
+    try:
+        while True:
+            connection = listener.accept()
+            threading.Thread(target=serve_connection, args=(connection, slots), name="inference-connection",
+                             daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -132,6 +132,10 @@ async function startRecording(endpoint, statusElement, button) {
             const audioBlob = new Blob(audioChunks, { type: "audio/webm" });
             const formData = new FormData();
             formData.append("audio", audioBlob);
+            // Product recordings are appended to the session created in phase 1
+            if (endpoint === "/upload_product_audio" && currentFilename) {
+                formData.append("filename", currentFilename);
+            }
 
             try {
                 const response = await fetch(endpoint, {
@@ -821,41 +825,41 @@ function createProfileCard(profile, index) {
     
     // Format date from filename
     const dateStr = profile.filename || 'Unknown date';
-    const formattedDate = dateStr.replace(/session_(\d{8})_(\d{6})\.json/, (match, p1, p2) => {
+    const formattedDate = dateStr.replace(/session_(\d{8})_(\d{6})(?:_[0-9a-f]+)?\.json/, (match, p1, p2) => {
         const date = new Date(p1.substring(0, 4) + '-' + p1.substring(4, 6) + '-' + p1.substring(6, 8));
         return date.toLocaleDateString() + ' ' + p2.substring(0, 2) + ':' + p2.substring(2, 4);
     });
     
     // Get product names
-    const productNames = profile.data && profile.data.products 
-        ? profile.data.products.map(p => p.name).filter(n => n).join(', ')
+    const productNames = profile.productNames && profile.productNames.length
+        ? profile.productNames.join(', ')
         : 'No products';
     
     card.innerHTML = `
         <div class="profile-card-header">
-            <h3 class="profile-title">${profile.data?.name || 'Untitled Business'}</h3>
+            <h3 class="profile-title">${profile.name || 'Untitled Business'}</h3>
             <span class="profile-date">${formattedDate}</span>
         </div>
         <div class="profile-info">
             <div class="profile-info-item">
                 <label class="profile-info-label">Person Name:</label>
-                <span class="profile-info-value">${profile.data?.personName || '-'}</span>
+                <span class="profile-info-value">${profile.personName || '-'}</span>
             </div>
             <div class="profile-info-item">
                 <label class="profile-info-label">Business Name:</label>
-                <span class="profile-info-value">${profile.data?.name || '-'}</span>
+                <span class="profile-info-value">${profile.name || '-'}</span>
             </div>
             <div class="profile-info-item">
                 <label class="profile-info-label">City:</label>
-                <span class="profile-info-value">${profile.data?.city || '-'}</span>
+                <span class="profile-info-value">${profile.city || '-'}</span>
             </div>
             <div class="profile-info-item">
                 <label class="profile-info-label">Category:</label>
-                <span class="profile-info-value">${profile.data?.category || '-'}</span>
+                <span class="profile-info-value">${profile.category || '-'}</span>
             </div>
             <div class="profile-info-item">
                 <label class="profile-info-label">Phone:</label>
-                <span class="profile-info-value">${profile.data?.phone || '-'}</span>
+                <span class="profile-info-value">${profile.phone || '-'}</span>
             </div>
             <div class="profile-info-item">
                 <label class="profile-info-label">Products:</label>
@@ -0,0 +1,100 @@
+"""Upload transcoding: any audio container in, 16 kHz mono float32 PCM out.
+
+This module runs in the transcoding processes started by app.py (see the
+TRANSCODING section there) and imports only PyAV and numpy, so under gunicorn
+a worker does not pay for Flask, the LLM clients or faster-whisper. Under
+``python app.py`` multiprocessing's spawn also re-imports the main script in
+each worker, which costs those imports once per worker (but loads no model,
+see ``is_pool_worker`` in app.py). The output matches
+``faster_whisper.audio.decode_audio``: resampled to signed 16-bit, scaled to
+[-1, 1), with packets FFmpeg cannot decode skipped.
+"""
+import io
+
+import av
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class TranscodeError(ValueError):
+    """The upload is not audio the pipeline accepts; the message is safe to show the client.
+
+    ``status`` is the HTTP status to answer with: 413 for audio over the
+    length limit, 400 otherwise. It is kept in ``args`` so it survives the
+    trip back from a pool process.
+    """
+    def __init__(self, message, status=400):
+        super().__init__(message, status)
+        self.status = status
+
+    def __str__(self):
+        return self.args[0]
+
+
+def decoded_frames(container, stream, errors):
+    """The stream's frames, skipping packets FFmpeg rejects as invalid data.
+
+    Browser recordings are often cut off mid-packet; a corrupt tail ends the
+    stream instead of failing the upload. Skipped packets are counted in
+    ``errors[0]``.
+    """
+    packets = container.demux(stream)
+    while True:
+        try:
+            packet = next(packets)
+        except StopIteration:
+            return
+        except av.error.InvalidDataError:
+            errors[0] += 1
+            return
+        try:
+            frames = packet.decode()
+        except av.error.InvalidDataError:
+            errors[0] += 1
+            continue
+        yield from frames
+
+
+def transcode(source, max_seconds=None, min_sample_rate=8000):
+    """Decode ``source`` (a path, a binary file-like object or the upload's bytes) to 16 kHz mono PCM.
+
+    The audio stream's sample rate is checked before anything is decoded,
+    and decoding stops as soon as the output exceeds ``max_seconds``.
+    Raises TranscodeError for files without an audio stream, below
+    ``min_sample_rate``, too long, that FFmpeg cannot open, or in which not
+    a single packet decodes.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    resampler = av.audio.resampler.AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
+    max_samples = max_seconds * SAMPLE_RATE if max_seconds else None
+    chunks = []
+    samples = 0
+    errors = [0]
+    try:
+        with av.open(source, metadata_errors="ignore") as container:
+            if not container.streams.audio:
+                raise TranscodeError("The upload contains no audio stream")
+            stream = container.streams.audio[0]
+            if stream.sample_rate and stream.sample_rate < min_sample_rate:
+                raise TranscodeError(f"Audio sampled at {stream.sample_rate} Hz; at least {min_sample_rate} Hz "
+                                     "is required")
+            for frame in decoded_frames(container, stream, errors):
+                for resampled in resampler.resample(frame):
+                    chunk = resampled.to_ndarray().reshape(-1)
+                    chunks.append(chunk)
+                    samples += len(chunk)
+                if max_samples and samples > max_samples:
+                    raise TranscodeError(f"Audio is longer than the {max_seconds:.0f}s limit", 413)
+            # Flush the samples the resampler is still holding
+            for resampled in resampler.resample(None):
+                chunks.append(resampled.to_ndarray().reshape(-1))
+    except av.error.FFmpegError as e:
+        raise TranscodeError(f"Could not decode the audio: {e}") from e
+
+    if not chunks and errors[0]:
+        raise TranscodeError("Could not decode the audio: no packet in it is valid")
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32) / 32768.0